@@ -0,0 +1,234 @@
+import os
+import time
+import math
+import logging
+import ipaddress
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple, List
+
+from metrics import registry
+from logging_setup import configure_logging
+
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+SHED_REQUESTS = registry.counter(
+    "smartdine_shed_requests_total",
+    "Requests turned away before any work, by endpoint and reason "
+    "(client_rate, global_rate, queue_full or queue_timeout)",
+    ("endpoint", "reason")
+)
+ADMISSION_WAIT_SECONDS = registry.histogram(
+    "smartdine_admission_wait_seconds", "Time admitted requests waited for a concurrency slot", ("endpoint",)
+)
+
+CLIENT_ID_HEADER = 'X-Client-ID'
+# Loopback and private networks, where the frontend server runs in the shipped deployments
+DEFAULT_TRUSTED_FRONTENDS = "127.0.0.0/8,::1/128,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,fc00::/7"
+
+def parse_trusted_frontends(spec: str) -> List[ipaddress._BaseNetwork]:
+    """Parse '10.0.0.5,10.1.0.0/16' into networks, skipping invalid entries"""
+    networks = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(part, strict=False))
+        except ValueError:
+            logger.warning("Ignoring invalid API_TRUSTED_FRONTENDS entry: %s", part)
+    return networks
+
+class ClientIdentifier:
+    """Who a request comes from, for rate limits and keyless idempotency
+
+    A client is its address (after ProxyFix). X-Client-ID, which the
+    frontend sets per browser session, is only honoured from the addresses
+    in API_TRUSTED_FRONTENDS (default: loopback and private networks; set
+    it empty to trust no one); from anyone else it would let a caller pick
+    a fresh identity, and a fresh rate limit, per request.
+    """
+
+    def __init__(self, trusted: Optional[List[ipaddress._BaseNetwork]] = None):
+        self.trusted = (trusted if trusted is not None else parse_trusted_frontends(
+            os.environ.get('API_TRUSTED_FRONTENDS', DEFAULT_TRUSTED_FRONTENDS)))
+
+    def is_trusted(self, address: Optional[str]) -> bool:
+        if not self.trusted or not address:
+            return False
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted)
+
+    def identify(self, address: Optional[str], client_id: Optional[str]) -> str:
+        address = address or 'unknown'
+        return self.session(address, client_id) or address
+
+    def session(self, address: Optional[str], client_id: Optional[str]) -> Optional[str]:
+        """The trusted per-session identity, or None if the request has none"""
+        if client_id and self.is_trusted(address):
+            return f"{address}|{client_id[:128]}"
+        return None
+
+class TokenBucket:
+    """Allows `rate` requests per second on average and bursts of up to `capacity`"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Take a token; returns 0 if one was available, else seconds until one will be"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def give_back(self):
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+class RateLimiter:
+    """Per-client and worker-wide token buckets
+
+    Configured from the environment:
+        API_RATE_LIMIT          requests per minute per client (default: 100; 0 turns it off)
+        API_RATE_BURST          requests a client may send at once (default: 20)
+        API_GLOBAL_RATE_LIMIT   requests per second for this worker across all clients
+                                (default: 0, off)
+        API_GLOBAL_RATE_BURST   (default: twice API_GLOBAL_RATE_LIMIT)
+        API_RATE_LIMIT_CLIENTS  clients tracked at once; the least recently seen
+                                are forgotten first (default: 10000)
+    """
+
+    def __init__(self, per_minute: Optional[float] = None, burst: Optional[float] = None,
+                 global_per_second: Optional[float] = None, global_burst: Optional[float] = None,
+                 max_clients: Optional[int] = None):
+        per_minute = per_minute if per_minute is not None else float(os.environ.get('API_RATE_LIMIT', 100))
+        global_per_second = (global_per_second if global_per_second is not None
+                             else float(os.environ.get('API_GLOBAL_RATE_LIMIT', 0)))
+        self.client_rate = per_minute / 60
+        self.client_burst = max(1.0, burst if burst is not None else float(os.environ.get('API_RATE_BURST', 20)))
+        self.global_rate = global_per_second
+        if global_burst is None:
+            global_burst = float(os.environ.get('API_GLOBAL_RATE_BURST', 2 * global_per_second))
+        self.max_clients = max_clients or int(os.environ.get('API_RATE_LIMIT_CLIENTS', 10000))
+
+        self._clients: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._global = (TokenBucket(self.global_rate, max(1.0, global_burst), time.monotonic())
+                        if self.global_rate > 0 else None)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.client_rate > 0 or self._global is not None
+
+    @property
+    def tracked_clients(self) -> int:
+        return len(self._clients)
+
+    def check(self, client: str) -> Optional[Tuple[str, float]]:
+        """None if the request may go ahead, else (reason, seconds to wait before retrying)"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = None
+            if self.client_rate > 0:
+                bucket = self._clients.get(client)
+                if bucket is None:
+                    bucket = self._clients[client] = TokenBucket(self.client_rate, self.client_burst, now)
+                    if len(self._clients) > self.max_clients:
+                        self._clients.popitem(last=False)
+                else:
+                    self._clients.move_to_end(client)
+                wait = bucket.take(now)
+                if wait:
+                    return "client_rate", wait
+            if self._global is not None:
+                wait = self._global.take(now)
+                if wait:
+                    # The request is not served, so it should not count against the client
+                    if bucket is not None:
+                        bucket.give_back()
+                    return "global_rate", wait
+        return None
+
+class ConcurrencyLimiter:
+    """At most `limit` requests at a time, with a bounded queue of waiting ones
+
+    Requests that find the queue full are rejected at once; queued ones give
+    up after `timeout` seconds, well before clients time out, so the
+    admitted requests keep their latency instead of everyone slowing down.
+    """
+
+    def __init__(self, limit: int, queue_size: int, timeout: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> Optional[str]:
+        """None once a slot is held (call release), else the reason it was refused"""
+        with self._condition:
+            if self.active < self.limit:
+                self.active += 1
+                return None
+            if self.waiting >= self.queue_size:
+                return "queue_full"
+            self.waiting += 1
+            deadline = time.monotonic() + self.timeout
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return "queue_timeout"
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            return None
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+def retry_after_seconds(wait: float) -> int:
+    """Whole seconds for a Retry-After header, at least 1"""
+    return max(1, math.ceil(wait))
+
+def create_order_limiter() -> ConcurrencyLimiter:
+    """POST /order limiter from ORDER_MAX_CONCURRENCY (default: 8), ORDER_QUEUE_SIZE
+    (default: 16) and ORDER_QUEUE_TIMEOUT seconds (default: 2)"""
+    return ConcurrencyLimiter(
+        limit=max(1, int(os.environ.get('ORDER_MAX_CONCURRENCY', 8))),
+        queue_size=max(0, int(os.environ.get('ORDER_QUEUE_SIZE', 16))),
+        timeout=float(os.environ.get('ORDER_QUEUE_TIMEOUT', 2))
+    )
+
+# Create global instances
+client_identifier = ClientIdentifier()
+rate_limiter = RateLimiter()
+order_limiter = create_order_limiter()
+
+def _collect_admission_metrics():
+    return [
+        ("smartdine_order_in_flight", "gauge", "POST /order requests holding a concurrency slot",
+         [({}, order_limiter.active)]),
+        ("smartdine_order_queued", "gauge", "POST /order requests waiting for a concurrency slot",
+         [({}, order_limiter.waiting)]),
+        ("smartdine_rate_limit_clients", "gauge", "Clients with a rate limit bucket in this worker",
+         [({}, rate_limiter.tracked_clients)]),
+    ]
+
+registry.register_collector(_collect_admission_metrics)
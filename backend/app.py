@@ -1,25 +1,211 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, g, Response
 from flask_cors import CORS
-from firebase_client import db
-from nlp import parse_order
+from storage import storage
+from nlp_executor import nlp_executor, NLPTimeoutError
+from menu_index import menu_index_store
+from metrics import registry, PROMETHEUS_CONTENT_TYPE
+from profiling import request_profiler
+from nlp import match_intent
+from response_cache import MenuResponseCache, PreparedResponse
+from idempotency import (idempotency_store, IdempotencyKey, IdempotencyConflict, StoredResponse,
+                         IDEMPOTENCY_HEADER)
+from logging_setup import configure_logging, set_request_id, reset_request_id
+from admission import (rate_limiter, order_limiter, client_identifier, retry_after_seconds, SHED_REQUESTS,
+                       ADMISSION_WAIT_SECONDS, CLIENT_ID_HEADER)
+from werkzeug.middleware.proxy_fix import ProxyFix
 import uuid
+import time
 import datetime
 import logging
 import os
+from typing import Optional
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+# Seconds parse_order may spend per message before it starts skipping
+# expensive stages (keeps /order well inside the frontend's 10 s timeout)
+NLP_PARSE_BUDGET = float(os.environ.get('NLP_PARSE_BUDGET', 3))
+
+# Metrics (served at /metrics)
+REQUESTS = registry.counter(
+    "smartdine_requests_total", "HTTP requests by endpoint, method and status", ("endpoint", "method", "status")
+)
+REQUEST_SECONDS = registry.histogram(
+    "smartdine_request_seconds", "HTTP request latency by endpoint", ("endpoint",)
+)
+ORDER_STAGE_SECONDS = registry.histogram(
+    "smartdine_order_stage_seconds", "Time spent in each stage of POST /order", ("stage",)
+)
+INTENTS = registry.counter("smartdine_intents_total", "Parsed messages by intent", ("intent",))
+ERRORS = registry.counter("smartdine_errors_total", "Errors by stage", ("stage",))
+MENU_SOURCE = registry.counter(
+    "smartdine_menu_source_total", "Where /order read the menu from (datastore, index or cache)", ("source",)
+)
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Validate Firebase connection at startup
-if db is None:
-    logger.error("="*60)
-    logger.error("CRITICAL: Firebase database not initialized!")
-    logger.error("Set FIREBASE_SERVICE_ACCOUNT environment variable")
-    logger.error("="*60)
+# Behind a load balancer (e.g. Render), take the client address from
+# X-Forwarded-For; TRUSTED_PROXIES is the number of proxies in front
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
+
+# Health checks and scrapes are never rate limited
+UNLIMITED_ENDPOINTS = {'index', 'health', 'metrics'}
+
+GREETING_RESPONSE = "Hello! Welcome to our restaurant. You can order food by saying something like 'I want 2 pizzas and 1 coke' or ask to 'show menu' to see available items."
+CANCEL_RESPONSE = "I understand you want to cancel. Please specify your order ID or contact our staff for assistance."
+
+def encode_json(payload) -> bytes:
+    """Serialize as jsonify does (outside debug mode), for responses built ahead of time"""
+    return (app.json.dumps(payload, separators=(",", ":")) + "\n").encode("utf-8")
+
+# Replies that never change, serialized once at startup
+STATIC_RESPONSES = {
+    intent: PreparedResponse(encode_json({"success": True, "intent": intent, "response": text}))
+    for intent, text in (("greeting", GREETING_RESPONSE), ("help", GREETING_RESPONSE),
+                         ("cancel_order", CANCEL_RESPONSE))
+}
+
+menu_response_cache = MenuResponseCache()
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    # Reuse the caller's request ID (e.g. from a proxy) so logs correlate across services
+    request_id = request.headers.get(REQUEST_ID_HEADER, '')[:128]
+    g.request_id = request_id if request_id and request_id.isprintable() else uuid.uuid4().hex
+    g.request_id_token = set_request_id(g.request_id)
+    if request_profiler.enabled:
+        g.profile = request_profiler.start(request.headers)
+
+def request_client() -> str:
+    """The caller's identity; X-Client-ID counts only from API_TRUSTED_FRONTENDS"""
+    return client_identifier.identify(request.remote_addr, request.headers.get(CLIENT_ID_HEADER))
+
+def request_session() -> Optional[str]:
+    """The caller's browser session, if a trusted frontend named one"""
+    return client_identifier.session(request.remote_addr, request.headers.get(CLIENT_ID_HEADER))
+
+def shed_response(endpoint: str, reason: str, status: int, retry_after: float, message: str):
+    """Turn a request away before doing any work"""
+    SHED_REQUESTS.inc(endpoint=endpoint, reason=reason)
+    response = jsonify({
+        "success": False,
+        "error": message
+    })
+    response.status_code = status
+    response.headers['Retry-After'] = str(retry_after_seconds(retry_after))
+    return response
+
+@app.before_request
+def admit_request():
+    """Rate limit every client and cap concurrent /order requests (see admission.py)"""
+    if request.method == 'OPTIONS' or request.endpoint in UNLIMITED_ENDPOINTS:
+        return None
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    
+    if rate_limiter.enabled:
+        refused = rate_limiter.check(request_client())
+        if refused is not None:
+            reason, wait = refused
+            if reason == "client_rate":
+                return shed_response(endpoint, reason, 429, wait, "Too many requests, please slow down")
+            return shed_response(endpoint, reason, 503, wait, "Service is busy, please try again shortly")
+    
+    if request.endpoint == 'place_order':
+        start = time.perf_counter()
+        reason = order_limiter.acquire()
+        if reason is not None:
+            return shed_response(endpoint, reason, 503, 1, "Too many orders in progress, please try again shortly")
+        g.order_slot = True
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+    return None
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get('request_start')
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    if start is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+    profile = g.pop('profile', None)
+    if profile is not None:
+        path = request_profiler.stop(profile, f"{request.method} {endpoint}")
+        if path and profile.forced:
+            response.headers['X-Profile'] = os.path.basename(path)
+    if 'request_id' in g:
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+    return response
+
+@app.teardown_request
+def finish_request(error=None):
+    # after_request is skipped when a view raises; never leave a profiler running
+    # or a concurrency slot held
+    profile = g.pop('profile', None)
+    if profile is not None:
+        request_profiler.stop(profile, f"{request.method} {request.path} error")
+    if g.pop('order_slot', False):
+        order_limiter.release()
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        reset_request_id(token)
+
+def fetch_available_menu():
+    """Load available menu items from the datastore"""
+    return storage.list_menu()
+
+def send_prepared(prepared: PreparedResponse, status: int = 200) -> Response:
+    """Send a pre-encoded JSON body, gzipped when it is large and the client accepts it"""
+    if prepared.gzipped is not None and request.accept_encodings['gzip']:
+        response = Response(prepared.gzipped, status=status, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(prepared.body, status=status, mimetype='application/json')
+    if prepared.gzipped is not None:
+        response.vary.add('Accept-Encoding')
+    return response
+
+def show_menu_response(shared_index=None):
+    """The show_menu reply from the menu response cache (see MENU_CACHE_TTL)
+
+    Also rebuilt when the shared index version changes.
+    """
+    try:
+        with ORDER_STAGE_SECONDS.time(stage="menu_load"):
+            prepared, cached = menu_response_cache.get(
+                shared_index.version if shared_index is not None else None,
+                fetch_available_menu,
+                lambda menu_docs: encode_json({
+                    "success": True,
+                    "intent": "show_menu",
+                    "response": "Here's our menu:",
+                    "menu": menu_docs
+                })
+            )
+    except Exception as e:
+        ERRORS.inc(stage="menu_load")
+        logger.error(f"Failed to fetch menu: {e}")
+        return jsonify({
+            "success": False,
+            "error": "Could not load menu",
+            "details": str(e)
+        }), 500
+    
+    MENU_SOURCE.inc(source="cache" if cached else "datastore")
+    if prepared is None:
+        logger.warning("No menu items in database")
+        return jsonify({
+            "success": False,
+            "error": "Menu not available",
+            "details": "No menu items configured"
+        }), 503
+    return send_prepared(prepared)
 
 @app.route('/')
 def index():
@@ -36,7 +222,7 @@ def health():
     """Detailed health check"""
     try:
         # Test database connection
-        if db is None:
+        if not storage.available:
             return jsonify({
                 "status": "unhealthy",
                 "database": "not initialized",
@@ -44,7 +230,7 @@ def health():
                 "timestamp": datetime.datetime.utcnow().isoformat()
             }), 503
             
-        db.collection('menus').limit(1).get()
+        storage.ping()
         db_status = "connected"
     except Exception as e:
         db_status = f"error: {str(e)}"
@@ -58,24 +244,24 @@ def health():
         "timestamp": datetime.datetime.utcnow().isoformat()
     })
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics for this worker process"""
+    return Response(registry.render(), mimetype=None, content_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/menu', methods=['GET'])
 def get_menu():
     """Get all menu items"""
-    if db is None:
+    if not storage.available:
         return jsonify({
             "success": False,
             "error": "Database not available"
         }), 503
     
     try:
-        docs = db.collection('menus').where('available', '==', True).stream()
-        menu = []
-        for doc in docs:
-            item = doc.to_dict()
-            item['doc_id'] = doc.id
-            menu.append(item)
+        menu = storage.list_menu()
         
-        logger.info(f"Retrieved {len(menu)} menu items")
+        logger.info("Retrieved %d menu items", len(menu))
         return jsonify({
             "success": True,
             "menu": menu,
@@ -93,19 +279,14 @@ def get_menu():
 @app.route('/menu/<category>', methods=['GET'])
 def get_menu_by_category(category):
     """Get menu items by category"""
-    if db is None:
+    if not storage.available:
         return jsonify({
             "success": False,
             "error": "Database not available"
         }), 503
     
     try:
-        docs = db.collection('menus').where('category', '==', category).where('available', '==', True).stream()
-        menu = []
-        for doc in docs:
-            item = doc.to_dict()
-            item['doc_id'] = doc.id
-            menu.append(item)
+        menu = storage.list_menu(category=category)
         
         return jsonify({
             "success": True,
@@ -121,39 +302,28 @@ def get_menu_by_category(category):
             "error": "Failed to fetch menu by category"
         }), 500
 
-@app.route('/order', methods=['POST'])
-def place_order():
-    """Process and place an order from natural language input"""
-    
-    # Check database connection first
-    if db is None:
-        logger.error("Order attempt failed - database not connected")
-        return jsonify({
-            "success": False,
-            "error": "Database service unavailable",
-            "details": "Please contact administrator"
-        }), 503
+def replay_response(stored: StoredResponse) -> Response:
+    """Send the stored reply to the original of a repeated order"""
+    response = Response(stored.body, status=stored.status, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def take_order(user_text: str, user_info, idempotency_key: Optional[IdempotencyKey] = None):
+    """Parse a message that needs the menu and place the order it describes"""
+    # Match and price against the shared menu index when one is published
+    # (MENU_INDEX_DIR), otherwise load the menu from the datastore
+    shared_index = menu_index_store.current()
+    if shared_index is not None and not shared_index.available_count:
+        shared_index = None
     
-    try:
-        data = request.json
-        user_text = data.get('message', '').strip()
-        user_info = data.get('user', {"name": "Guest", "phone": None})
-        
-        if not user_text:
-            return jsonify({
-                "success": False,
-                "error": "Message is required"
-            }), 400
-        
-        logger.info(f"Processing order: {user_text}")
-        
+    menu_docs = None
+    menu_names = None
+    if shared_index is None:
+        MENU_SOURCE.inc(source="datastore")
         # Get menu items with error handling
         try:
-            menu_docs = []
-            for doc in db.collection('menus').where('available', '==', True).stream():
-                menu_item = doc.to_dict()
-                menu_item['doc_id'] = doc.id
-                menu_docs.append(menu_item)
+            with ORDER_STAGE_SECONDS.time(stage="menu_load"):
+                menu_docs = fetch_available_menu()
             
             if not menu_docs:
                 logger.warning("No menu items in database")
@@ -164,6 +334,7 @@ def place_order():
                 }), 503
                 
         except Exception as e:
+            ERRORS.inc(stage="menu_load")
             logger.error(f"Failed to fetch menu: {e}")
             return jsonify({
                 "success": False,
@@ -172,140 +343,217 @@ def place_order():
             }), 500
         
         menu_names = [item['name'] for item in menu_docs]
+    else:
+        MENU_SOURCE.inc(source="index")
+    
+    # Parse the order using NLP (inline or in the worker pool, see NLP_EXECUTOR)
+    try:
+        with ORDER_STAGE_SECONDS.time(stage="parse"):
+            parsed = nlp_executor.parse(user_text, menu_names, index=shared_index, budget=NLP_PARSE_BUDGET)
+    except NLPTimeoutError as e:
+        ERRORS.inc(stage="parse")
+        return jsonify({
+            "success": False,
+            "error": "Order processing is busy, please try again",
+            "details": str(e)
+        }), 503
+    
+    logger.debug("Parsed result: %s", parsed)
+    INTENTS.inc(intent=parsed['intent'])
+    
+    # Handle different intents (the transformer can still find these
+    # when no pattern matched)
+    if parsed['intent'] in STATIC_RESPONSES:
+        return send_prepared(STATIC_RESPONSES[parsed['intent']])
+    
+    elif parsed['intent'] == 'show_menu':
+        return show_menu_response(shared_index)
+    
+    elif parsed['intent'] == 'order_food':
+        # Process the food order
+        if not parsed['items']:
+            return jsonify({
+                "success": False,
+                "error": "No food items found in your message. Please specify what you'd like to order."
+            }), 400
         
-        # Parse the order using NLP
-        parsed = parse_order(user_text, menu_names)
+        # Build order items
+        order_items = []
+        total_price = 0
+        quantities = parsed['quantities'] if parsed['quantities'] else [1] * len(parsed['items'])
         
-        logger.info(f"Parsed result: {parsed}")
+        # Ensure we have quantities for all items
+        while len(quantities) < len(parsed['items']):
+            quantities.append(1)
         
-        # Handle different intents
-        if parsed['intent'] in ['greeting', 'help']:
-            return jsonify({
-                "success": True,
-                "intent": parsed['intent'],
-                "response": "Hello! Welcome to our restaurant. You can order food by saying something like 'I want 2 pizzas and 1 coke' or ask to 'show menu' to see available items."
-            }), 200
+        for i, item_name in enumerate(parsed['items']):
+            # Find matching menu item
+            if shared_index is not None:
+                menu_item = shared_index.find_item(item_name)
+            else:
+                menu_item = next((m for m in menu_docs if m['name'].lower() == item_name.lower()), None)
+            
+            if menu_item and menu_item.get('available', True):
+                quantity = quantities[i] if i < len(quantities) else 1
+                item_total = menu_item['price'] * quantity
+                
+                order_items.append({
+                    "item_id": menu_item['item_id'],
+                    "name": menu_item['name'],
+                    "quantity": quantity,
+                    "unit_price": menu_item['price'],
+                    "total_price": item_total
+                })
+                total_price += item_total
         
-        elif parsed['intent'] == 'show_menu':
+        if not order_items:
             return jsonify({
-                "success": True,
-                "intent": parsed['intent'],
-                "response": "Here's our menu:",
-                "menu": menu_docs
-            }), 200
+                "success": False,
+                "error": "No valid menu items found. Please check the menu and try again."
+            }), 400
         
-        elif parsed['intent'] == 'cancel_order':
-            return jsonify({
-                "success": True,
-                "intent": parsed['intent'],
-                "response": "I understand you want to cancel. Please specify your order ID or contact our staff for assistance."
-            }), 200
+        # Make sure no other worker is placing (or has placed) this same order
+        if idempotency_key is not None:
+            stored = idempotency_store.claim(idempotency_key, storage)
+            if stored is not None:
+                return replay_response(stored)
         
-        elif parsed['intent'] == 'order_food':
-            # Process the food order
-            if not parsed['items']:
-                return jsonify({
-                    "success": False,
-                    "error": "No food items found in your message. Please specify what you'd like to order."
-                }), 400
-            
-            # Build order items
-            order_items = []
-            total_price = 0
-            quantities = parsed['quantities'] if parsed['quantities'] else [1] * len(parsed['items'])
-            
-            # Ensure we have quantities for all items
-            while len(quantities) < len(parsed['items']):
-                quantities.append(1)
-            
-            for i, item_name in enumerate(parsed['items']):
-                # Find matching menu item
-                menu_item = next((m for m in menu_docs if m['name'].lower() == item_name.lower()), None)
-                
-                if menu_item:
-                    quantity = quantities[i] if i < len(quantities) else 1
-                    item_total = menu_item['price'] * quantity
-                    
-                    order_items.append({
-                        "item_id": menu_item['item_id'],
-                        "name": menu_item['name'],
-                        "quantity": quantity,
-                        "unit_price": menu_item['price'],
-                        "total_price": item_total
-                    })
-                    total_price += item_total
-            
-            if not order_items:
-                return jsonify({
-                    "success": False,
-                    "error": "No valid menu items found. Please check the menu and try again."
-                }), 400
+        # Generate order ID
+        order_id = f"ORD_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        
+        # Create order document
+        order_doc = {
+            "order_id": order_id,
+            "user": user_info,
+            "items": order_items,
+            "total_price": total_price,
+            "status": "Pending",
+            "original_message": user_text,
+            "created_at": datetime.datetime.utcnow(),
+            "updated_at": datetime.datetime.utcnow()
+        }
+        
+        # Save to database with error handling
+        try:
+            with ORDER_STAGE_SECONDS.time(stage="order_set"):
+                storage.create_order(order_id, order_doc)
             
-            # Generate order ID
-            order_id = f"ORD_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+            # Log the conversation
+            chat_log = {
+                "order_id": order_id,
+                "sender": "user",
+                "message": user_text,
+                "timestamp": datetime.datetime.utcnow(),
+                "parsed_intent": parsed['intent'],
+                "extracted_items": parsed['items']
+            }
+            with ORDER_STAGE_SECONDS.time(stage="chat_log"):
+                storage.add_chat_log(chat_log)
             
-            # Create order document
-            order_doc = {
+            # Add system response to chat log
+            items_summary = ', '.join(f"{item['quantity']}x {item['name']}" for item in order_items)
+            response_message = f"Order confirmed! Your order ID is {order_id}. Total: ${total_price}. Items: {items_summary}"
+            system_log = {
                 "order_id": order_id,
-                "user": user_info,
-                "items": order_items,
-                "total_price": total_price,
-                "status": "Pending",
-                "original_message": user_text,
-                "created_at": datetime.datetime.utcnow(),
-                "updated_at": datetime.datetime.utcnow()
+                "sender": "system",
+                "message": response_message,
+                "timestamp": datetime.datetime.utcnow()
             }
+            with ORDER_STAGE_SECONDS.time(stage="chat_log"):
+                storage.add_chat_log(system_log)
             
-            # Save to database with error handling
-            try:
-                db.collection('orders').document(order_id).set(order_doc)
-                
-                # Log the conversation
-                chat_log = {
-                    "order_id": order_id,
-                    "sender": "user",
-                    "message": user_text,
-                    "timestamp": datetime.datetime.utcnow(),
-                    "parsed_intent": parsed['intent'],
-                    "extracted_items": parsed['items']
-                }
-                db.collection('chat_logs').add(chat_log)
-                
-                # Add system response to chat log
-                response_message = f"Order confirmed! Your order ID is {order_id}. Total: ${total_price}. Items: {', '.join([f'{item['quantity']}x {item['name']}' for item in order_items])}"
-                system_log = {
-                    "order_id": order_id,
-                    "sender": "system",
-                    "message": response_message,
-                    "timestamp": datetime.datetime.utcnow()
-                }
-                db.collection('chat_logs').add(system_log)
-                
-                logger.info(f"Order placed successfully: {order_id}")
-                
-            except Exception as e:
-                logger.error(f"Failed to save order: {e}")
-                return jsonify({
-                    "success": False,
-                    "error": "Failed to save order",
-                    "details": str(e)
-                }), 500
+            logger.info("Order placed successfully: %s", order_id)
             
+        except Exception as e:
+            ERRORS.inc(stage="order_save")
+            logger.error(f"Failed to save order: {e}")
             return jsonify({
-                "success": True,
-                "intent": parsed['intent'],
-                "order": order_doc,
-                "response": response_message
-            }), 201
+                "success": False,
+                "error": "Failed to save order",
+                "details": str(e)
+            }), 500
         
-        else:
+        return jsonify({
+            "success": True,
+            "intent": parsed['intent'],
+            "order": order_doc,
+            "response": response_message
+        }), 201
+    
+    else:
+        return jsonify({
+            "success": True,
+            "intent": parsed['intent'],
+            "response": "I didn't quite understand that. You can order food, ask for the menu, or get help. Try saying something like 'I want 2 pizzas' or 'show me the menu'."
+        }), 200
+
+@app.route('/order', methods=['POST'])
+def place_order():
+    """Process and place an order from natural language input"""
+    
+    # Check database connection first
+    if not storage.available:
+        logger.error("Order attempt failed - database not connected")
+        return jsonify({
+            "success": False,
+            "error": "Database service unavailable",
+            "details": "Please contact administrator"
+        }), 503
+    
+    try:
+        data = request.json
+        user_text = data.get('message', '').strip()
+        user_info = data.get('user', {"name": "Guest", "phone": None})
+        
+        if not user_text:
             return jsonify({
-                "success": True,
-                "intent": parsed['intent'],
-                "response": "I didn't quite understand that. You can order food, ask for the menu, or get help. Try saying something like 'I want 2 pizzas' or 'show me the menu'."
-            }), 200
+                "success": False,
+                "error": "Message is required"
+            }), 400
+        
+        logger.debug("Processing order: %s", user_text)
+        
+        # Greetings, help, cancellations and menu requests do not depend on the
+        # menu, so answer them before it is loaded (or the parser is called)
+        intent = match_intent(user_text)
+        if intent is not None and intent != 'order_food':
+            INTENTS.inc(intent=intent)
+            if intent == 'show_menu':
+                return show_menu_response(menu_index_store.current())
+            return send_prepared(STATIC_RESPONSES[intent])
+        
+        # Repeats of an order (same Idempotency-Key, or the same message from
+        # the same user and browser session within IDEMPOTENCY_WINDOW) get the original reply
+        idempotency_key = idempotency_store.key_for(request.headers.get(IDEMPOTENCY_HEADER),
+                                                    request_session(),
+                                                    user_info, user_text)
+        if idempotency_key is None:
+            return take_order(user_text, user_info)
+        
+        stored = idempotency_store.begin(idempotency_key)
+        if stored is not None:
+            return replay_response(stored)
+        response = None
+        try:
+            response = app.make_response(take_order(user_text, user_info, idempotency_key))
+        finally:
+            if response is not None:
+                idempotency_store.finish(idempotency_key, storage, response.status_code, response.get_data())
+            else:
+                idempotency_store.finish(idempotency_key, storage)
+        return response
+    
+    except IdempotencyConflict as e:
+        response = jsonify({
+            "success": False,
+            "error": str(e)
+        })
+        if e.retry_after is not None:
+            response.headers['Retry-After'] = str(e.retry_after)
+        return response, e.status
     
     except Exception as e:
+        ERRORS.inc(stage="order")
         logger.error(f"Error processing order: {e}", exc_info=True)
         return jsonify({
             "success": False,
@@ -316,7 +564,7 @@ def place_order():
 @app.route('/orders', methods=['GET'])
 def list_orders():
     """Get list of orders with optional filtering"""
-    if db is None:
+    if not storage.available:
         return jsonify({
             "success": False,
             "error": "Database not available"
@@ -326,16 +574,8 @@ def list_orders():
         limit = request.args.get('limit', 50, type=int)
         status_filter = request.args.get('status', None)
         
-        query = db.collection('orders').order_by('created_at', direction='DESCENDING').limit(limit)
-        
-        if status_filter:
-            query = query.where('status', '==', status_filter)
-        
-        docs = query.stream()
         orders = []
-        for doc in docs:
-            order = doc.to_dict()
-            order['doc_id'] = doc.id
+        for order in storage.list_orders(limit=limit, status=status_filter):
             # Convert timestamps to ISO format
             if 'created_at' in order:
                 order['created_at'] = order['created_at'].isoformat() if hasattr(order['created_at'], 'isoformat') else str(order['created_at'])
@@ -359,24 +599,21 @@ def list_orders():
 @app.route('/orders/<order_id>', methods=['GET'])
 def get_order(order_id):
     """Get specific order by ID"""
-    if db is None:
+    if not storage.available:
         return jsonify({
             "success": False,
             "error": "Database not available"
         }), 503
     
     try:
-        doc = db.collection('orders').document(order_id).get()
+        order = storage.get_order(order_id)
         
-        if not doc.exists:
+        if order is None:
             return jsonify({
                 "success": False,
                 "error": "Order not found"
             }), 404
         
-        order = doc.to_dict()
-        order['doc_id'] = doc.id
-        
         # Convert timestamps
         if 'created_at' in order:
             order['created_at'] = order['created_at'].isoformat() if hasattr(order['created_at'], 'isoformat') else str(order['created_at'])
@@ -398,7 +635,7 @@ def get_order(order_id):
 @app.route('/orders/<order_id>/status', methods=['PUT'])
 def update_order_status(order_id):
     """Update order status"""
-    if db is None:
+    if not storage.available:
         return jsonify({
             "success": False,
             "error": "Database not available"
@@ -422,11 +659,17 @@ def update_order_status(order_id):
             }), 400
         
         # Update order
-        db.collection('orders').document(order_id).update({
+        updated = storage.update_order(order_id, {
             'status': new_status,
             'updated_at': datetime.datetime.utcnow()
         })
         
+        if not updated:
+            return jsonify({
+                "success": False,
+                "error": "Order not found"
+            }), 404
+        
         return jsonify({
             "success": True,
             "message": f"Order {order_id} status updated to {new_status}"
@@ -442,19 +685,16 @@ def update_order_status(order_id):
 @app.route('/chat/<order_id>', methods=['GET'])
 def get_chat_history(order_id):
     """Get chat history for an order"""
-    if db is None:
+    if not storage.available:
         return jsonify({
             "success": False,
             "error": "Database not available"
         }), 503
     
     try:
-        docs = db.collection('chat_logs').where('order_id', '==', order_id).order_by('timestamp').stream()
         chat_history = []
         
-        for doc in docs:
-            chat = doc.to_dict()
-            chat['doc_id'] = doc.id
+        for chat in storage.get_chat_logs(order_id):
             if 'timestamp' in chat:
                 chat['timestamp'] = chat['timestamp'].isoformat() if hasattr(chat['timestamp'], 'isoformat') else str(chat['timestamp'])
             chat_history.append(chat)
@@ -495,6 +735,13 @@ if __name__ == '__main__':
     
     logger.info(f"Starting Smart Restaurant Ordering Assistant on port {port}")
     logger.info(f"Debug mode: {debug}")
-    logger.info(f"Database status: {'Connected' if db else 'NOT CONNECTED'}")
+    # Validate the datastore at startup (see STORAGE_BACKEND). Importing the
+    # app does not connect; workers connect on their first request.
+    if not storage.available:
+        logger.error("="*60)
+        logger.error("CRITICAL: Firebase database not initialized!")
+        logger.error("Set FIREBASE_SERVICE_ACCOUNT environment variable")
+        logger.error("="*60)
+    logger.info(f"Database status: {'Connected' if storage.available else 'NOT CONNECTED'} ({storage.name})")
     
     app.run(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
@@ -1,42 +1,237 @@
 import os
 import json
+import time
+import random
+import string
 import logging
-from typing import Optional
+import itertools
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterator
 
-try:
-    import firebase_admin
-    from firebase_admin import credentials, firestore
-    FIREBASE_AVAILABLE = True
-except ImportError:
-    FIREBASE_AVAILABLE = False
+from logging_setup import configure_logging
+
+# The SDK takes about half a second to import, so it is loaded on first connect
+FIREBASE_AVAILABLE = importlib.util.find_spec('firebase_admin') is not None
+if not FIREBASE_AVAILABLE:
     print("Firebase Admin SDK not installed. Run: pip install firebase-admin")
+firebase_admin = credentials = firestore = BulkWriterOptions = None
+
+def _load_sdk():
+    """Import the Firebase SDK modules into this module's namespace"""
+    global firebase_admin, credentials, firestore, BulkWriterOptions
+    if firebase_admin is None:
+        import firebase_admin as admin
+        from firebase_admin import credentials as admin_credentials, firestore as admin_firestore
+        from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions as options
+        firebase_admin, credentials, firestore, BulkWriterOptions = admin, admin_credentials, admin_firestore, options
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
+# Firestore commits at most 500 writes per batch
+BULK_BATCH_SIZE = 500
+# Parallel batch commits when BulkWriter is not available
+BULK_PARALLELISM = 4
+BULK_MAX_ATTEMPTS = 5
+# gRPC codes worth retrying: DEADLINE_EXCEEDED, RESOURCE_EXHAUSTED, ABORTED, INTERNAL, UNAVAILABLE
+RETRYABLE_CODES = {4, 8, 10, 13, 14}
+
+class _RampUpLimiter:
+    """Firestore's 500/50/5 rule: start at initial_rate ops/s, +50% every 5 minutes"""
+    
+    def __init__(self, initial_rate: int, max_rate: Optional[int] = None):
+        self.initial_rate = initial_rate
+        self.max_rate = max_rate
+        self._start = time.monotonic()
+        self._next_slot = self._start
+        self._lock = threading.Lock()
+    
+    def rate(self) -> float:
+        rate = self.initial_rate * 1.5 ** int((time.monotonic() - self._start) // 300)
+        return min(rate, self.max_rate) if self.max_rate else rate
+    
+    def acquire(self, ops: int):
+        """Block until `ops` more writes fit under the current rate"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + ops / self.rate()
+        if slot > now:
+            time.sleep(slot - now)
+
+class _BulkSession:
+    """Bulk writes through one BulkWriter, or parallel WriteBatch commits
+    
+    BulkWriter sends batches in parallel, ramps up from
+    initial_ops_per_second under the 500/50/5 rule and retries transient
+    errors. Clients without it fall back to parallel commits of 500 under
+    the same ramp-up. Batch commits are atomic, so one bad write there
+    fails its whole batch. The ramp-up carries over between write() calls.
+    """
+    
+    def __init__(self, db, initial_ops_per_second: int = 500, max_ops_per_second: int = None):
+        self.db = db
+        self._lock = threading.Lock()
+        self._succeeded: List[str] = []
+        self._failed: Dict[str, str] = {}
+        self._writer = None
+        self._limiter = None
+        self._pool = None
+        
+        if hasattr(db, 'bulk_writer'):
+            self._writer = db.bulk_writer(BulkWriterOptions(
+                initial_ops_per_second=initial_ops_per_second,
+                max_ops_per_second=max_ops_per_second or max(initial_ops_per_second, 10000)
+            ))
+            self._writer.on_write_result(self._on_result)
+            self._writer.on_write_error(self._on_error)
+        else:
+            self._limiter = _RampUpLimiter(initial_ops_per_second, max_ops_per_second)
+            self._pool = ThreadPoolExecutor(max_workers=BULK_PARALLELISM)
+    
+    def _on_result(self, reference, result, bulk_writer):
+        with self._lock:
+            self._succeeded.append(reference.id)
+    
+    def _on_error(self, failure, bulk_writer) -> bool:
+        if failure.code in RETRYABLE_CODES and failure.attempts < BULK_MAX_ATTEMPTS:
+            return True
+        with self._lock:
+            self._failed[failure.operation.reference.id] = failure.message
+        return False
+    
+    def write(self, operations: list) -> Dict[str, Any]:
+        """Apply (kind, reference, data, merge) writes and wait for them all"""
+        if self._writer is not None:
+            for kind, reference, data, merge in operations:
+                if kind == "set":
+                    self._writer.set(reference, data, merge=merge)
+                elif kind == "update":
+                    self._writer.update(reference, data)
+                else:
+                    self._writer.delete(reference)
+            self._writer.flush()
+        else:
+            chunks = [operations[i:i + BULK_BATCH_SIZE] for i in range(0, len(operations), BULK_BATCH_SIZE)]
+            list(self._pool.map(self._commit, chunks))
+        
+        with self._lock:
+            succeeded, failed = self._succeeded, self._failed
+            self._succeeded, self._failed = [], {}
+        if failed:
+            logger.warning(f"Bulk write: {len(succeeded)} succeeded, {len(failed)} failed")
+        return {"succeeded": succeeded, "failed": failed}
+    
+    def _commit(self, chunk: list):
+        self._limiter.acquire(len(chunk))
+        batch = self.db.batch()
+        for kind, reference, data, merge in chunk:
+            if kind == "set":
+                batch.set(reference, data, merge=merge)
+            elif kind == "update":
+                batch.update(reference, data)
+            else:
+                batch.delete(reference)
+        
+        for attempt in range(1, BULK_MAX_ATTEMPTS + 1):
+            try:
+                batch.commit()
+                with self._lock:
+                    self._succeeded.extend(reference.id for _, reference, _, _ in chunk)
+                return
+            except Exception as e:
+                # google.api_core errors carry a grpc.StatusCode whose value is (code, name)
+                status = getattr(e, 'grpc_status_code', None)
+                code = status.value[0] if status is not None else None
+                if code not in RETRYABLE_CODES or attempt == BULK_MAX_ATTEMPTS:
+                    with self._lock:
+                        for _, reference, _, _ in chunk:
+                            self._failed[reference.id] = str(e)
+                    return
+                time.sleep(0.5 * 2 ** attempt)
+    
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._pool is not None:
+            self._pool.shutdown()
+
 class FirebaseClient:
-    """Firebase Firestore client wrapper"""
+    """Firebase Firestore client wrapper
+    
+    Constructing it does nothing. Credentials are loaded and the Firestore
+    client is created on first use of `db` (or an explicit connect()), and
+    again in every forked child, so workers never share the parent's gRPC
+    channel. No request reaches Firebase until a query or ping().
+    """
     
     def __init__(self):
-        self.db = None
         self.app = None
-        self._initialize_firebase()
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+    
+    def _reset_after_fork(self):
+        # The parent's channel (and possibly a held lock) must not be reused
+        self._db = None
+        self._pid = None
+        self._lock = threading.Lock()
+    
+    @property
+    def db(self):
+        """This process's Firestore client, connecting on first use (None if unavailable)"""
+        if self._pid != os.getpid():
+            self.connect()
+        return self._db
+    
+    @db.setter
+    def db(self, value):
+        """Use a given client in this process (e.g. the in-memory stand-in)"""
+        self._db = value
+        self._pid = os.getpid()
+    
+    def connect(self) -> bool:
+        """Load credentials and create this process's Firestore client
+        
+        Makes no network calls; use ping() to check the database is reachable.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return self._db is not None
+            self._pid = os.getpid()
+            self._db = None
+            
+            if self.app is None:
+                self.app = self._initialize_firebase()
+            if self.app is not None:
+                try:
+                    # A client of our own rather than firestore.client(), which
+                    # caches one per app and would hand the parent's to a fork
+                    project = self.app.project_id or os.environ.get('GOOGLE_CLOUD_PROJECT')
+                    self._db = firestore.Client(credentials=self.app.credential.get_credential(), project=project)
+                except Exception as e:
+                    logger.error(f"❌ Failed to create Firestore client: {e}")
+            return self._db is not None
     
     def _initialize_firebase(self):
-        """Initialize Firebase connection"""
+        """Initialize the Firebase app from the configured credentials"""
         
         if not FIREBASE_AVAILABLE:
             logger.error("Firebase Admin SDK not available")
-            return
+            return None
         
         try:
+            _load_sdk()
+            
             # Check if Firebase is already initialized
             if firebase_admin._apps:
                 logger.info("Firebase already initialized")
-                self.app = firebase_admin.get_app()
-                self.db = firestore.client()
-                return
+                return firebase_admin.get_app()
             
             # Try to get credentials from environment variable (for deployment)
             if 'FIREBASE_SERVICE_ACCOUNT' in os.environ:
@@ -50,17 +245,17 @@ class FirebaseClient:
                     
                     if missing_fields:
                         logger.error(f"Missing required fields in credentials: {missing_fields}")
-                        return
+                        return None
                     
                     cred = credentials.Certificate(sa_info)
                     logger.info("Successfully parsed credentials from environment")
                     
                 except json.JSONDecodeError as e:
                     logger.error(f"Invalid JSON in FIREBASE_SERVICE_ACCOUNT: {e}")
-                    return
+                    return None
                 except Exception as e:
                     logger.error(f"Error parsing credentials: {e}")
-                    return
+                    return None
             
             # Try to load from local file (for development)
             elif os.path.exists("serviceAccountKey.json"):
@@ -78,34 +273,34 @@ class FirebaseClient:
                 logger.error("Please set FIREBASE_SERVICE_ACCOUNT environment variable")
                 logger.error("OR place serviceAccountKey.json file in project directory")
                 logger.error("="*60)
-                return
+                return None
             
             # Initialize Firebase
-            self.app = firebase_admin.initialize_app(cred)
-            self.db = firestore.client()
-            
+            app = firebase_admin.initialize_app(cred)
             logger.info("✅ Firebase initialized successfully")
-            
-            # Test connection
-            self._test_connection()
+            return app
             
         except Exception as e:
             logger.error(f"❌ Failed to initialize Firebase: {e}")
             logger.error("Please check your credentials and try again")
-            self.db = None
+            return None
     
-    def _test_connection(self):
-        """Test Firebase connection"""
+    def ping(self) -> bool:
+        """Check the database is reachable with a live read"""
+        if not self.is_connected():
+            return False
         try:
             # Try to read from a collection
             test_ref = self.db.collection('_test').limit(1)
             list(test_ref.stream())
             logger.info("✅ Firebase connection test successful")
+            return True
         except Exception as e:
             logger.error(f"❌ Firebase connection test failed: {e}")
+            return False
     
     def is_connected(self) -> bool:
-        """Check if Firebase is connected"""
+        """Check if Firebase is configured (connecting lazily; no network I/O)"""
         return self.db is not None
     
     def get_collection(self, collection_name: str):
@@ -140,6 +335,30 @@ class FirebaseClient:
             return doc.to_dict()
         return None
     
+    def get_documents(self, collection_name: str, document_ids: List[str],
+                      fields: List[str] = None) -> List[Optional[Dict[str, Any]]]:
+        """Fetch many documents in one get_all round trip
+        
+        Results follow the order of document_ids, with None for missing
+        documents; fields limits each document to those fields.
+        """
+        if not self.is_connected():
+            raise Exception("Firebase not connected")
+        
+        if not document_ids:
+            return []
+        
+        collection_ref = self.db.collection(collection_name)
+        # get_all streams results back in any order; index them by id
+        references = [collection_ref.document(document_id) for document_id in dict.fromkeys(document_ids)]
+        found = {}
+        for doc in self.db.get_all(references, field_paths=fields):
+            if doc.exists:
+                found[doc.id] = doc.to_dict()
+        
+        # A repeated id gets its own copy of the document
+        return [dict(found[document_id]) if document_id in found else None for document_id in document_ids]
+    
     def update_document(self, collection_name: str, document_id: str, data: dict):
         """Update a document"""
         if not self.is_connected():
@@ -156,11 +375,104 @@ class FirebaseClient:
         doc_ref = self.db.collection(collection_name).document(document_id)
         doc_ref.delete()
     
-    def query_documents(self, collection_name: str, filters: list = None, order_by: str = None, limit: int = None):
-        """Query documents with filters"""
+    def add_documents(self, collection_name: str, documents: List[Dict[str, Any]], id_field: str = None,
+                      merge: bool = False, document_ids: List[str] = None, **options) -> Dict[str, Any]:
+        """Write many documents
+        
+        Ids come from document_ids, or data[id_field], or are generated.
+        Returns {"succeeded": [ids], "failed": {id: error}}; see _bulk_write
+        for the rate options and session.
+        """
+        if not self.is_connected():
+            raise Exception("Firebase not connected")
+        
+        collection_ref = self.db.collection(collection_name)
+        operations = []
+        for i, data in enumerate(documents):
+            if document_ids is not None:
+                document_id = document_ids[i]
+            else:
+                document_id = str(data[id_field]) if id_field else None
+            operations.append(("set", collection_ref.document(document_id), data, merge))
+        return self._bulk_write(operations, **options)
+    
+    def update_documents(self, collection_name: str, updates: Dict[str, Dict[str, Any]], **options) -> Dict[str, Any]:
+        """Apply {document_id: fields} updates; missing documents are reported as failed"""
+        if not self.is_connected():
+            raise Exception("Firebase not connected")
+        
+        collection_ref = self.db.collection(collection_name)
+        operations = [("update", collection_ref.document(document_id), data, None)
+                      for document_id, data in updates.items()]
+        return self._bulk_write(operations, **options)
+    
+    def delete_documents(self, collection_name: str, document_ids: List[str], **options) -> Dict[str, Any]:
+        """Delete documents by id"""
+        if not self.is_connected():
+            raise Exception("Firebase not connected")
+        
+        collection_ref = self.db.collection(collection_name)
+        operations = [("delete", collection_ref.document(document_id), None, None)
+                      for document_id in document_ids]
+        return self._bulk_write(operations, **options)
+    
+    def _bulk_write(self, operations: list, session: "_BulkSession" = None, **options) -> Dict[str, Any]:
+        """Run (kind, reference, data, merge) writes in bulk
+        
+        Returns {"succeeded": [ids], "failed": {id: error}}; see
+        _BulkSession for the rate options. Pass an open bulk_session() to
+        keep its ramp-up across calls; it is left open.
+        """
+        if session is not None:
+            return session.write(operations)
+        session = self.bulk_session(**options)
+        try:
+            return session.write(operations)
+        finally:
+            session.close()
+    
+    def bulk_session(self, initial_ops_per_second: int = 500, max_ops_per_second: int = None) -> "_BulkSession":
+        """Open a bulk writer for several rounds of writes sharing one ramp-up; close() it when done"""
         if not self.is_connected():
             raise Exception("Firebase not connected")
+        return _BulkSession(self.db, initial_ops_per_second, max_ops_per_second)
+    
+    def purge_collection(self, collection_name: str, page_size: int = 1000, start_after: str = None,
+                         on_page=None, **options) -> Dict[str, int]:
+        """Delete every document in a collection, one page of ids at a time
+        
+        Pages are key-only queries in document id order, deleted through
+        one bulk session so the write rate keeps ramping up across pages.
+        After each page, on_page(last_id, deleted, failed) is called with
+        running totals; pass last_id back as start_after to resume an
+        interrupted purge without rescanning what is already gone.
+        Documents that fail to delete are skipped and counted.
+        """
+        filters = None
+        if start_after is not None:
+            filters = [('__name__', '>', self.db.collection(collection_name).document(start_after))]
+        documents = self.iter_documents(collection_name, filters=filters, fields=['__name__'], page_size=page_size)
         
+        deleted = failed = 0
+        session = self.bulk_session(**options)
+        try:
+            while True:
+                ids = [doc['doc_id'] for doc in itertools.islice(documents, page_size)]
+                if not ids:
+                    break
+                collection_ref = self.db.collection(collection_name)
+                result = session.write([("delete", collection_ref.document(document_id), None, None)
+                                        for document_id in ids])
+                deleted += len(result['succeeded'])
+                failed += len(result['failed'])
+                if on_page is not None:
+                    on_page(ids[-1], deleted, failed)
+        finally:
+            session.close()
+        return {"deleted": deleted, "failed": failed}
+    
+    def _build_query(self, collection_name: str, filters: list = None, order_by=None):
+        """Apply filters and ordering to a collection query"""
         query = self.db.collection(collection_name)
         
         # Apply filters
@@ -175,31 +487,178 @@ class FirebaseClient:
                 query = query.order_by(order_by)
             else:
                 field, direction = order_by
-                query = query.order_by(field, direction=firestore.Query.DESCENDING if direction == 'desc' else firestore.Query.ASCENDING)
+                query = query.order_by(field, direction='DESCENDING' if direction == 'desc' else 'ASCENDING')
+        
+        return query
+    
+    def iter_documents(self, collection_name: str, filters: list = None, order_by=None, limit: int = None,
+                       fields: List[str] = None, page_size: int = None) -> Iterator[Dict[str, Any]]:
+        """Yield matching documents one at a time
         
-        # Apply limit
-        if limit:
-            query = query.limit(limit)
+        fields projects each document to those fields (plus doc_id). With
+        page_size the query runs as a series of cursor-paged requests, so a
+        walk over a whole collection holds one page at a time and never
+        keeps a single stream open for minutes.
+        """
+        if not self.is_connected():
+            raise Exception("Firebase not connected")
         
-        # Execute query
-        docs = query.stream()
-        results = []
+        query = self._build_query(collection_name, filters, order_by)
+        if fields:
+            projection = list(fields)
+            # Cursors are built from the ordering field, so keep it in the projection
+            if order_by:
+                order_field = order_by if isinstance(order_by, str) else order_by[0]
+                if order_field not in projection:
+                    projection.append(order_field)
+            query = query.select(projection)
         
-        for doc in docs:
-            doc_data = doc.to_dict()
-            doc_data['doc_id'] = doc.id
-            results.append(doc_data)
+        if not page_size:
+            if limit:
+                query = query.limit(limit)
+            for doc in query.stream():
+                yield self._document_data(doc)
+            return
         
-        return results
+        remaining = limit
+        last_doc = None
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            page = query.start_after(last_doc) if last_doc is not None else query
+            
+            count = 0
+            for doc in page.limit(size).stream():
+                count += 1
+                last_doc = doc
+                yield self._document_data(doc)
+            
+            if remaining is not None:
+                remaining -= count
+            if count < size:
+                return
+    
+    def aggregate(self, collection_name: str, filters: list = None, sum_fields: List[str] = None,
+                  avg_fields: List[str] = None) -> Dict[str, Any]:
+        """Count matching documents and sum/average fields server-side
+        
+        Runs one aggregation query, billed at one read per 1000 index
+        entries instead of one per document. Returns
+        {"count": n, "sum": {field: total}, "avg": {field: mean or None}}.
+        """
+        if not self.is_connected():
+            raise Exception("Firebase not connected")
+        
+        aggregation = self._build_query(collection_name, filters).count(alias='count')
+        aliases = {'count': ('count', None)}
+        for kind, fields in (('sum', sum_fields or []), ('avg', avg_fields or [])):
+            for i, field in enumerate(fields):
+                alias = f"{kind}_{i}"
+                aggregation = getattr(aggregation, kind)(field, alias=alias)
+                aliases[alias] = (kind, field)
+        
+        summary: Dict[str, Any] = {"count": 0, "sum": {}, "avg": {}}
+        for row in aggregation.get():
+            for result in row:
+                kind, field = aliases[result.alias]
+                if kind == 'count':
+                    summary['count'] = result.value
+                else:
+                    summary[kind][field] = result.value
+        return summary
+    
+    def distinct_values(self, collection_name: str, field: str, filters: list = None) -> List[Any]:
+        """Distinct values of a field, in order, for one read per value
+        
+        Skips from each value to the next with a limit(1) range query
+        rather than scanning the collection. Without filters, or with
+        filters on field only, the single-field index Firestore creates by
+        default is enough. Equality filters on other fields need a
+        composite index on those fields followed by field (ascending);
+        Firestore's error message links to creating it.
+        """
+        if not self.is_connected():
+            raise Exception("Firebase not connected")
+        
+        values = []
+        query = self._build_query(collection_name, filters, order_by=field).select([field]).limit(1)
+        page = query
+        while True:
+            docs = list(page.stream())
+            if not docs:
+                return values
+            value = docs[0].get(field)
+            values.append(value)
+            page = query.where(field, '>', value)
+    
+    def sample_documents(self, collection_name: str, count: int, field: str = None,
+                         seed: int = None) -> List[Dict[str, Any]]:
+        """Up to count distinct documents picked at random, for about one read each
+        
+        With field (a number or timestamp spread across the collection, such
+        as created_at), each pick is the first document at or after a random
+        value between the field's smallest and largest; otherwise the first
+        at or after a random document id. Sampling is only roughly uniform:
+        documents after gaps are picked more often, and structured ids leave
+        many gaps, so prefer a field.
+        """
+        if not self.is_connected():
+            raise Exception("Firebase not connected")
+        
+        rng = random.Random(seed)
+        collection_ref = self.db.collection(collection_name)
+        if field:
+            ends = [list(collection_ref.order_by(field, direction=direction).limit(1).stream())
+                    for direction in ('ASCENDING', 'DESCENDING')]
+            if not ends[0]:
+                return []
+            low, high = ends[0][0].get(field), ends[1][0].get(field)
+            query = collection_ref.order_by(field)
+            
+            def pick():
+                pivot = low + (high - low) * rng.random()
+                return query.where(field, '>=', pivot).limit(1)
+        else:
+            alphabet = string.ascii_letters + string.digits + '_'
+            
+            def pick():
+                pivot = collection_ref.document(''.join(rng.choice(alphabet) for _ in range(20)))
+                return collection_ref.where('__name__', '>=', pivot).limit(1)
+        
+        picked: Dict[str, Dict[str, Any]] = {}
+        # Small collections repeat picks, so give up after a few tries per sample
+        for _ in range(count * 3):
+            if len(picked) >= count:
+                break
+            docs = list(pick().stream())
+            if not docs:
+                # Past the last id: wrap around to the first document
+                docs = list(collection_ref.limit(1).stream())
+            for doc in docs:
+                picked[doc.id] = self._document_data(doc)
+        return list(picked.values())
+    
+    @staticmethod
+    def _document_data(doc) -> Dict[str, Any]:
+        doc_data = doc.to_dict() or {}
+        doc_data['doc_id'] = doc.id
+        return doc_data
+    
+    def query_documents(self, collection_name: str, filters: list = None, order_by: str = None, limit: int = None):
+        """Query documents with filters"""
+        return list(self.iter_documents(collection_name, filters, order_by, limit))
 
 # Create global instance
 firebase_client = FirebaseClient()
 
-# Export the database instance for backward compatibility
-db = firebase_client.db if firebase_client.is_connected() else None
+def __getattr__(name):
+    # `from firebase_client import db` still works, connecting when it runs
+    # rather than when this module is imported
+    if name == 'db':
+        return firebase_client.db
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Utility functions
-def init_firebase() -> Optional[firestore.Client]:
+def init_firebase() -> Optional["firestore.Client"]:
     """Initialize and return Firebase client (for backward compatibility)"""
     global firebase_client
     if firebase_client.is_connected():
@@ -208,7 +667,7 @@ def init_firebase() -> Optional[firestore.Client]:
 
 def check_firebase_connection():
     """Check Firebase connection and print status"""
-    if firebase_client.is_connected():
+    if firebase_client.ping():
         print("✅ Firebase connected successfully")
         try:
             # Test basic operations
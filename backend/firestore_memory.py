@@ -0,0 +1,404 @@
+import copy
+import time
+import uuid
+import random
+import logging
+import datetime
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+from logging_setup import configure_logging
+
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+DOCUMENT_ID = "__name__"
+
+_MISSING = object()
+
+class NotFound(Exception):
+    """Raised by update() on a document that does not exist, like Firestore"""
+
+class AlreadyExists(Exception):
+    """Raised by create() on a document that already exists, like Firestore"""
+
+def _field(data: Dict[str, Any], path: str) -> Any:
+    """Read a dotted field path, returning _MISSING if any part is absent"""
+    value: Any = data
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+def _operands(doc_id: str, data: Dict[str, Any], field_path: str, op: str, expected: Any) -> Tuple[Any, str, Any]:
+    """Arguments for _matches; a '__name__' filter compares document ids"""
+    if field_path == DOCUMENT_ID:
+        return doc_id, op, getattr(expected, 'id', expected)
+    return _field(data, field_path), op, expected
+
+def _matches(value: Any, op: str, expected: Any) -> bool:
+    if value is _MISSING:
+        return False
+    if op == '==':
+        return value == expected
+    if op == '!=':
+        return value != expected
+    if op == 'in':
+        return value in expected
+    if op == 'not-in':
+        return value not in expected
+    if op == 'array_contains':
+        return isinstance(value, list) and expected in value
+    if op == 'array_contains_any':
+        return isinstance(value, list) and any(v in value for v in expected)
+    try:
+        if op == '<':
+            return value < expected
+        if op == '<=':
+            return value <= expected
+        if op == '>':
+            return value > expected
+        if op == '>=':
+            return value >= expected
+    except TypeError:
+        # Firestore only compares values of the same type
+        return False
+    raise ValueError(f"Unsupported operator: {op}")
+
+def _project(data: Dict[str, Any], field_paths: Tuple[str, ...]) -> Dict[str, Any]:
+    projected: Dict[str, Any] = {}
+    for path in field_paths:
+        value = _field(data, path)
+        if value is _MISSING:
+            continue
+        target = projected
+        parts = path.split('.')
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return projected
+
+def _after(row: Tuple[str, Dict[str, Any]], cursor: Tuple[str, Any], orders: Tuple) -> bool:
+    """Whether a row sorts strictly after the cursor position"""
+    doc_id, data = row
+    cursor_id, cursor_values = cursor
+    for (field_path, direction), cursor_value in zip(orders, cursor_values):
+        value = _field(data, field_path)
+        if value == cursor_value:
+            continue
+        greater = value > cursor_value
+        return greater if direction != DESCENDING else not greater
+    return doc_id > cursor_id
+
+class InMemoryDocumentSnapshot:
+    def __init__(self, reference: "InMemoryDocumentReference", data: Optional[Dict[str, Any]]):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        value = _field(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+class InMemoryDocumentReference:
+    def __init__(self, store: "InMemoryFirestore", collection: str, document_id: str):
+        self._store = store
+        self._collection = collection
+        self.id = document_id
+
+    @property
+    def path(self) -> str:
+        return f"{self._collection}/{self.id}"
+
+    def get(self) -> InMemoryDocumentSnapshot:
+        self._store._round_trip()
+        return self._store._snapshot(self._collection, self.id)
+
+    def set(self, data: Dict[str, Any], merge: bool = False):
+        self._store._round_trip()
+        self._store._write(self._collection, self.id, data, merge=merge)
+
+    def create(self, data: Dict[str, Any]):
+        self._store._round_trip()
+        self._store._create(self._collection, self.id, data)
+
+    def update(self, data: Dict[str, Any]):
+        self._store._round_trip()
+        self._store._update(self._collection, self.id, data)
+
+    def delete(self):
+        self._store._round_trip()
+        self._store._delete(self._collection, self.id)
+
+class InMemoryQuery:
+    """Immutable query; filters, ordering and limit apply when it runs"""
+
+    def __init__(self, store: "InMemoryFirestore", collection: str,
+                 filters: Tuple = (), orders: Tuple = (), limit_to: Optional[int] = None, skip: int = 0,
+                 projection: Optional[Tuple[str, ...]] = None, cursor: Optional[Tuple[str, Any]] = None):
+        self._store = store
+        self._collection = collection
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit_to
+        self._offset = skip
+        self._projection = projection
+        self._cursor = cursor
+
+    def _copy(self, **changes) -> "InMemoryQuery":
+        values = dict(filters=self._filters, orders=self._orders, limit_to=self._limit, skip=self._offset,
+                      projection=self._projection, cursor=self._cursor)
+        values.update(changes)
+        return InMemoryQuery(self._store, self._collection, **values)
+
+    def where(self, field_path: str, op_string: str, value: Any) -> "InMemoryQuery":
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> "InMemoryQuery":
+        return self._copy(orders=self._orders + ((field_path, str(direction).upper()),))
+
+    def limit(self, count: int) -> "InMemoryQuery":
+        return self._copy(limit_to=count)
+
+    def offset(self, count: int) -> "InMemoryQuery":
+        return self._copy(skip=count)
+
+    def select(self, field_paths: List[str]) -> "InMemoryQuery":
+        return self._copy(projection=tuple(field_paths))
+
+    def start_after(self, document: InMemoryDocumentSnapshot) -> "InMemoryQuery":
+        """Resume after a snapshot from a previous page of the same query"""
+        values = tuple(_field(document._data or {}, f) for f, _ in self._orders)
+        return self._copy(cursor=(document.id, values))
+
+    def stream(self):
+        self._store._round_trip()
+        snapshots = self._store._query(self._collection, self._filters, self._orders,
+                                       self._projection, self._cursor)
+        end = None if self._limit is None else self._offset + self._limit
+        return iter(snapshots[self._offset:end])
+
+    def get(self) -> List[InMemoryDocumentSnapshot]:
+        return list(self.stream())
+
+    def count(self, alias: Optional[str] = None) -> "InMemoryAggregationQuery":
+        return InMemoryAggregationQuery(self).count(alias)
+
+    def sum(self, field_path: str, alias: Optional[str] = None) -> "InMemoryAggregationQuery":
+        return InMemoryAggregationQuery(self).sum(field_path, alias)
+
+    def avg(self, field_path: str, alias: Optional[str] = None) -> "InMemoryAggregationQuery":
+        return InMemoryAggregationQuery(self).avg(field_path, alias)
+
+class InMemoryAggregationResult:
+    def __init__(self, alias: str, value: Any):
+        self.alias = alias
+        self.value = value
+
+class InMemoryAggregationQuery:
+    """count/sum/avg over a query's results, computed in one round trip like Firestore's"""
+
+    def __init__(self, query: InMemoryQuery):
+        self._query = query
+        self._aggregations: List[Tuple[str, Optional[str], str]] = []
+
+    def _add(self, kind: str, field_path: Optional[str], alias: Optional[str]) -> "InMemoryAggregationQuery":
+        self._aggregations.append((kind, field_path, alias or f"field_{len(self._aggregations) + 1}"))
+        return self
+
+    def count(self, alias: Optional[str] = None) -> "InMemoryAggregationQuery":
+        return self._add("count", None, alias)
+
+    def sum(self, field_path: str, alias: Optional[str] = None) -> "InMemoryAggregationQuery":
+        return self._add("sum", field_path, alias)
+
+    def avg(self, field_path: str, alias: Optional[str] = None) -> "InMemoryAggregationQuery":
+        return self._add("avg", field_path, alias)
+
+    def get(self) -> List[List[InMemoryAggregationResult]]:
+        snapshots = self._query.get()
+        results = []
+        for kind, field_path, alias in self._aggregations:
+            if kind == "count":
+                results.append(InMemoryAggregationResult(alias, len(snapshots)))
+                continue
+            # Like Firestore, sum and avg skip values that are not numbers
+            values = [value for value in (_field(doc._data or {}, field_path) for doc in snapshots)
+                      if isinstance(value, (int, float)) and not isinstance(value, bool)]
+            if kind == "sum":
+                results.append(InMemoryAggregationResult(alias, sum(values)))
+            else:
+                results.append(InMemoryAggregationResult(alias, sum(values) / len(values) if values else None))
+        return [results]
+
+    def stream(self):
+        return iter(self.get())
+
+class InMemoryCollectionReference(InMemoryQuery):
+    def __init__(self, store: "InMemoryFirestore", collection: str):
+        super().__init__(store, collection)
+        self.id = collection
+
+    def document(self, document_id: Optional[str] = None) -> InMemoryDocumentReference:
+        return InMemoryDocumentReference(self._store, self._collection, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, data: Dict[str, Any], document_id: Optional[str] = None):
+        reference = self.document(document_id)
+        reference.set(data)
+        return datetime.datetime.utcnow(), reference
+
+class InMemoryWriteBatch:
+    """Collects writes and applies them atomically on commit()"""
+
+    def __init__(self, store: "InMemoryFirestore"):
+        self._store = store
+        self._writes: List[Tuple[str, InMemoryDocumentReference, Any, bool]] = []
+
+    def set(self, reference: InMemoryDocumentReference, data: Dict[str, Any], merge: bool = False):
+        self._writes.append(("set", reference, copy.deepcopy(data), merge))
+
+    def update(self, reference: InMemoryDocumentReference, data: Dict[str, Any]):
+        self._writes.append(("update", reference, copy.deepcopy(data), False))
+
+    def delete(self, reference: InMemoryDocumentReference):
+        self._writes.append(("delete", reference, None, False))
+
+    def commit(self):
+        self._store._round_trip()
+        self._store._commit(self._writes)
+        self._writes = []
+
+class InMemoryFirestore:
+    """Thread-safe stand-in for a Firestore client, for load tests and local runs
+
+    Covers the subset of the client API the backend uses. Every read or
+    write sleeps for `latency` seconds (plus up to `jitter`) to model the
+    network round trip to the real database.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self._collections: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def collection(self, name: str) -> InMemoryCollectionReference:
+        return InMemoryCollectionReference(self, name)
+
+    def get_all(self, references: List[InMemoryDocumentReference], field_paths: Optional[List[str]] = None):
+        """Fetch several documents in one round trip; missing ones come back with exists False"""
+        self._round_trip()
+        for reference in references:
+            snapshot = self._snapshot(reference._collection, reference.id)
+            if field_paths is not None and snapshot.exists:
+                snapshot._data = _project(snapshot._data, tuple(field_paths))
+            yield snapshot
+
+    def batch(self) -> InMemoryWriteBatch:
+        return InMemoryWriteBatch(self)
+
+    def _round_trip(self):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _snapshot(self, collection: str, document_id: str) -> InMemoryDocumentSnapshot:
+        with self._lock:
+            data = self._collections.get(collection, {}).get(document_id)
+            data = copy.deepcopy(data) if data is not None else None
+        return InMemoryDocumentSnapshot(InMemoryDocumentReference(self, collection, document_id), data)
+
+    def _write(self, collection: str, document_id: str, data: Dict[str, Any], merge: bool = False):
+        data = copy.deepcopy(data)
+        with self._lock:
+            documents = self._collections.setdefault(collection, {})
+            if merge and document_id in documents:
+                documents[document_id].update(data)
+            else:
+                documents[document_id] = data
+
+    def _create(self, collection: str, document_id: str, data: Dict[str, Any]):
+        data = copy.deepcopy(data)
+        with self._lock:
+            documents = self._collections.setdefault(collection, {})
+            if document_id in documents:
+                raise AlreadyExists(f"Document already exists: {collection}/{document_id}")
+            documents[document_id] = data
+
+    def _update(self, collection: str, document_id: str, data: Dict[str, Any]):
+        data = copy.deepcopy(data)
+        with self._lock:
+            document = self._collections.get(collection, {}).get(document_id)
+            if document is None:
+                raise NotFound(f"No document to update: {collection}/{document_id}")
+            self._apply_update(document, data)
+
+    @staticmethod
+    def _apply_update(document: Dict[str, Any], data: Dict[str, Any]):
+        """Set dotted field paths, as update() does"""
+        for path, value in data.items():
+            target = document
+            parts = path.split('.')
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+
+    def _commit(self, writes: List[Tuple[str, InMemoryDocumentReference, Any, bool]]):
+        with self._lock:
+            for kind, reference, _, _ in writes:
+                if kind == "update" and reference.id not in self._collections.get(reference._collection, {}):
+                    raise NotFound(f"No document to update: {reference.path}")
+            for kind, reference, data, merge in writes:
+                documents = self._collections.setdefault(reference._collection, {})
+                if kind == "delete":
+                    documents.pop(reference.id, None)
+                elif kind == "update":
+                    self._apply_update(documents[reference.id], data)
+                elif merge and reference.id in documents:
+                    documents[reference.id].update(data)
+                else:
+                    documents[reference.id] = data
+
+    def _delete(self, collection: str, document_id: str):
+        with self._lock:
+            self._collections.get(collection, {}).pop(document_id, None)
+
+    def _query(self, collection: str, filters: Tuple, orders: Tuple, projection: Optional[Tuple[str, ...]] = None,
+               cursor: Optional[Tuple[str, Any]] = None) -> List[InMemoryDocumentSnapshot]:
+        with self._lock:
+            rows = [(doc_id, data) for doc_id, data in self._collections.get(collection, {}).items()
+                    if all(_matches(*_operands(doc_id, data, f, op, v)) for f, op, v in filters)]
+            # Like Firestore, ordering by a field drops documents without it
+            rows = [(doc_id, data) for doc_id, data in rows
+                    if all(_field(data, f) is not _MISSING for f, _ in orders)]
+            rows = [(doc_id, copy.deepcopy(data)) for doc_id, data in rows]
+
+        # Firestore breaks ties by document id
+        rows.sort(key=lambda row: row[0])
+        for field_path, direction in reversed(orders):
+            rows.sort(key=lambda row: _field(row[1], field_path), reverse=direction == DESCENDING)
+
+        if cursor is not None:
+            rows = [row for row in rows if _after(row, cursor, orders)]
+        if projection is not None:
+            rows = [(doc_id, _project(data, projection)) for doc_id, data in rows]
+        return [InMemoryDocumentSnapshot(InMemoryDocumentReference(self, collection, doc_id), data)
+                for doc_id, data in rows]
+
+    def count(self, collection: str) -> int:
+        """Number of documents in a collection (no simulated latency)"""
+        with self._lock:
+            return len(self._collections.get(collection, {}))
@@ -0,0 +1,221 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from storage import Storage
+from metrics import registry
+from logging_setup import configure_logging
+
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# Seconds after which a marker still pending is taken to belong to a worker that died
+PENDING_LEASE = 60
+
+IDEMPOTENCY = registry.counter(
+    "smartdine_idempotency_total",
+    "Repeated POST /order requests by outcome (replayed, in_progress, mismatch) and where the "
+    "original was found (memory or datastore)",
+    ("outcome", "source")
+)
+
+class IdempotencyConflict(Exception):
+    """The request repeats one that is still in progress (409) or reuses a key for a different request (422)"""
+
+    def __init__(self, message: str, status: int, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class StoredResponse:
+    __slots__ = ("status", "body")
+
+    def __init__(self, status: int, body: bytes):
+        self.status = status
+        self.body = body
+
+class IdempotencyKey:
+    """The key of one POST /order request and what it must match to be a repeat"""
+
+    __slots__ = ("id", "fingerprint", "ttl", "claimed")
+
+    def __init__(self, key_id: str, fingerprint: str, ttl: float):
+        self.id = key_id
+        self.fingerprint = fingerprint
+        self.ttl = ttl
+        self.claimed = False
+
+class _Entry:
+    __slots__ = ("fingerprint", "expires", "done", "response")
+
+    def __init__(self, fingerprint: str, expires: float):
+        self.fingerprint = fingerprint
+        self.expires = expires
+        self.done = threading.Event()
+        self.response: Optional[StoredResponse] = None
+
+def _utc_naive(value: Any) -> Optional[datetime.datetime]:
+    """Firestore returns aware datetimes, the other backends naive UTC ones"""
+    if not isinstance(value, datetime.datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+class IdempotencyStore:
+    """Replays the response to a repeated POST /order instead of placing the order again
+
+    A request is a repeat if it carries the same Idempotency-Key header, or,
+    without one, the same user and message from the same browser session
+    within the window. Keys are only derived for sessions named by a trusted
+    frontend: an address alone may be shared by many customers. Responses live in a bounded in-process store; a marker document
+    in the datastore (collection idempotency_keys) makes sure only one worker
+    places the order and lets the others replay it.
+
+    Configured from the environment:
+        IDEMPOTENCY_TTL          seconds a response to an Idempotency-Key is replayed (default: 86400)
+        IDEMPOTENCY_WINDOW       seconds within which a keyless identical message counts as a
+                                 resubmission (default: 30; 0 turns derived keys off)
+        IDEMPOTENCY_MAX_ENTRIES  responses kept in memory (default: 10000)
+        IDEMPOTENCY_WAIT         seconds a repeat waits for the original to finish (default: 10)
+    """
+
+    def __init__(self, ttl: Optional[float] = None, window: Optional[float] = None,
+                 max_entries: Optional[int] = None, wait: Optional[float] = None):
+        self.ttl = ttl if ttl is not None else float(os.environ.get('IDEMPOTENCY_TTL', 86400))
+        self.window = window if window is not None else float(os.environ.get('IDEMPOTENCY_WINDOW', 30))
+        self.max_entries = max_entries or int(os.environ.get('IDEMPOTENCY_MAX_ENTRIES', 10000))
+        self.wait = wait if wait is not None else float(os.environ.get('IDEMPOTENCY_WAIT', 10))
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key_for(self, header: Optional[str], session: Optional[str], user: Any,
+                message: str) -> Optional[IdempotencyKey]:
+        """The request's key, or None if it carries none and no key can be derived"""
+        normalized = re.sub(r'\s+', ' ', message.strip().lower())
+        fingerprint = hashlib.sha256(
+            json.dumps({"user": user, "message": normalized}, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+        if header:
+            key_id = hashlib.sha256(f"key|{header[:MAX_KEY_LENGTH]}".encode('utf-8')).hexdigest()
+            return IdempotencyKey(key_id, fingerprint, self.ttl)
+        if self.window <= 0 or not session:
+            return None
+        key_id = hashlib.sha256(f"derived|{session}|{fingerprint}".encode('utf-8')).hexdigest()
+        return IdempotencyKey(key_id, fingerprint, self.window)
+
+    def _evict(self, now: float):
+        while self._entries:
+            key_id, entry = next(iter(self._entries.items()))
+            if entry.expires > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key_id]
+
+    def begin(self, key: IdempotencyKey) -> Optional[StoredResponse]:
+        """Return the stored response to replay, or None if this request should run
+
+        Raises IdempotencyConflict for a key reused with a different request,
+        or a repeat whose original is still running after IDEMPOTENCY_WAIT.
+        """
+        deadline = time.monotonic() + self.wait
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                self._evict(now)
+                entry = self._entries.get(key.id)
+                if entry is None or entry.expires <= now:
+                    self._entries[key.id] = _Entry(key.fingerprint, now + key.ttl)
+                    self._entries.move_to_end(key.id)
+                    return None
+            if entry.fingerprint != key.fingerprint:
+                IDEMPOTENCY.inc(outcome="mismatch", source="memory")
+                raise IdempotencyConflict("Idempotency-Key was already used for a different request", 422)
+            if not entry.done.wait(max(0.0, deadline - now)):
+                IDEMPOTENCY.inc(outcome="in_progress", source="memory")
+                raise IdempotencyConflict("This request is already being processed", 409, retry_after=1)
+            if entry.response is not None:
+                IDEMPOTENCY.inc(outcome="replayed", source="memory")
+                return entry.response
+            # The original failed and released the key; run this one instead
+
+    @staticmethod
+    def _stale(marker: Dict[str, Any], now: datetime.datetime) -> bool:
+        """Expired, or left pending by a worker that died mid-order"""
+        expires_at = _utc_naive(marker.get("expires_at"))
+        if expires_at is not None and expires_at <= now:
+            return True
+        created_at = _utc_naive(marker.get("created_at"))
+        return (marker.get("state") != "done" and created_at is not None
+                and created_at <= now - datetime.timedelta(seconds=PENDING_LEASE))
+
+    def claim(self, key: IdempotencyKey, storage: Storage) -> Optional[StoredResponse]:
+        """Claim the key in the datastore just before placing the order
+
+        Returns the response another worker stored for it, if any. If the
+        datastore cannot be reached the order goes ahead unclaimed.
+        """
+        now = datetime.datetime.utcnow()
+        marker = {
+            "state": "pending",
+            "fingerprint": key.fingerprint,
+            "created_at": now,
+            # Also the field for a Firestore TTL policy that deletes old markers
+            "expires_at": now + datetime.timedelta(seconds=key.ttl),
+        }
+        try:
+            existing = storage.claim_idempotency_key(key.id, marker)
+            if existing is not None and self._stale(existing, now):
+                storage.release_idempotency_key(key.id)
+                existing = storage.claim_idempotency_key(key.id, marker)
+        except Exception as e:
+            logger.warning(f"Could not claim idempotency key, placing the order unclaimed: {e}")
+            return None
+
+        if existing is None:
+            key.claimed = True
+            return None
+        if existing.get("fingerprint") != key.fingerprint:
+            IDEMPOTENCY.inc(outcome="mismatch", source="datastore")
+            raise IdempotencyConflict("Idempotency-Key was already used for a different request", 422)
+        if existing.get("state") != "done":
+            IDEMPOTENCY.inc(outcome="in_progress", source="datastore")
+            raise IdempotencyConflict("This request is already being processed", 409, retry_after=1)
+        IDEMPOTENCY.inc(outcome="replayed", source="datastore")
+        return StoredResponse(int(existing["status"]), existing["body"].encode('utf-8'))
+
+    def finish(self, key: IdempotencyKey, storage: Storage, status: Optional[int] = None,
+               body: Optional[bytes] = None):
+        """Store a successful (201) response for replay, or release the key so the request can be retried"""
+        stored = StoredResponse(status, body) if status == 201 and body is not None else None
+        with self._lock:
+            entry = self._entries.get(key.id)
+            if entry is not None and not entry.done.is_set():
+                if stored is None:
+                    del self._entries[key.id]
+                entry.response = stored
+                entry.done.set()
+
+        if not key.claimed:
+            return
+        try:
+            if stored is not None:
+                storage.complete_idempotency_key(key.id, {
+                    "state": "done", "status": status, "body": body.decode('utf-8')
+                })
+            else:
+                storage.release_idempotency_key(key.id)
+        except Exception as e:
+            logger.warning(f"Could not update idempotency marker {key.id[:12]}: {e}")
+
+# Create global instance
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import datetime
+import threading
+import contextvars
+import logging.handlers
+from typing import Dict, Optional, Tuple
+
+from metrics import registry
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+
+LOG_RECORDS_DROPPED = registry.counter(
+    "smartdine_log_records_dropped_total", "Log records not written, by reason (sampled or queue_full)",
+    ("reason",)
+)
+
+_request_id: contextvars.ContextVar = contextvars.ContextVar('request_id', default=None)
+
+# Attributes every LogRecord has; anything else came from extra={...}
+_RECORD_ATTRS = frozenset(logging.makeLogRecord({}).__dict__) | {'message', 'asctime', 'request_id'}
+
+def get_request_id() -> Optional[str]:
+    return _request_id.get()
+
+def set_request_id(request_id: Optional[str]) -> contextvars.Token:
+    """Tag log records from the current context; pass the token to reset_request_id"""
+    return _request_id.set(request_id)
+
+def reset_request_id(token: contextvars.Token):
+    _request_id.reset(token)
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse 'nlp:0.1,matcher:0.05' into {logger name: fraction of records kept}"""
+    rates = {}
+    for part in spec.split(','):
+        name, sep, rate = part.strip().rpartition(':')
+        if not sep or not name:
+            continue
+        try:
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the request ID of the context that logged them"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get() or '-'
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of the records below WARNING from chosen loggers
+
+    A rate applies to the named logger and its children; the longest
+    matching name wins. Warnings and errors are always kept.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = dict(rates)
+        self._resolved: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition('.')[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        LOG_RECORDS_DROPPED.inc(reason="sampled")
+        return False
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request_id and any extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                    .isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', '-')
+        if request_id != '-':
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+# Log arguments of these types cannot change after the call, so they are
+# formatted on the writer thread
+_IMMUTABLE_ARGS = (str, int, float, bool, bytes, type(None))
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread without blocking the caller
+
+    Messages whose arguments are all immutable are formatted, like
+    everything else (JSON, timestamps, tracebacks) and all I/O, on the
+    listener thread. Only messages with mutable arguments (dicts, lists,
+    objects) are resolved here, so later changes to them do not leak into
+    the output. A full queue drops the record.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        if args:
+            values = args.values() if isinstance(args, dict) else args
+            if not all(isinstance(value, _IMMUTABLE_ARGS) for value in values):
+                record.msg = record.getMessage()
+                record.args = None
+        elif not isinstance(record.msg, str):
+            record.msg = str(record.msg)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(reason="queue_full")
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for room so shutdown always flushes, even with a full queue
+        try:
+            self.queue.put(self._sentinel, timeout=5)
+        except queue.Full:
+            pass
+
+class LoggingSetup:
+    """Root logger -> bounded queue -> background thread writing stderr and LOG_FILE
+
+    Configured from the environment:
+        LOG_LEVEL         root level (default: INFO)
+        LOG_FILE          also append to this file (default: unset, stderr only)
+        LOG_FORMAT        'json' or 'text' (default: text on a terminal, json otherwise)
+        LOG_SAMPLE_RATES  fraction of sub-WARNING records kept per logger,
+                          e.g. 'nlp:0.1,matcher:0.1' (default: keep everything)
+        LOG_QUEUE_SIZE    records buffered before new ones are dropped (default: 10000)
+    """
+
+    def __init__(self):
+        self.handler: Optional[_QueueHandler] = None
+        self.listener: Optional[_QueueListener] = None
+        self.outputs: Tuple[logging.Handler, ...] = ()
+        self.queue_size = 10000
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self) -> bool:
+        return self.handler is not None
+
+    def configure(self):
+        """Install the queue handler on the root logger; later calls do nothing"""
+        with self._lock:
+            if self.handler is not None:
+                return
+
+            level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+            log_file = os.environ.get('LOG_FILE')
+            log_format = os.environ.get('LOG_FORMAT', '').lower()
+            if log_format not in ('json', 'text'):
+                log_format = 'text' if sys.stderr.isatty() else 'json'
+            self.queue_size = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+            formatter = JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT)
+            outputs = [logging.StreamHandler(sys.stderr)]
+            if log_file:
+                # Reopens the file if logrotate moves it
+                outputs.append(logging.handlers.WatchedFileHandler(log_file, encoding='utf-8'))
+            for output in outputs:
+                output.setFormatter(formatter)
+            self.outputs = tuple(outputs)
+
+            handler = _QueueHandler(queue.Queue(self.queue_size))
+            rates = parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES', ''))
+            if rates:
+                handler.addFilter(SamplingFilter(rates))
+            handler.addFilter(RequestIdFilter())
+
+            # No output includes processName; skip the multiprocessing lookup per record
+            logging.logMultiprocessing = False
+
+            root = logging.getLogger()
+            for existing in root.handlers[:]:
+                root.removeHandler(existing)
+            root.addHandler(handler)
+            numeric_level = logging.getLevelName(level)
+            root.setLevel(numeric_level if isinstance(numeric_level, int) else logging.INFO)
+
+            self.handler = handler
+            self._start_listener()
+            atexit.register(self.shutdown)
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_listener(self):
+        self.listener = _QueueListener(self.handler.queue, *self.outputs, respect_handler_level=True)
+        self.listener.start()
+
+    def _after_fork(self):
+        # The writer thread does not survive fork(); give the child its own
+        # queue (the parent's may have been mid-operation) and writer
+        if self.handler is None:
+            return
+        self.handler.queue = queue.Queue(self.queue_size)
+        self._start_listener()
+        # Pool workers leave through os._exit(), which skips atexit; their
+        # multiprocessing finalizers still run, so flush from there
+        import multiprocessing.util
+        multiprocessing.util.Finalize(None, self.shutdown, exitpriority=0)
+
+    def shutdown(self):
+        """Write out queued records and stop the writer thread"""
+        listener, self.listener = self.listener, None
+        if listener is not None and listener._thread is not None:
+            listener.stop()
+
+# Create global instance
+logging_setup = LoggingSetup()
+
+def configure_logging():
+    logging_setup.configure()
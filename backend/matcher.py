@@ -0,0 +1,411 @@
+import re
+import time
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+from rapidfuzz import process, fuzz
+from metrics import registry
+from logging_setup import configure_logging
+
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Matching tiers, cheapest first. A message stops at the first tier that
+# leaves no unresolved words behind.
+TIERS = ("exact", "alias", "token", "ngram", "fuzzy")
+
+# Minimum time (seconds) left before a deadline for an expensive tier to start,
+# and how many words the fuzzy tier may score when running against a deadline
+TIER_MIN_BUDGET = {"ngram": 0.002, "fuzzy": 0.010}
+MAX_FUZZY_WORDS_WITH_DEADLINE = 6
+
+# Words that never name a menu item and should not be sent to the fuzzy tiers
+STOPWORDS = {
+    'a', 'an', 'the', 'and', 'or', 'n', 'with', 'of', 'for', 'to', 'in', 'on', 'at',
+    'i', 'me', 'my', 'we', 'us', 'our', 'you', 'your', 'it', 'is', 'are', 'that',
+    'this', 'be', 'am', 'im', 'i\'m', 'i\'d', 'i\'ll', 'd', 'll', 's', 'm',
+    'want', 'need', 'order', 'get', 'give', 'have', 'take', 'like', 'can', 'could',
+    'would', 'will', 'please', 'pls', 'plz', 'thanks', 'thank', 'ty', 'also', 'just',
+    'now', 'asap', 'quick', 'quickly', 'fast', 'some', 'few', 'couple', 'several',
+    'dozen', 'half', 'single', 'double', 'triple', 'one', 'two', 'three', 'four',
+    'five', 'six', 'seven', 'eight', 'nine', 'ten', 'more', 'another', 'other',
+    'prepare', 'make', 'bring', 'send', 'place', 'buy', 'let', 'ill', 'id', 'what',
+    'do', 'does', 'how', 'much', 'many', 'any', 'all', 'but', 'so', 'too', 'very',
+    'hi', 'hello', 'hey', 'yes', 'no', 'ok', 'okay', 'there', 'here', 'them', 'those',
+    'these', 'something', 'food', 'meal', 'party', 'family', 'dinner', 'lunch',
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens"""
+    return _TOKEN_RE.findall(text.lower())
+
+def singularize(token: str) -> str:
+    """Cheap plural folding so 'pizzas' and 'pizza' share a key"""
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+def trigrams(token: str) -> List[str]:
+    """Boundary-padded character trigrams of a token"""
+    padded = f"^{token}$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+def is_content_token(token: str) -> bool:
+    """Whether a token could plausibly refer to a menu item"""
+    return len(token) > 1 and token.isalpha() and token not in STOPWORDS
+
+class MenuIndex:
+    """Normalized lookup tables for a menu, built once per menu version"""
+
+    def __init__(self, menu_names: Iterable[str], aliases: Optional[Dict[str, str]] = None):
+        self.names = list(dict.fromkeys(menu_names))
+        position = {name: i for i, name in enumerate(self.names)}
+
+        # Token sequences for exact and alias phrase matching
+        self.raw_phrases: Dict[Tuple[str, ...], int] = {}
+        self.alias_phrases: Dict[Tuple[str, ...], int] = {}
+        self.item_tokens: List[Tuple[str, ...]] = []
+
+        # Postings: normalized token -> item positions, trigram -> vocabulary tokens
+        self.token_postings: Dict[str, List[int]] = {}
+        self.ngram_postings: Dict[str, List[str]] = {}
+
+        for i, name in enumerate(self.names):
+            raw = tuple(tokenize(name))
+            normalized = tuple(singularize(t) for t in raw)
+            self.raw_phrases.setdefault(raw, i)
+            self.alias_phrases.setdefault(normalized, i)
+            self.item_tokens.append(normalized)
+            for token in set(normalized):
+                self.token_postings.setdefault(token, []).append(i)
+
+        for alias, name in (aliases or {}).items():
+            if name in position:
+                key = tuple(singularize(t) for t in tokenize(alias))
+                if key:
+                    self.alias_phrases.setdefault(key, position[name])
+
+        for token in self.token_postings:
+            for gram in set(trigrams(token)):
+                self.ngram_postings.setdefault(gram, []).append(token)
+
+        self.max_phrase_len = max((len(p) for p in self.alias_phrases), default=0)
+        # Last words of names ("burger"); the other words ("veggie") only qualify them
+        self.head_tokens = {tokens[-1] for tokens in self.item_tokens if tokens}
+
+    def lookup_phrase(self, tokens: Tuple[str, ...], normalized: bool) -> Optional[int]:
+        """Return the item position for a whole-name (or alias) phrase"""
+        table = self.alias_phrases if normalized else self.raw_phrases
+        return table.get(tokens)
+
+    def items_for_token(self, token: str) -> List[int]:
+        """Return item positions whose name contains the normalized token"""
+        return self.token_postings.get(token, [])
+
+    def is_head_token(self, token: str) -> bool:
+        """Whether the normalized token ends some item's name"""
+        return token in self.head_tokens
+
+    def vocabulary_candidates(self, token: str) -> List[str]:
+        """Return vocabulary tokens sharing at least one trigram with token"""
+        seen = {}
+        for gram in trigrams(token):
+            for candidate in self.ngram_postings.get(gram, ()):
+                seen[candidate] = seen.get(candidate, 0) + 1
+        return sorted(seen, key=seen.get, reverse=True)
+
+class MatcherStats:
+    """Thread-safe per-tier counters and latency totals"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.tiers = {
+                tier: {"reached": 0, "resolved": 0, "items": 0, "seconds": 0.0}
+                for tier in TIERS
+            }
+
+    def record(self, timings: List[Tuple[str, int, float]], resolved_tier: Optional[str]):
+        with self._lock:
+            self.calls += 1
+            for tier, items, seconds in timings:
+                entry = self.tiers[tier]
+                entry["reached"] += 1
+                entry["items"] += items
+                entry["seconds"] += seconds
+            if resolved_tier:
+                self.tiers[resolved_tier]["resolved"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return hit rates and latencies per tier"""
+        with self._lock:
+            tiers = {}
+            for tier, entry in self.tiers.items():
+                reached = entry["reached"]
+                tiers[tier] = {
+                    "reached": reached,
+                    "resolved": entry["resolved"],
+                    "items": entry["items"],
+                    "hit_rate": round(entry["resolved"] / reached, 4) if reached else 0.0,
+                    "total_ms": round(entry["seconds"] * 1000, 3),
+                    "avg_ms": round(entry["seconds"] * 1000 / reached, 4) if reached else 0.0,
+                }
+            return {"calls": self.calls, "tiers": tiers}
+
+matcher_stats = MatcherStats()
+
+class MenuMatcher:
+    """Resolve menu items in a message through increasingly expensive tiers"""
+
+    def __init__(self, index: MenuIndex, ngram_threshold: int = 80, fuzzy_threshold: int = 75):
+        self.index = index
+        self.ngram_threshold = ngram_threshold
+        self.fuzzy_threshold = fuzzy_threshold
+
+    def match(self, text: str, stats: Optional[MatcherStats] = matcher_stats,
+              deadline: Optional[float] = None, skipped: Optional[List[str]] = None) -> List[str]:
+        """Return matched menu item names in the order they appear in text
+
+        With a deadline (a time.monotonic() value) the expensive tiers are
+        skipped or cut short when time runs out; their names are appended
+        to `skipped`.
+        """
+        if not self.index.names or not text:
+            return []
+
+        state = _MatchState(tokenize(text), deadline)
+        timings = []
+        resolved_tier = None
+
+        for tier in TIERS:
+            if tier == "fuzzy" and state.found:
+                # The fuzzy pass is a last resort for messages nothing else understood
+                break
+            # Cheap tiers always run; expensive ones need some time left
+            if (deadline is not None and tier in TIER_MIN_BUDGET
+                    and deadline - time.monotonic() < TIER_MIN_BUDGET[tier]):
+                if skipped is not None:
+                    skipped.append(tier)
+                continue
+            start = time.perf_counter()
+            before = len(state.found)
+            if getattr(self, f"_match_{tier}")(state) is False and skipped is not None:
+                skipped.append(tier)
+            timings.append((tier, len(state.found) - before, time.perf_counter() - start))
+            if not state.pending():
+                resolved_tier = tier if state.found else None
+                break
+
+        if state.found and resolved_tier is None:
+            resolved_tier = timings[-1][0]
+        if stats is not None:
+            stats.record(timings, resolved_tier)
+
+        names = [self.index.names[i] for _, i in sorted(state.found.values())]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Tiered match: %s via %s", names, [t for t, _, _ in timings])
+        return names
+
+    def _match_phrases(self, state: "_MatchState", normalized: bool):
+        tokens = state.normalized if normalized else state.raw
+        for size in range(min(self.index.max_phrase_len, len(tokens)), 0, -1):
+            for start in range(len(tokens) - size + 1):
+                span = range(start, start + size)
+                if any(state.consumed[j] for j in span):
+                    continue
+                item = self.index.lookup_phrase(tuple(tokens[start:start + size]), normalized)
+                if item is not None:
+                    state.add(item, span)
+
+    def _match_exact(self, state: "_MatchState"):
+        self._match_phrases(state, normalized=False)
+
+    def _match_alias(self, state: "_MatchState"):
+        self._match_phrases(state, normalized=True)
+
+    def _match_token(self, state: "_MatchState"):
+        # Resolve tokens whose best item is unambiguous; defer the rest so a
+        # misspelled neighbour ("chicken piza") can still disambiguate them
+        self._resolve_tokens(state, state.known_positions(self.index), allow_ties=False)
+        if not state.unknown_positions(self.index):
+            self._resolve_tokens(state, state.known_positions(self.index), allow_ties=True)
+
+    def _match_ngram(self, state: "_MatchState"):
+        for pos in state.unknown_positions(self.index):
+            token = state.normalized[pos]
+            best, best_score = None, 0.0
+            for candidate in self.index.vocabulary_candidates(token)[:10]:
+                score = fuzz.ratio(token, candidate)
+                if score > best_score:
+                    best, best_score = candidate, score
+            if best is not None and best_score >= self.ngram_threshold:
+                state.normalized[pos] = best
+
+        positions = state.known_positions(self.index)
+        # A corrected token that belongs to an item already found is absorbed by it
+        for pos in list(positions):
+            if any(state.found.get(i) for i in self.index.items_for_token(state.normalized[pos])):
+                state.consumed[pos] = True
+                positions.remove(pos)
+        self._resolve_tokens(state, positions, allow_ties=True)
+
+    def _match_fuzzy(self, state: "_MatchState") -> bool:
+        """Score leftover words against every name; False if cut short by the deadline"""
+        positions = [p for p in state.unknown_positions(self.index) if len(state.raw[p]) > 2]
+        complete = True
+        if state.deadline is not None and len(positions) > MAX_FUZZY_WORDS_WITH_DEADLINE:
+            positions = positions[:MAX_FUZZY_WORDS_WITH_DEADLINE]
+            complete = False
+
+        for pos in positions:
+            if state.deadline is not None and time.monotonic() >= state.deadline:
+                return False
+            word = state.raw[pos]
+            best_match = process.extractOne(word, self.index.names, scorer=fuzz.WRatio)
+            if best_match and best_match[1] >= self.fuzzy_threshold:
+                state.add(best_match[2], [pos])
+        return complete
+
+    def _attach_modifiers(self, state: "_MatchState", positions: List[int]) -> Dict[int, int]:
+        """Map each modifier word to the head word it qualifies
+
+        A known word that never ends a name ("veggie"), directly before other
+        known words, belongs to the first of them that can ("burger").
+        """
+        known = set(positions)
+        attached = {}
+        for pos in positions:
+            if self.index.is_head_token(state.normalized[pos]):
+                continue
+            head = pos + 1
+            while head in known and not self.index.is_head_token(state.normalized[head]):
+                head += 1
+            if head in known:
+                attached[pos] = head
+        return attached
+
+    def _resolve_tokens(self, state: "_MatchState", positions: List[int], allow_ties: bool):
+        """Greedily assign known tokens to the items that cover most of them
+
+        A modifier only counts towards items that also contain its head word,
+        and is used up with it, so "veggie burger" is one item even when the
+        menu has no Veggie Burger (never Veggie Pizza plus a burger).
+        """
+        positions = [p for p in positions if not state.consumed[p]]
+        attached = self._attach_modifiers(state, positions)
+        while positions:
+            scores: Dict[int, List[int]] = {}
+            for pos in positions:
+                items = self.index.items_for_token(state.normalized[pos])
+                head = attached.get(pos)
+                if head is not None:
+                    head_items = set(self.index.items_for_token(state.normalized[head]))
+                    items = [item for item in items if item in head_items]
+                for item in items:
+                    scores.setdefault(item, []).append(pos)
+            if not scores:
+                return
+            ranked = sorted(scores.items(), key=lambda kv: (-len(kv[1]), kv[0]))
+            item, covered = ranked[0]
+            tied = len(ranked) > 1 and len(ranked[1][1]) == len(covered)
+            if tied and not allow_ties:
+                # Fall back to an item that owns one of the tokens outright
+                owners = [
+                    (i, ps) for i, ps in ranked
+                    if any(len(self.index.items_for_token(state.normalized[p])) == 1 for p in ps)
+                ]
+                if not owners:
+                    return
+                item, covered = owners[0]
+            state.add(item, covered + [p for p, head in attached.items() if head in covered])
+            positions = [p for p in positions if not state.consumed[p]]
+
+class _MatchState:
+    """Mutable per-message state shared by the tiers"""
+
+    def __init__(self, tokens: List[str], deadline: Optional[float] = None):
+        self.deadline = deadline
+        self.raw = tokens
+        self.normalized = [singularize(t) for t in tokens]
+        self.consumed = [not is_content_token(t) for t in tokens]
+        self.found: Dict[int, Tuple[int, int]] = {}
+
+    def add(self, item: int, positions: Iterable[int]):
+        positions = list(positions)
+        for pos in positions:
+            self.consumed[pos] = True
+        if item not in self.found:
+            self.found[item] = (min(positions), item)
+
+    def pending(self) -> bool:
+        return not all(self.consumed)
+
+    def known_positions(self, index: MenuIndex) -> List[int]:
+        return [
+            i for i, token in enumerate(self.normalized)
+            if not self.consumed[i] and index.items_for_token(token)
+        ]
+
+    def unknown_positions(self, index: MenuIndex) -> List[int]:
+        return [
+            i for i, token in enumerate(self.normalized)
+            if not self.consumed[i] and not index.items_for_token(token)
+        ]
+
+def menu_version(menu_names: List[str]) -> str:
+    """Stable key identifying a menu's contents, the same in every process"""
+    digest = hashlib.sha1("\n".join(menu_names).encode("utf-8")).hexdigest()
+    return f"{len(menu_names)}:{digest[:16]}"
+
+@lru_cache(maxsize=8)
+def _cached_matcher(menu_names: Tuple[str, ...]) -> MenuMatcher:
+    return MenuMatcher(MenuIndex(menu_names))
+
+def get_menu_matcher(menu_names: Optional[List[str]] = None, index=None) -> MenuMatcher:
+    """Return a matcher for the menu, reusing the index while the menu is unchanged
+
+    A prebuilt index (such as the shared menu_index.MappedMenuIndex) takes
+    precedence over menu_names.
+    """
+    if index is not None:
+        return MenuMatcher(index)
+    return _cached_matcher(tuple(menu_names or ()))
+
+def get_matcher_stats() -> Dict[str, Any]:
+    """Per-tier hit rates and latencies since start-up (or the last reset)"""
+    return matcher_stats.snapshot()
+
+def reset_matcher_stats():
+    """Clear the per-tier counters"""
+    matcher_stats.reset()
+
+def _collect_matcher_metrics():
+    """Expose tier counters and the index cache for the /metrics endpoint"""
+    snapshot = matcher_stats.snapshot()
+    tiers = snapshot["tiers"]
+    cache = _cached_matcher.cache_info()
+    return [
+        ("smartdine_matcher_tier_reached_total", "counter", "Messages that reached each matcher tier",
+         [({"tier": t}, e["reached"]) for t, e in tiers.items()]),
+        ("smartdine_matcher_tier_resolved_total", "counter", "Messages fully resolved at each matcher tier",
+         [({"tier": t}, e["resolved"]) for t, e in tiers.items()]),
+        ("smartdine_matcher_tier_seconds_total", "counter", "Time spent in each matcher tier",
+         [({"tier": t}, e["total_ms"] / 1000) for t, e in tiers.items()]),
+        ("smartdine_cache_hits_total", "counter", "Cache hits by cache",
+         [({"cache": "menu_matcher"}, cache.hits)]),
+        ("smartdine_cache_misses_total", "counter", "Cache misses by cache",
+         [({"cache": "menu_matcher"}, cache.misses)]),
+    ]
+
+registry.register_collector(_collect_matcher_metrics)
@@ -0,0 +1,329 @@
+import os
+import mmap
+import time
+import struct
+import hashlib
+import logging
+import threading
+from collections.abc import Sequence
+from typing import List, Dict, Any, Optional, Tuple
+
+from matcher import MenuIndex, trigrams, tokenize, singularize
+from logging_setup import configure_logging
+
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# On-disk layout (little endian):
+#   header   MAGIC, format version, content digest, counts, max phrase length,
+#            then (offset, length) for each section in SECTIONS
+#   strings  UTF-8 blob referenced by (offset, length) pairs in the tables
+#   items    one ITEM record per menu item, available items first
+#   tables   sorted key records for binary search, with uint32 posting arrays
+MAGIC = b"SDMI"
+FORMAT_VERSION = 1
+POINTER_FILE = "CURRENT"
+
+SECTIONS = (
+    "strings", "items", "names", "raw_phrases", "alias_phrases",
+    "tokens", "token_postings", "ngrams", "ngram_postings",
+)
+_HEADER = struct.Struct("<4sHH20sIII")
+_SECTION = struct.Struct("<QQ")
+_ITEM = struct.Struct("<IIIIdB")      # name off/len, item_id off/len, price, available
+_KEY = struct.Struct("<III")          # key off/len, item position
+_POSTING_KEY = struct.Struct("<IIII")  # key off/len, postings start/count
+_U32 = struct.Struct("<I")
+
+class _StringTable:
+    """Accumulates the strings blob, de-duplicating repeated strings"""
+
+    def __init__(self):
+        self.blob = bytearray()
+        self.offsets: Dict[bytes, Tuple[int, int]] = {}
+
+    def add(self, value: str) -> Tuple[int, int]:
+        data = value.encode("utf-8")
+        if data not in self.offsets:
+            self.offsets[data] = (len(self.blob), len(data))
+            self.blob.extend(data)
+        return self.offsets[data]
+
+def _phrase_key(tokens: Tuple[str, ...]) -> str:
+    return " ".join(tokens)
+
+def serialize_menu_index(menu_items: List[Dict[str, Any]]) -> bytes:
+    """Serialize menu documents into the read-only index format"""
+    # Available items first so the matcher's name space is a prefix of the items table
+    by_name = {}
+    for item in sorted(menu_items, key=lambda item: not item.get('available', True)):
+        by_name.setdefault(item['name'], item)
+    items = list(by_name.values())
+    available = [item for item in items if item.get('available', True)]
+
+    aliases = {}
+    for item in available:
+        for alias in item.get('aliases', []) or []:
+            aliases.setdefault(alias, item['name'])
+    index = MenuIndex([item['name'] for item in available], aliases)
+
+    strings = _StringTable()
+    sections: Dict[str, bytearray] = {name: bytearray() for name in SECTIONS}
+
+    for item in items:
+        name_off, name_len = strings.add(item['name'])
+        id_off, id_len = strings.add(str(item.get('item_id', '')))
+        sections["items"] += _ITEM.pack(
+            name_off, name_len, id_off, id_len,
+            float(item.get('price', 0)), 1 if item.get('available', True) else 0
+        )
+
+    def write_keys(section: str, entries: List[Tuple[str, int]]):
+        for key, position in sorted(entries, key=lambda e: e[0].encode("utf-8")):
+            sections[section] += _KEY.pack(*strings.add(key), position)
+
+    write_keys("names", [(item['name'].lower(), i) for i, item in enumerate(items)])
+    write_keys("raw_phrases", [(_phrase_key(k), v) for k, v in index.raw_phrases.items()])
+    write_keys("alias_phrases", [(_phrase_key(k), v) for k, v in index.alias_phrases.items()])
+
+    tokens = sorted(index.token_postings, key=lambda t: t.encode("utf-8"))
+    token_ids = {token: i for i, token in enumerate(tokens)}
+    for token in tokens:
+        postings = index.token_postings[token]
+        start = len(sections["token_postings"]) // _U32.size
+        sections["tokens"] += _POSTING_KEY.pack(*strings.add(token), start, len(postings))
+        for position in postings:
+            sections["token_postings"] += _U32.pack(position)
+
+    for gram in sorted(index.ngram_postings, key=lambda g: g.encode("utf-8")):
+        postings = index.ngram_postings[gram]
+        start = len(sections["ngram_postings"]) // _U32.size
+        sections["ngrams"] += _POSTING_KEY.pack(*strings.add(gram), start, len(postings))
+        for token in postings:
+            sections["ngram_postings"] += _U32.pack(token_ids[token])
+
+    sections["strings"] = strings.blob
+
+    body = b"".join(bytes(sections[name]) for name in SECTIONS)
+    digest = hashlib.sha1(body).digest()
+    header_size = _HEADER.size + _SECTION.size * len(SECTIONS)
+
+    header = bytearray(_HEADER.pack(
+        MAGIC, FORMAT_VERSION, 0, digest, len(items), len(available), index.max_phrase_len
+    ))
+    offset = header_size
+    for name in SECTIONS:
+        header += _SECTION.pack(offset, len(sections[name]))
+        offset += len(sections[name])
+
+    return bytes(header) + body
+
+def write_menu_index(menu_items: List[Dict[str, Any]], directory: str, keep: int = 3) -> str:
+    """Write a new index version to directory and atomically make it current
+
+    Returns the path of the published file. Unchanged menus republish the
+    existing file, so running a refresh twice is cheap.
+    """
+    os.makedirs(directory, exist_ok=True)
+    data = serialize_menu_index(menu_items)
+    version = data[8:28].hex()[:16]
+    filename = f"menu_index_{version}.bin"
+    path = os.path.join(directory, filename)
+
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    # Swap the pointer last so readers never see a partially written file
+    pointer_tmp = os.path.join(directory, f"{POINTER_FILE}.{os.getpid()}.tmp")
+    with open(pointer_tmp, "w") as f:
+        f.write(filename)
+    os.replace(pointer_tmp, os.path.join(directory, POINTER_FILE))
+
+    _prune_old_versions(directory, filename, keep)
+    logger.info(f"Published menu index {filename} ({len(menu_items)} items, {len(data)} bytes)")
+    return path
+
+def _prune_old_versions(directory: str, current: str, keep: int):
+    """Remove all but the newest `keep` index files (workers keep open maps alive)"""
+    files = [f for f in os.listdir(directory) if f.startswith("menu_index_") and f.endswith(".bin")]
+    files.sort(key=lambda f: os.path.getmtime(os.path.join(directory, f)), reverse=True)
+    for name in files[keep:]:
+        if name != current:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError as e:
+                logger.debug(f"Could not remove old menu index {name}: {e}")
+
+class _NameColumn(Sequence):
+    """Lazy view of item names, decoded from the map on access"""
+
+    def __init__(self, index: "MappedMenuIndex", count: int):
+        self._index = index
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(self._count))]
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError(position)
+        return self._index.item(position)['name']
+
+class MappedMenuIndex:
+    """Read-only menu index backed by a memory-mapped file
+
+    Provides the same lookups as matcher.MenuIndex, so MenuMatcher can use
+    either. Pages are shared between every process that maps the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buf = memoryview(self._map)
+
+        magic, fmt, _, digest, item_count, available_count, max_phrase_len = _HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a menu index (format {fmt})")
+
+        self.version = digest.hex()[:16]
+        self.item_count = item_count
+        self.available_count = available_count
+        self.max_phrase_len = max_phrase_len
+        self._sections = {}
+        for i, name in enumerate(SECTIONS):
+            self._sections[name] = _SECTION.unpack_from(self._buf, _HEADER.size + i * _SECTION.size)
+        self.names = _NameColumn(self, available_count)
+        self._head_tokens: Optional[set] = None
+
+    def _string(self, offset: int, length: int) -> str:
+        base = self._sections["strings"][0]
+        return bytes(self._buf[base + offset:base + offset + length]).decode("utf-8")
+
+    def _key_bytes(self, offset: int, length: int) -> bytes:
+        base = self._sections["strings"][0]
+        return bytes(self._buf[base + offset:base + offset + length])
+
+    def _search(self, section: str, record: struct.Struct, key: str) -> Optional[tuple]:
+        """Binary search a sorted key table, returning the matching record"""
+        target = key.encode("utf-8")
+        base, length = self._sections[section]
+        lo, hi = 0, length // record.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = record.unpack_from(self._buf, base + mid * record.size)
+            current = self._key_bytes(entry[0], entry[1])
+            if current < target:
+                lo = mid + 1
+            elif current > target:
+                hi = mid
+            else:
+                return entry
+        return None
+
+    def _postings(self, section: str, start: int, count: int) -> List[int]:
+        base = self._sections[section][0] + start * _U32.size
+        return list(struct.unpack_from(f"<{count}I", self._buf, base))
+
+    def item(self, position: int) -> Dict[str, Any]:
+        """Return the item_id, name, price and availability columns for one item"""
+        base = self._sections["items"][0]
+        name_off, name_len, id_off, id_len, price, available = _ITEM.unpack_from(
+            self._buf, base + position * _ITEM.size
+        )
+        return {
+            "item_id": self._string(id_off, id_len),
+            "name": self._string(name_off, name_len),
+            "price": int(price) if price.is_integer() else price,
+            "available": bool(available),
+        }
+
+    def find_item(self, name: str) -> Optional[Dict[str, Any]]:
+        """Look up an item by (case-insensitive) name"""
+        entry = self._search("names", _KEY, name.lower())
+        return self.item(entry[2]) if entry else None
+
+    def lookup_phrase(self, tokens: Tuple[str, ...], normalized: bool) -> Optional[int]:
+        entry = self._search("alias_phrases" if normalized else "raw_phrases", _KEY, _phrase_key(tokens))
+        return entry[2] if entry else None
+
+    def items_for_token(self, token: str) -> List[int]:
+        entry = self._search("tokens", _POSTING_KEY, token)
+        return self._postings("token_postings", entry[2], entry[3]) if entry else []
+
+    def is_head_token(self, token: str) -> bool:
+        if self._head_tokens is None:
+            self._head_tokens = {singularize(tokens[-1]) for tokens in map(tokenize, self.names) if tokens}
+        return token in self._head_tokens
+
+    def vocabulary_candidates(self, token: str) -> List[str]:
+        tokens_base = self._sections["tokens"][0]
+        seen: Dict[int, int] = {}
+        for gram in trigrams(token):
+            entry = self._search("ngrams", _POSTING_KEY, gram)
+            if entry:
+                for token_id in self._postings("ngram_postings", entry[2], entry[3]):
+                    seen[token_id] = seen.get(token_id, 0) + 1
+        ranked = sorted(seen, key=seen.get, reverse=True)
+        result = []
+        for token_id in ranked:
+            key_off, key_len, _, _ = _POSTING_KEY.unpack_from(self._buf, tokens_base + token_id * _POSTING_KEY.size)
+            result.append(self._string(key_off, key_len))
+        return result
+
+class MenuIndexStore:
+    """Tracks the current published index in a directory and swaps to new versions
+
+    The pointer file is re-checked at most every `check_interval` seconds, so
+    a refresh is picked up by every worker without a restart.
+    """
+
+    def __init__(self, directory: Optional[str], check_interval: float = 2.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._current: Optional[MappedMenuIndex] = None
+        self._current_name: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[MappedMenuIndex]:
+        """Return the mapped index for the current version, or None if none is published"""
+        if not self.directory:
+            return None
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            with self._lock:
+                if now - self._checked_at >= self.check_interval:
+                    self._refresh()
+                    self._checked_at = now
+        return self._current
+
+    def _refresh(self):
+        try:
+            with open(os.path.join(self.directory, POINTER_FILE)) as f:
+                name = f.read().strip()
+        except OSError:
+            return
+        if name == self._current_name:
+            return
+        try:
+            index = MappedMenuIndex(os.path.join(self.directory, name))
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to map menu index {name}: {e}")
+            return
+        # Rebinding is atomic; requests holding the old index keep its map alive
+        self._current, self._current_name = index, name
+        logger.info(f"Using menu index {name} ({index.available_count} available items)")
+
+# Create global instance (disabled unless MENU_INDEX_DIR is set)
+menu_index_store = MenuIndexStore(os.environ.get('MENU_INDEX_DIR'))
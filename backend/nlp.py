@@ -1,10 +1,18 @@
+import os
 import re
+import json
+import time
+import socket
+import struct
 import logging
-from typing import List, Dict, Any
-from rapidfuzz import process, fuzz
+import threading
+from typing import List, Dict, Any, Optional
+from matcher import get_menu_matcher, menu_version
+from metrics import registry
+from logging_setup import configure_logging
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Try to import advanced NLP libraries, fallback to basic processing if not available
@@ -23,37 +31,72 @@ except ImportError:
     WORD2NUMBER_AVAILABLE = False
     logger.info("word2number not available - using basic number parsing")
 
+# Client mode: when set, parse_order is served by the shared NLP server
+# (nlp_server.py) listening on this Unix socket
+NLP_SERVER_SOCKET = os.environ.get('NLP_SERVER_SOCKET')
+NLP_SERVER_TIMEOUT = float(os.environ.get('NLP_SERVER_TIMEOUT', 2))
+
+CANDIDATE_INTENTS = ["order_food", "show_menu", "cancel_order", "greeting", "help"]
+
+NLP_STAGE_SECONDS = registry.histogram(
+    "smartdine_nlp_stage_seconds", "Time spent in each NLP stage", ("stage",)
+)
+NLP_SERVER_FALLBACKS = registry.counter(
+    "smartdine_nlp_server_fallbacks_total", "Parses done locally because the NLP server was unavailable"
+)
+
+# Deadline-aware parsing: the transformer only runs with at least this many
+# seconds left, and budgeted messages are cut to this many characters
+TRANSFORMER_MIN_BUDGET = 0.75
+MAX_BUDGETED_CHARS = 500
+
+# Intent patterns, tried in order; the first match wins
+INTENT_PATTERNS = {
+    'order_food': [
+        r'\b(want|need|order|get|give me|i\'ll have|can i have)\b',
+        r'\b(pizza|burger|chicken|food|drink|eat)\b',
+        r'\b\d+\b.*\b(pizza|burger|chicken|coke|tea|coffee)\b'
+    ],
+    'show_menu': [
+        r'\b(menu|what do you have|what\'s available|show|list)\b',
+        r'\b(see.*menu|menu.*please)\b'
+    ],
+    'cancel_order': [
+        r'\b(cancel|remove|delete|stop)\b.*\b(order)\b',
+        r'\b(don\'t want|changed my mind)\b'
+    ],
+    'greeting': [
+        r'\b(hello|hi|hey|good morning|good evening)\b',
+        r'\b(how are you|what\'s up)\b'
+    ],
+    'help': [
+        r'\b(help|how|what can)\b',
+        r'\b(assist|support|guide)\b'
+    ]
+}
+
+_COMPILED_INTENT_PATTERNS = [(intent, re.compile(pattern, re.IGNORECASE))
+                             for intent, patterns in INTENT_PATTERNS.items() for pattern in patterns]
+
+def match_intent(text: str) -> Optional[str]:
+    """Return the intent of the first matching pattern, if any (no models or menu needed)"""
+    text_lower = text.lower()
+    for intent, pattern in _COMPILED_INTENT_PATTERNS:
+        if pattern.search(text_lower):
+            logger.debug("Intent '%s' matched by pattern: %s", intent, pattern.pattern)
+            return intent
+    return None
+
 class RestaurantNLP:
     """NLP processor for restaurant orders"""
     
-    def __init__(self):
+    def __init__(self, use_transformer: bool = True):
         self.intent_classifier = None
-        self.setup_models()
+        if use_transformer:
+            self.setup_models()
         
         # Define intent patterns
-        self.intent_patterns = {
-            'order_food': [
-                r'\b(want|need|order|get|give me|i\'ll have|can i have)\b',
-                r'\b(pizza|burger|chicken|food|drink|eat)\b',
-                r'\b\d+\b.*\b(pizza|burger|chicken|coke|tea|coffee)\b'
-            ],
-            'show_menu': [
-                r'\b(menu|what do you have|what\'s available|show|list)\b',
-                r'\b(see.*menu|menu.*please)\b'
-            ],
-            'cancel_order': [
-                r'\b(cancel|remove|delete|stop)\b.*\b(order)\b',
-                r'\b(don\'t want|changed my mind)\b'
-            ],
-            'greeting': [
-                r'\b(hello|hi|hey|good morning|good evening)\b',
-                r'\b(how are you|what\'s up)\b'
-            ],
-            'help': [
-                r'\b(help|how|what can)\b',
-                r'\b(assist|support|guide)\b'
-            ]
-        }
+        self.intent_patterns = INTENT_PATTERNS
         
         # Common quantity words
         self.quantity_words = {
@@ -78,36 +121,42 @@ class RestaurantNLP:
                 logger.warning(f"Failed to load transformer model: {e}")
                 self.intent_classifier = None
     
+    def match_intent_patterns(self, text: str) -> Optional[str]:
+        """Return the intent of the first matching pattern, if any"""
+        return match_intent(text)
+    
     def classify_intent(self, text: str) -> str:
         """Classify the intent of the input text"""
-        text_lower = text.lower()
-        
+        return self.classify_intents([text])[0]
+    
+    def classify_intents(self, texts: List[str], use_transformer: bool = True) -> List[str]:
+        """Classify several texts, sending pattern misses to the transformer as one batch"""
         # First try pattern matching (fast and reliable)
-        for intent, patterns in self.intent_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, text_lower, re.IGNORECASE):
-                    logger.debug(f"Intent '{intent}' matched by pattern: {pattern}")
-                    return intent
+        intents = [self.match_intent_patterns(text) for text in texts]
+        pending = [i for i, intent in enumerate(intents) if intent is None]
         
         # If no pattern match and transformer is available, use it
-        if self.intent_classifier is not None:
+        if pending and use_transformer and self.intent_classifier is not None:
             try:
-                candidate_intents = ["order_food", "show_menu", "cancel_order", "greeting", "help"]
-                result = self.intent_classifier(text, candidate_intents)
-                intent = result['labels'][0]
-                confidence = result['scores'][0]
+                results = self.intent_classifier([texts[i] for i in pending], CANDIDATE_INTENTS)
+                if isinstance(results, dict):
+                    results = [results]
                 
-                # Only trust high confidence predictions
-                if confidence > 0.5:
-                    logger.debug(f"Intent '{intent}' classified by transformer with confidence {confidence:.2f}")
-                    return intent
-                else:
-                    logger.debug(f"Low confidence classification ({confidence:.2f}), defaulting to order_food")
+                for i, result in zip(pending, results):
+                    intent = result['labels'][0]
+                    confidence = result['scores'][0]
+                    
+                    # Only trust high confidence predictions
+                    if confidence > 0.5:
+                        logger.debug("Intent '%s' classified by transformer with confidence %.2f", intent, confidence)
+                        intents[i] = intent
+                    else:
+                        logger.debug("Low confidence classification (%.2f), defaulting to order_food", confidence)
             except Exception as e:
                 logger.error(f"Error in transformer classification: {e}")
         
         # Default to order_food if no clear intent found
-        return "order_food"
+        return [intent or "order_food" for intent in intents]
     
     def extract_quantities(self, text: str) -> List[int]:
         """Extract quantities from text"""
@@ -135,89 +184,42 @@ class RestaurantNLP:
                     except ValueError:
                         continue
             except Exception as e:
-                logger.debug(f"word2number processing error: {e}")
+                logger.debug("word2number processing error: %s", e)
         
         # Remove duplicates and sort
         quantities = sorted(list(set(quantities)))
         
-        logger.debug(f"Extracted quantities: {quantities}")
+        logger.debug("Extracted quantities: %s", quantities)
         return quantities
-    
-    def fuzzy_match_items(self, text: str, menu_names: List[str], threshold: int = 75) -> List[str]:
-        """Find menu items in text using fuzzy matching"""
-        if not menu_names:
-            return []
-        
-        matched_items = []
-        text_lower = text.lower()
-        
-        # Direct substring matching first (highest priority)
-        for name in menu_names:
-            if name.lower() in text_lower:
-                matched_items.append(name)
-        
-        # If no direct matches, try fuzzy matching
-        if not matched_items:
-            words = text_lower.split()
-            
-            # Check each word against menu items
-            for word in words:
-                if len(word) > 2:  # Ignore very short words
-                    best_match = process.extractOne(
-                        word, 
-                        menu_names, 
-                        scorer=fuzz.WRatio
-                    )
-                    if best_match and best_match[1] >= threshold:
-                        if best_match[0] not in matched_items:
-                            matched_items.append(best_match[0])
-            
-            # Also try matching the entire text against each menu item
-            for name in menu_names:
-                similarity = fuzz.partial_ratio(text_lower, name.lower())
-                if similarity >= threshold and name not in matched_items:
-                    matched_items.append(name)
-        
-        logger.debug(f"Fuzzy matched items: {matched_items}")
-        return matched_items
-    
-    def extract_items_advanced(self, text: str, menu_names: List[str]) -> List[str]:
-        """Advanced item extraction with context awareness"""
-        items = []
-        text_lower = text.lower()
-        
-        # Look for patterns like "2 pizzas", "chicken burger", etc.
-        patterns = [
-            r'\b\d+\s+(\w+(?:\s+\w+)?)\b',  # "2 pizzas", "1 chicken pizza"
-            r'\b(a|an)\s+(\w+(?:\s+\w+)?)\b',  # "a burger", "an ice cream"
-            r'\b(some|few)\s+(\w+(?:\s+\w+)?)\b'  # "some fries", "few samosas"
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, text_lower, re.IGNORECASE)
-            for match in matches:
-                # match might be a tuple from group captures
-                item_text = match if isinstance(match, str) else ' '.join(match).strip()
-                
-                # Try to match against menu items
-                best_match = process.extractOne(item_text, menu_names, scorer=fuzz.WRatio)
-                if best_match and best_match[1] >= 75:
-                    if best_match[0] not in items:
-                        items.append(best_match[0])
-        
-        # If no pattern matches, fall back to fuzzy matching
-        if not items:
-            items = self.fuzzy_match_items(text, menu_names)
-        
-        return items
 
-def parse_order(text: str, menu_names: List[str]) -> Dict[str, Any]:
+_nlp_processor = None
+_nlp_processor_lock = threading.Lock()
+
+def get_nlp_processor() -> RestaurantNLP:
+    """Return the process-wide NLP processor, loading models on first use
+
+    In client mode the transformer lives in the NLP server, so the local
+    processor only does regex and fuzzy matching.
+    """
+    global _nlp_processor
+    if _nlp_processor is None:
+        with _nlp_processor_lock:
+            if _nlp_processor is None:
+                _nlp_processor = RestaurantNLP(use_transformer=not NLP_SERVER_SOCKET)
+    return _nlp_processor
+
+def parse_order(text: str, menu_names: Optional[List[str]], index=None,
+                deadline: Optional[float] = None, budget: Optional[float] = None) -> Dict[str, Any]:
     """
     Main function to parse a restaurant order from natural language text
     
     Args:
         text: Natural language input from user
         menu_names: List of available menu item names
+        index: Optional prebuilt menu index (e.g. the shared mmap index from
+            menu_index.py); used instead of menu_names when given
+        deadline: Optional time.monotonic() value by which parsing should finish
+        budget: Optional number of seconds to spend (alternative to deadline)
     
     Returns:
         Dictionary containing:
@@ -225,40 +227,82 @@ def parse_order(text: str, menu_names: List[str]) -> Dict[str, Any]:
         - items: List of matched menu items
         - quantities: List of extracted quantities
         - confidence: Confidence score for the parsing
+        - skipped_stages: Stages skipped or cut short to meet the deadline
     """
+    if deadline is None and budget is not None:
+        deadline = time.monotonic() + budget
     
-    if not text or not text.strip():
-        return {
-            "intent": "help",
-            "items": [],
-            "quantities": [],
-            "confidence": 0.0
-        }
+    if NLP_SERVER_SOCKET and text and text.strip():
+        with NLP_STAGE_SECONDS.time(stage="server"):
+            result = get_nlp_client().parse_order(text, menu_names, index, deadline)
+        if result is not None:
+            return result
+        # Server slow or down: fall back to local regex parsing
+        NLP_SERVER_FALLBACKS.inc()
+    
+    return parse_orders([text], menu_names, index, deadline=deadline)[0]
+
+def parse_orders(texts: List[str], menu_names: Optional[List[str]], index=None,
+                 nlp: Optional[RestaurantNLP] = None, deadline: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Parse several messages locally, classifying their intents in one batch"""
+    nlp = nlp or get_nlp_processor()
     
-    # Initialize NLP processor
-    nlp = RestaurantNLP()
+    results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+    pending = []
+    for i, text in enumerate(texts):
+        if not text or not text.strip():
+            results[i] = {
+                "intent": "help",
+                "items": [],
+                "quantities": [],
+                "confidence": 0.0,
+                "skipped_stages": []
+            }
+        else:
+            pending.append(i)
+    
+    # Clean input text, cutting overlong messages when working to a deadline
+    cleaned = [texts[i].strip() for i in pending]
+    skipped = [[] for _ in pending]
+    if deadline is not None:
+        for j, text in enumerate(cleaned):
+            if len(text) > MAX_BUDGETED_CHARS:
+                cleaned[j] = text[:MAX_BUDGETED_CHARS]
+                skipped[j].append("full_text")
+    if logger.isEnabledFor(logging.DEBUG):
+        for text in cleaned:
+            logger.debug("Processing order text: %s", text)
     
-    # Clean input text
-    text = text.strip()
-    logger.info(f"Processing order text: {text}")
+    # Classify intent, leaving out the transformer if it cannot finish in time
+    use_transformer = deadline is None or deadline - time.monotonic() >= TRANSFORMER_MIN_BUDGET
+    if not use_transformer and nlp.intent_classifier is not None:
+        for stages in skipped:
+            stages.append("transformer")
+    with NLP_STAGE_SECONDS.time(stage="intent"):
+        intents = nlp.classify_intents(cleaned, use_transformer=use_transformer) if cleaned else []
     
-    # Classify intent
-    intent = nlp.classify_intent(text)
+    for i, text, intent, stages in zip(pending, cleaned, intents, skipped):
+        results[i] = _parse_with_intent(nlp, text, intent, menu_names, index, deadline, stages)
+    return results
+
+def _parse_with_intent(nlp: RestaurantNLP, text: str, intent: str, menu_names: Optional[List[str]],
+                       index=None, deadline: Optional[float] = None,
+                       skipped: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Extract items and quantities once the intent is known"""
+    skipped = skipped if skipped is not None else []
     
     # Extract items and quantities
     items = []
     quantities = []
     
     if intent == "order_food":
-        # Extract items using advanced matching
-        items = nlp.extract_items_advanced(text, menu_names)
-        
-        # If no items found with advanced method, try basic fuzzy matching
-        if not items:
-            items = nlp.fuzzy_match_items(text, menu_names, threshold=75)
+        # Extract items with the tiered matcher (exact -> alias -> token -> n-gram -> fuzzy)
+        with NLP_STAGE_SECONDS.time(stage="match"):
+            items = get_menu_matcher(menu_names, index).match(text, deadline=deadline, skipped=skipped)
         
         # Extract quantities
-        quantities = nlp.extract_quantities(text)
+        with NLP_STAGE_SECONDS.time(stage="quantities"):
+            quantities = nlp.extract_quantities(text)
         
         # Ensure we have at least as many quantities as items
         while len(quantities) < len(items):
@@ -275,12 +319,128 @@ def parse_order(text: str, menu_names: List[str]) -> Dict[str, Any]:
         "intent": intent,
         "items": items,
         "quantities": quantities,
-        "confidence": confidence
+        "confidence": confidence,
+        "skipped_stages": skipped
     }
     
-    logger.info(f"Parse result: {result}")
+    logger.debug("Parse result: %s", result)
     return result
 
+def write_frame(sock: socket.socket, message: Dict[str, Any]):
+    """Send one length-prefixed JSON message"""
+    payload = json.dumps(message).encode("utf-8")
+    sock.sendall(struct.pack(">I", len(payload)) + payload)
+
+def read_frame(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    """Read one length-prefixed JSON message, or None if the peer closed"""
+    header = _read_exact(sock, 4)
+    if header is None:
+        return None
+    payload = _read_exact(sock, struct.unpack(">I", header)[0])
+    if payload is None:
+        return None
+    return json.loads(payload.decode("utf-8"))
+
+def _read_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+class NLPServerClient:
+    """Client for the shared NLP server, one connection per thread
+
+    Returns None instead of raising when the server is slow or unreachable,
+    and stops trying for `retry_after` seconds so callers are not charged
+    the timeout on every request while it is down.
+    """
+    
+    def __init__(self, socket_path: str, timeout: float = 2.0, retry_after: float = 5.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._local = threading.local()
+        self._down_until = 0.0
+    
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+    
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+    
+    def request(self, message: Dict[str, Any], deadline: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Send a request and return the server's response, or None on failure"""
+        now = time.monotonic()
+        if now < self._down_until:
+            return None
+        timeout = self.timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - now)
+            if timeout <= 0:
+                return None
+        try:
+            sock = self._connection()
+            sock.settimeout(timeout)
+            write_frame(sock, message)
+            response = read_frame(sock)
+            if response is None:
+                raise ConnectionError("NLP server closed the connection")
+            return response
+        except (OSError, ValueError) as e:
+            logger.warning(f"NLP server unavailable ({e}), using local parsing for {self.retry_after}s")
+            self._close()
+            self._down_until = time.monotonic() + self.retry_after
+            return None
+    
+    def parse_order(self, text: str, menu_names: Optional[List[str]], index=None,
+                    deadline: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        # The server shares this machine's monotonic clock, so the deadline is sent as-is
+        message = {"op": "parse_order", "text": text, "deadline": deadline}
+        if index is not None:
+            # Absolute, since the server resolves it against its own working directory
+            response = self.request({**message, "index_path": os.path.abspath(index.path)}, deadline)
+        else:
+            # Send the menu names only when the server does not know this version yet
+            version = menu_version(menu_names or [])
+            response = self.request({**message, "menu_version": version}, deadline)
+            if response is not None and response.get("error") == "menu_missing":
+                response = self.request({**message, "menu_version": version,
+                                         "menu_names": list(menu_names or [])}, deadline)
+        if response is None or not response.get("ok"):
+            return None
+        return response["result"]
+    
+    def classify_intent(self, text: str) -> Optional[str]:
+        response = self.request({"op": "classify_intent", "text": text})
+        if response is None or not response.get("ok"):
+            return None
+        return response["result"]
+
+_nlp_client = None
+
+def get_nlp_client() -> NLPServerClient:
+    """Return the shared NLP server client (client mode only)"""
+    global _nlp_client
+    if _nlp_client is None:
+        _nlp_client = NLPServerClient(NLP_SERVER_SOCKET, timeout=NLP_SERVER_TIMEOUT)
+    return _nlp_client
+
 def calculate_confidence(text: str, intent: str, items: List[str], quantities: List[int]) -> float:
     """Calculate confidence score for the parsing result"""
     
@@ -0,0 +1,172 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Optional
+
+from nlp import parse_order, get_nlp_processor
+from matcher import menu_version
+from menu_index import MappedMenuIndex
+from logging_setup import configure_logging
+
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Returned by a worker that has not been sent the requested menu version yet
+MENU_MISSING = "__menu_missing__"
+
+# Menus kept per worker process, keyed by version
+_WORKER_MENU_CACHE_SIZE = 4
+_worker_menus: "OrderedDict[str, List[str]]" = OrderedDict()
+_worker_indexes: "OrderedDict[str, MappedMenuIndex]" = OrderedDict()
+
+class NLPTimeoutError(Exception):
+    """Raised when a parse does not finish within the configured timeout, or the pool cannot run it"""
+
+def _init_worker():
+    """Warm up a pool process so the first request does not pay for model loading"""
+    get_nlp_processor()
+
+def _remember(cache: OrderedDict, key: str, value):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > _WORKER_MENU_CACHE_SIZE:
+        cache.popitem(last=False)
+
+def _parse_in_worker_with_index(text: str, index_path: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+    """Run parse_order inside a pool process against a shared mmap index"""
+    index = _worker_indexes.get(index_path)
+    if index is None:
+        _remember(_worker_indexes, index_path, MappedMenuIndex(index_path))
+        index = _worker_indexes[index_path]
+    else:
+        _worker_indexes.move_to_end(index_path)
+    return parse_order(text, None, index=index, deadline=deadline)
+
+def _parse_in_worker(text: str, version: str, menu_names: Optional[List[str]],
+                     deadline: Optional[float] = None) -> Any:
+    """Run parse_order inside a pool process against its cached menu"""
+    if menu_names is not None:
+        _remember(_worker_menus, version, menu_names)
+
+    names = _worker_menus.get(version)
+    if names is None:
+        return MENU_MISSING
+    _worker_menus.move_to_end(version)
+    return parse_order(text, names, deadline=deadline)
+
+class NLPExecutor:
+    """Runs parse_order inline or in a pool of worker processes
+
+    Configured from the environment:
+        NLP_EXECUTOR       'inline' (default) or 'process'
+        NLP_WORKERS        pool size for process mode (default: CPU count)
+        NLP_TIMEOUT        seconds to wait for a parse result (default: 5)
+        NLP_START_METHOD   multiprocessing start method (default: spawn)
+    """
+
+    def __init__(self, mode: Optional[str] = None, workers: Optional[int] = None,
+                 timeout: Optional[float] = None, start_method: Optional[str] = None):
+        self.mode = (mode or os.environ.get('NLP_EXECUTOR', 'inline')).lower()
+        self.workers = workers or int(os.environ.get('NLP_WORKERS', os.cpu_count() or 1))
+        self.timeout = timeout if timeout is not None else float(os.environ.get('NLP_TIMEOUT', 5))
+        self.start_method = start_method or os.environ.get('NLP_START_METHOD', 'spawn')
+
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+        if self.mode not in ('inline', 'process'):
+            logger.warning(f"Unknown NLP_EXECUTOR '{self.mode}', using inline parsing")
+            self.mode = 'inline'
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Create the pool lazily, and again in each forked server process"""
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                context = multiprocessing.get_context(self.start_method)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_init_worker
+                )
+                self._pool_pid = os.getpid()
+                logger.info(f"Started NLP process pool with {self.workers} workers ({self.start_method})")
+            return self._pool
+
+    def _reset_pool(self, broken: Optional[ProcessPoolExecutor] = None):
+        """Drop the pool; with `broken`, only if it is still the current one"""
+        with self._lock:
+            if broken is not None and self._pool is not broken:
+                # Another request already replaced it
+                return
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def parse(self, text: str, menu_names: Optional[List[str]], timeout: Optional[float] = None,
+              index: Optional[MappedMenuIndex] = None, budget: Optional[float] = None) -> Dict[str, Any]:
+        """Parse an order, raising NLPTimeoutError if the pool is too slow
+
+        With a shared mmap index, workers map the same file instead of
+        receiving the menu names at all. A budget (seconds) is turned into
+        a deadline that parse_order degrades against. The timeout covers
+        the whole call; if a worker crashes, the parse is retried once on a
+        new pool within what is left of it.
+        """
+        deadline = time.monotonic() + budget if budget is not None else None
+        if self.mode == 'inline':
+            return parse_order(text, menu_names, index=index, deadline=deadline)
+
+        timeout = self.timeout if timeout is None else timeout
+        give_up = time.monotonic() + timeout
+
+        for attempt in (1, 2):
+            pool = self._get_pool()
+            try:
+                return self._run(pool, give_up, text, menu_names, index, deadline)
+            except FutureTimeoutError:
+                logger.warning(f"NLP parse timed out after {timeout}s")
+                raise NLPTimeoutError(f"Order parsing timed out after {timeout}s")
+            except BrokenProcessPool as e:
+                logger.error(f"NLP process pool broke, restarting: {e}")
+                self._reset_pool(pool)
+                if attempt == 2 or time.monotonic() >= give_up:
+                    raise NLPTimeoutError(f"Order parsing failed, NLP worker crashed: {e}")
+
+    def _run(self, pool: ProcessPoolExecutor, give_up: float, text: str, menu_names: Optional[List[str]],
+             index: Optional[MappedMenuIndex], deadline: Optional[float]) -> Dict[str, Any]:
+        # Pool processes share this machine's monotonic clock, so the deadline
+        # also covers time spent waiting in the pool queue
+        if index is not None:
+            return self._submit(pool, give_up, _parse_in_worker_with_index, text, index.path, deadline)
+
+        # Ship only the version first; the menu itself goes to a worker at most
+        # once per version, when it reports the version as missing
+        version = menu_version(menu_names)
+        result = self._submit(pool, give_up, _parse_in_worker, text, version, None, deadline)
+        if result == MENU_MISSING:
+            result = self._submit(pool, give_up, _parse_in_worker, text, version, menu_names, deadline)
+        return result
+
+    @staticmethod
+    def _submit(pool: ProcessPoolExecutor, give_up: float, fn, *args) -> Any:
+        """Wait for fn(*args) until `give_up` (monotonic time)"""
+        future = pool.submit(fn, *args)
+        try:
+            return future.result(timeout=max(0.0, give_up - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        self._reset_pool()
+
+# Create global instance
+nlp_executor = NLPExecutor()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Shared NLP inference server
+Loads the NLP models once and serves classify_intent / parse_order to every
+backend worker on the machine over a Unix domain socket. Requests from all
+connections are batched so the transformer runs one forward pass per batch.
+
+Usage:
+    python nlp_server.py --socket /tmp/smartdine-nlp.sock
+
+Point the backend at it with NLP_SERVER_SOCKET=/tmp/smartdine-nlp.sock.
+"""
+
+import os
+import sys
+import queue
+import logging
+import argparse
+import threading
+import socketserver
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, Tuple
+
+from nlp import RestaurantNLP, parse_orders, read_frame, write_frame
+from menu_index import MappedMenuIndex
+from logging_setup import configure_logging
+
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = os.environ.get('NLP_SERVER_SOCKET', '/tmp/smartdine-nlp.sock')
+
+class MenuMissing(Exception):
+    """The client referenced a menu version this server has not been sent"""
+
+class NLPBatcher:
+    """Collects requests from all connections and runs them in batches"""
+
+    def __init__(self, nlp: RestaurantNLP, batch_size: int = 16, batch_window: float = 0.005,
+                 menu_cache_size: int = 8, index_dir: Optional[str] = None):
+        self.nlp = nlp
+        # Clients may only name index files inside this directory
+        self.index_dir = os.path.realpath(index_dir) if index_dir else None
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.menu_cache_size = menu_cache_size
+        self._queue: "queue.Queue[Tuple[Dict[str, Any], Future]]" = queue.Queue()
+        self._menus: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._indexes: "OrderedDict[str, MappedMenuIndex]" = OrderedDict()
+        self._thread = threading.Thread(target=self._run, name="nlp-batcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def submit(self, message: Dict[str, Any]) -> Future:
+        future: Future = Future()
+        self._queue.put((message, future))
+        return future
+
+    def _next_batch(self) -> List[Tuple[Dict[str, Any], Future]]:
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=self.batch_window))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._process(batch)
+            except Exception as e:
+                logger.error(f"Error processing batch: {e}", exc_info=True)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _remember(self, cache: OrderedDict, key: str, value):
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self.menu_cache_size:
+            cache.popitem(last=False)
+
+    def _index_path(self, requested: str) -> str:
+        """Resolve a client's index path, refusing anything outside index_dir"""
+        if not self.index_dir:
+            raise ValueError("no MENU_INDEX_DIR configured")
+        path = os.path.realpath(requested)
+        if os.path.dirname(path) != self.index_dir:
+            raise ValueError(f"{requested} is outside MENU_INDEX_DIR")
+        return path
+
+    def _menu_for(self, message: Dict[str, Any]) -> Tuple[str, Optional[List[str]], Optional[MappedMenuIndex]]:
+        """Resolve the menu a parse request refers to, caching it by version"""
+        index_path = message.get("index_path")
+        if index_path:
+            index_path = self._index_path(index_path)
+            index = self._indexes.get(index_path)
+            if index is None:
+                index = MappedMenuIndex(index_path)
+                self._remember(self._indexes, index_path, index)
+            else:
+                self._indexes.move_to_end(index_path)
+            return index_path, None, index
+
+        version = message.get("menu_version", "")
+        if message.get("menu_names") is not None:
+            self._remember(self._menus, version, message["menu_names"])
+        names = self._menus.get(version)
+        if names is None:
+            raise MenuMissing(version)
+        self._menus.move_to_end(version)
+        return version, names, None
+
+    def _process(self, batch: List[Tuple[Dict[str, Any], Future]]):
+        # Group parse requests by menu so each group is one batched call
+        groups: Dict[str, Tuple[Optional[List[str]], Optional[MappedMenuIndex], list]] = {}
+        classify = []
+
+        for message, future in batch:
+            op = message.get("op")
+            if op == "ping":
+                future.set_result({"ok": True, "result": "pong"})
+            elif op == "classify_intent":
+                classify.append((message.get("text", ""), future))
+            elif op == "parse_order":
+                try:
+                    key, names, index = self._menu_for(message)
+                except MenuMissing:
+                    future.set_result({"ok": False, "error": "menu_missing"})
+                    continue
+                except (OSError, ValueError) as e:
+                    future.set_result({"ok": False, "error": f"bad menu index: {e}"})
+                    continue
+                groups.setdefault(key, (names, index, []))[2].append(
+                    (message.get("text", ""), message.get("deadline"), future)
+                )
+            else:
+                future.set_result({"ok": False, "error": f"unknown op: {op}"})
+
+        if classify:
+            intents = self.nlp.classify_intents([text for text, _ in classify])
+            for (_, future), intent in zip(classify, intents):
+                future.set_result({"ok": True, "result": intent})
+
+        for names, index, requests in groups.values():
+            # A batch works to the tightest deadline among its requests
+            deadlines = [deadline for _, deadline, _ in requests if deadline is not None]
+            results = parse_orders([text for text, _, _ in requests], names, index, nlp=self.nlp,
+                                   deadline=min(deadlines) if deadlines else None)
+            for (_, _, future), result in zip(requests, results):
+                future.set_result({"ok": True, "result": result})
+
+class _Handler(socketserver.BaseRequestHandler):
+    """Serves one client connection; a worker keeps it open across requests"""
+
+    def handle(self):
+        batcher: NLPBatcher = self.server.batcher
+        while True:
+            try:
+                message = read_frame(self.request)
+            except (OSError, ValueError) as e:
+                logger.debug(f"Dropping connection: {e}")
+                return
+            if message is None:
+                return
+            try:
+                response = batcher.submit(message).result()
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            try:
+                write_frame(self.request, response)
+            except OSError:
+                return
+
+class NLPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, batcher: NLPBatcher):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o660)
+        self.batcher = batcher
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared NLP server for the restaurant backend")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path to listen on")
+    parser.add_argument("--batch-size", type=int, default=16, help="Maximum requests per batch")
+    parser.add_argument("--batch-window-ms", type=float, default=5.0,
+                        help="How long to wait for more requests before running a batch")
+    parser.add_argument("--index-dir", default=os.environ.get('MENU_INDEX_DIR'),
+                        help="Directory of published menu indexes clients may use (default: MENU_INDEX_DIR)")
+    args = parser.parse_args()
+
+    logger.info("Loading NLP models...")
+    nlp = RestaurantNLP()
+    batcher = NLPBatcher(nlp, batch_size=args.batch_size, batch_window=args.batch_window_ms / 1000,
+                         index_dir=args.index_dir)
+    batcher.start()
+
+    server = NLPServer(args.socket, batcher)
+    logger.info(f"NLP server listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down NLP server")
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
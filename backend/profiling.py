@@ -0,0 +1,183 @@
+import os
+import re
+import sys
+import time
+import random
+import pstats
+import cProfile
+import logging
+import threading
+from collections import Counter as StackCounter
+from typing import Dict, Optional
+
+from metrics import registry
+from logging_setup import configure_logging
+
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile-Token'
+
+PROFILES = registry.counter(
+    "smartdine_profiles_total", "Profiled requests by outcome (dumped or discarded)", ("result",)
+)
+
+class _StackSampler:
+    """Samples one thread's call stack on a timer and counts collapsed stacks"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: StackCounter = StackCounter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            # Collapsed-stack format lists frames root first
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path: str):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class _ActiveProfile:
+    __slots__ = ("profiler", "sampler", "forced", "start")
+
+    def __init__(self, profiler: Optional[cProfile.Profile], sampler: Optional[_StackSampler], forced: bool):
+        self.profiler = profiler
+        self.sampler = sampler
+        self.forced = forced
+        self.start = time.perf_counter()
+
+class RequestProfiler:
+    """Opt-in profiling of a sample of requests, keeping only the slow ones
+
+    Configured from the environment:
+        PROFILE_SAMPLE_RATE   fraction of requests to profile (default: 0, off)
+        PROFILE_TOKEN         value of the X-Profile-Token header that forces
+                              profiling of a single request (default: unset, off)
+        PROFILE_THRESHOLD_MS  only keep profiles of requests slower than this (default: 500)
+        PROFILE_MODE          'sample' for collapsed stacks or 'cprofile' for pstats (default: sample)
+        PROFILE_INTERVAL_MS   stack sampling interval in sample mode (default: 5)
+        PROFILE_DIR           where profiles are written (default: /tmp/smartdine-profiles)
+        PROFILE_KEEP          number of profile files to keep (default: 50)
+    """
+
+    def __init__(self, sample_rate: Optional[float] = None, token: Optional[str] = None,
+                 threshold_ms: Optional[float] = None, mode: Optional[str] = None,
+                 interval_ms: Optional[float] = None, directory: Optional[str] = None,
+                 keep: Optional[int] = None):
+        env = os.environ
+        self.sample_rate = sample_rate if sample_rate is not None else float(env.get('PROFILE_SAMPLE_RATE', 0))
+        self.token = token if token is not None else env.get('PROFILE_TOKEN') or None
+        self.threshold = (threshold_ms if threshold_ms is not None
+                          else float(env.get('PROFILE_THRESHOLD_MS', 500))) / 1000
+        self.mode = (mode or env.get('PROFILE_MODE', 'sample')).lower()
+        self.interval = (interval_ms if interval_ms is not None
+                         else float(env.get('PROFILE_INTERVAL_MS', 5))) / 1000
+        self.directory = directory or env.get('PROFILE_DIR', '/tmp/smartdine-profiles')
+        self.keep = keep if keep is not None else int(env.get('PROFILE_KEEP', 50))
+        self._lock = threading.Lock()
+
+        if self.mode not in ('sample', 'cprofile'):
+            logger.warning(f"Unknown PROFILE_MODE '{self.mode}', using stack sampling")
+            self.mode = 'sample'
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.token is not None
+
+    def start(self, headers: Dict[str, str]) -> Optional[_ActiveProfile]:
+        """Begin profiling the current request if it is sampled or forced"""
+        forced = self.token is not None and headers.get(PROFILE_HEADER) == self.token
+        if not forced and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            return None
+
+        if self.mode == 'cprofile':
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already active on this interpreter
+                return None
+            return _ActiveProfile(profiler, None, forced)
+
+        sampler = _StackSampler(threading.get_ident(), self.interval)
+        sampler.start()
+        return _ActiveProfile(None, sampler, forced)
+
+    def stop(self, active: _ActiveProfile, label: str) -> Optional[str]:
+        """Stop profiling and write the profile if the request was slow
+
+        Forced requests are always written. Returns the file path, if any.
+        """
+        elapsed = time.perf_counter() - active.start
+        if active.profiler is not None:
+            active.profiler.disable()
+        if active.sampler is not None:
+            active.sampler.stop()
+
+        if not active.forced and elapsed < self.threshold:
+            PROFILES.inc(result="discarded")
+            return None
+
+        try:
+            path = self._write(active, label, elapsed)
+        except OSError as e:
+            logger.error(f"Could not write profile: {e}")
+            return None
+        PROFILES.inc(result="dumped")
+        logger.info(f"Profiled {label} ({elapsed * 1000:.0f} ms) -> {path}")
+        return path
+
+    def _write(self, active: _ActiveProfile, label: str, elapsed: float) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_') or 'request'
+        now = time.time()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f"{int(now * 1000) % 1000:03d}"
+        extension = 'pstats' if active.profiler is not None else 'collapsed'
+        name = f"{stamp}-{os.getpid()}-{threading.get_ident()}-{slug}-{elapsed * 1000:.0f}ms.{extension}"
+        path = os.path.join(self.directory, name)
+
+        if active.profiler is not None:
+            pstats.Stats(active.profiler).dump_stats(path)
+        else:
+            active.sampler.write(path)
+        self._rotate()
+        return path
+
+    def _rotate(self):
+        """Delete the oldest profiles beyond the keep limit"""
+        with self._lock:
+            try:
+                entries = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                           if name.endswith(('.pstats', '.collapsed'))]
+                entries.sort(key=os.path.getmtime)
+            except OSError:
+                return
+            for path in entries[:max(len(entries) - self.keep, 0)]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+# Create global instance
+request_profiler = RequestProfiler()
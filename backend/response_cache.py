@@ -0,0 +1,78 @@
+import os
+import gzip
+import time
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+from logging_setup import configure_logging
+
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this are sent uncompressed; gzip would barely shrink them
+GZIP_MIN_SIZE = 1024
+
+class PreparedResponse:
+    """A response body encoded once, with a gzipped copy for larger bodies"""
+
+    __slots__ = ("body", "gzipped")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        # mtime=0 keeps the gzip bytes identical across workers and restarts
+        self.gzipped = gzip.compress(body, compresslevel=6, mtime=0) if len(body) >= GZIP_MIN_SIZE else None
+
+class MenuResponseCache:
+    """The show_menu response, reused for a few seconds
+
+    Entries expire after MENU_CACHE_TTL seconds (default: 5). The only
+    version available is the published menu index's, which replaces an
+    entry as soon as it changes; without an index (MENU_INDEX_DIR unset)
+    the cache is TTL-only, so datastore edits take up to MENU_CACHE_TTL to
+    show. Concurrent misses wait for a single load.
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl if ttl is not None else float(os.environ.get('MENU_CACHE_TTL', 5))
+        self._entry: Optional[PreparedResponse] = None
+        self._version: Optional[str] = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def _fresh(self, version: Optional[str]) -> Optional[PreparedResponse]:
+        entry = self._entry
+        if entry is None:
+            return None
+        if version != self._version or time.monotonic() >= self._expires:
+            return None
+        return entry
+
+    def get(self, version: Optional[str], load: Callable[[], List[Dict[str, Any]]],
+            encode: Callable[[List[Dict[str, Any]]], bytes]) -> Tuple[Optional[PreparedResponse], bool]:
+        """Return (prepared response, served from cache); None if the menu is empty
+
+        Errors from load propagate and leave the cache unchanged.
+        """
+        entry = self._fresh(version)
+        if entry is not None:
+            return entry, True
+        with self._lock:
+            entry = self._fresh(version)
+            if entry is not None:
+                return entry, True
+            menu_docs = load()
+            if not menu_docs:
+                # Not cached, so a newly seeded menu shows up straight away
+                return None, False
+            entry = PreparedResponse(encode(menu_docs))
+            self._entry, self._version = entry, version
+            self._expires = time.monotonic() + self.ttl
+            logger.info("Cached menu response (%d items, %d bytes, version %s)",
+                        len(menu_docs), len(entry.body), version or 'unversioned')
+            return entry, False
+
+    def clear(self):
+        with self._lock:
+            self._entry = self._version = None
@@ -5,15 +5,29 @@ Run this script after setting up Firebase to populate your database with sample
 
 Usage:
     python seed_data.py
+    python seed_data.py --build-index [DIRECTORY]
+    python seed_data.py --synthetic 100000
+    python seed_data.py --verify --sample 50
+    python seed_data.py --clean --yes
 """
 
+import os
 import sys
+import json
+import time
+import random
 import logging
-from datetime import datetime
-from firebase_client import firebase_client, db
+import argparse
+import itertools
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from firebase_client import firebase_client
+from menu_index import write_menu_index
+from logging_setup import configure_logging
 
 # Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Sample menu data
@@ -281,6 +295,48 @@ SAMPLE_USERS = [
     }
 ]
 
+# Words combined with MENU_DATA names to build larger synthetic menus
+SYNTHETIC_MODIFIERS = [
+    "Spicy", "Grilled", "Crispy", "Smoked", "Classic", "Double", "Mini", "Family",
+    "Tandoori", "Peri Peri", "Garlic", "Cheesy", "Honey", "Lemon", "Masala", "BBQ",
+    "Zinger", "Special", "Deluxe", "Supreme", "Fiery", "Herb", "Creamy", "Royal"
+]
+
+def generate_synthetic_menu(count: int, seed: int = 42) -> list:
+    """Build a menu of `count` items in the MENU_DATA schema
+
+    The real MENU_DATA items come first; the rest are modifier variants of
+    them ("Spicy Chicken Pizza", "Double Garlic Beef Burger", ...) with
+    jittered prices. The same count and seed always give the same menu.
+    """
+    rng = random.Random(seed)
+    items = [dict(item) for item in MENU_DATA[:count]]
+    names = {item["name"] for item in items}
+
+    depth = 1
+    while len(items) < count:
+        added = False
+        for base in MENU_DATA:
+            if len(items) >= count:
+                break
+            modifiers = rng.sample(SYNTHETIC_MODIFIERS, depth)
+            name = " ".join(modifiers + [base["name"]])
+            if name in names:
+                continue
+            names.add(name)
+            added = True
+            item = dict(base)
+            item["item_id"] = f"{base['item_id']}_syn{len(items):05d}"
+            item["name"] = name
+            item["price"] = max(50, int(base["price"] * rng.uniform(0.8, 1.6)) // 10 * 10)
+            item["description"] = f"{' '.join(modifiers).lower()} take on our {base['name'].lower()}"
+            item["spicy"] = base["spicy"] or "Spicy" in modifiers or "Fiery" in modifiers
+            items.append(item)
+        if not added:
+            # This depth is exhausted (or unlucky); use longer names
+            depth += 1
+    return items
+
 def seed_menu_data():
     """Seed menu collection with sample data"""
     logger.info("Starting to seed menu data...")
@@ -290,46 +346,79 @@ def seed_menu_data():
         return False
     
     try:
-        menu_collection = db.collection('menus')
-        
         # Clear existing menu data (optional)
         # Uncomment the following lines if you want to clear existing data
         # logger.info("Clearing existing menu data...")
-        # docs = menu_collection.stream()
-        # for doc in docs:
-        #     doc.reference.delete()
+        # ids = [doc['doc_id'] for doc in firebase_client.iter_documents('menus', fields=['item_id'], page_size=500)]
+        # firebase_client.delete_documents('menus', ids)
+        
+        # Check which items already exist in one round trip
+        existing = firebase_client.get_documents('menus', [item['item_id'] for item in MENU_DATA], fields=['item_id'])
+        existing_ids = {item['item_id'] for item, doc in zip(MENU_DATA, existing) if doc is not None}
+        
+        # Update existing items and add new ones, each in one bulk write
+        now = datetime.utcnow()
+        updates = {item['item_id']: {**item, 'updated_at': now} for item in MENU_DATA if item['item_id'] in existing_ids}
+        new_items = [{**item, 'created_at': now, 'updated_at': now} for item in MENU_DATA if item['item_id'] not in existing_ids]
+        logger.info(f"Updating {len(updates)} existing menu items, adding {len(new_items)}")
+        
+        failed = {}
+        if updates:
+            failed.update(firebase_client.update_documents('menus', updates)['failed'])
+        if new_items:
+            failed.update(firebase_client.add_documents('menus', new_items, id_field='item_id')['failed'])
+        for item_id, error in failed.items():
+            logger.error(f"Error adding menu item {item_id}: {error}")
+        
+        logger.info(f"Successfully processed {len(MENU_DATA) - len(failed)} menu items")
+        
+        # Keep the shared menu index in step with the seeded menu
+        if os.environ.get('MENU_INDEX_DIR'):
+            build_menu_index()
+        return True
         
-        # Add new menu items
-        added_count = 0
-        for item in MENU_DATA:
-            try:
-                # Check if item already exists
-                existing = menu_collection.document(item['item_id']).get()
-                
-                if existing.exists:
-                    logger.info(f"Menu item {item['name']} already exists, updating...")
-                    menu_collection.document(item['item_id']).update({
-                        **item,
-                        'updated_at': datetime.utcnow()
-                    })
-                else:
-                    logger.info(f"Adding menu item: {item['name']}")
-                    menu_collection.document(item['item_id']).set({
-                        **item,
-                        'created_at': datetime.utcnow(),
-                        'updated_at': datetime.utcnow()
-                    })
-                
-                added_count += 1
-                
-            except Exception as e:
-                logger.error(f"Error adding menu item {item['name']}: {e}")
+    except Exception as e:
+        logger.error(f"Error seeding menu data: {e}")
+        return False
+
+def build_menu_index(directory=None):
+    """Publish the menu as a memory-mapped index shared by all backend workers"""
+    directory = directory or os.environ.get('MENU_INDEX_DIR', 'menu_index')
+    logger.info(f"Building shared menu index in {directory}...")
+    
+    if not firebase_client.is_connected():
+        logger.error("Firebase not connected. Cannot build menu index.")
+        return False
+    
+    try:
+        menu_items = [doc.to_dict() for doc in firebase_client.db.collection('menus').stream()]
+        if not menu_items:
+            logger.error("No menu items found. Seed the menu first.")
+            return False
         
-        logger.info(f"Successfully processed {added_count} menu items")
+        path = write_menu_index(menu_items, directory)
+        logger.info(f"Menu index published: {path}")
         return True
         
     except Exception as e:
-        logger.error(f"Error seeding menu data: {e}")
+        logger.error(f"Error building menu index: {e}")
+        return False
+
+def seed_local_storage():
+    """Seed the menu into the configured non-Firestore backend (STORAGE_BACKEND=sqlite)"""
+    from storage import storage
+    
+    if storage.name == 'firestore':
+        logger.error("STORAGE_BACKEND is firestore; use the interactive seeder instead.")
+        return False
+    
+    try:
+        for item in MENU_DATA:
+            storage.save_menu_item(item['item_id'], item)
+        logger.info(f"Seeded {len(MENU_DATA)} menu items into {storage.name} storage")
+        return True
+    except Exception as e:
+        logger.error(f"Error seeding {storage.name} storage: {e}")
         return False
 
 def seed_user_data():
@@ -341,23 +430,21 @@ def seed_user_data():
         return False
     
     try:
-        users_collection = db.collection('users')
+        # Check which users already exist in one round trip
+        existing = firebase_client.get_documents('users', [user['user_id'] for user in SAMPLE_USERS], fields=['user_id'])
+        existing_ids = {user['user_id'] for user, doc in zip(SAMPLE_USERS, existing) if doc is not None}
         
-        added_count = 0
+        new_users = [user for user in SAMPLE_USERS if user['user_id'] not in existing_ids]
         for user in SAMPLE_USERS:
-            try:
-                # Check if user already exists
-                existing = users_collection.document(user['user_id']).get()
-                
-                if not existing.exists:
-                    logger.info(f"Adding user: {user['name']}")
-                    users_collection.document(user['user_id']).set(user)
-                    added_count += 1
-                else:
-                    logger.info(f"User {user['name']} already exists, skipping...")
-                
-            except Exception as e:
-                logger.error(f"Error adding user {user['name']}: {e}")
+            if user['user_id'] in existing_ids:
+                logger.info(f"User {user['name']} already exists, skipping...")
+        
+        added_count = 0
+        if new_users:
+            result = firebase_client.add_documents('users', new_users, id_field='user_id')
+            for user_id, error in result['failed'].items():
+                logger.error(f"Error adding user {user_id}: {error}")
+            added_count = len(result['succeeded'])
         
         logger.info(f"Successfully processed {added_count} users")
         return True
@@ -412,7 +499,7 @@ def create_sample_order():
         }
         
         # Save order
-        db.collection('orders').document(order_id).set(sample_order)
+        firebase_client.db.collection('orders').document(order_id).set(sample_order)
         
         # Create sample chat log
         chat_log = {
@@ -424,7 +511,7 @@ def create_sample_order():
             "extracted_items": ["Chicken Pizza", "Coke"]
         }
         
-        db.collection('chat_logs').add(chat_log)
+        firebase_client.db.collection('chat_logs').add(chat_log)
         
         # System response
         system_response = {
@@ -434,7 +521,7 @@ def create_sample_order():
             "timestamp": datetime.utcnow()
         }
         
-        db.collection('chat_logs').add(system_response)
+        firebase_client.db.collection('chat_logs').add(system_response)
         
         logger.info(f"Sample order created with ID: {order_id}")
         return True
@@ -443,8 +530,192 @@ def create_sample_order():
         logger.error(f"Error creating sample order: {e}")
         return False
 
-def verify_data():
-    """Verify that data was seeded correctly"""
+SYNTHETIC_FIRST_NAMES = ["Ahmed", "Fatima", "Ali", "Ayesha", "Hassan", "Zainab", "Bilal", "Sana",
+                         "Usman", "Hira", "Omar", "Maryam", "Imran", "Nadia", "Saad", "Amna"]
+SYNTHETIC_LAST_NAMES = ["Ali", "Khan", "Ahmed", "Malik", "Hussain", "Sheikh", "Qureshi", "Raza", "Butt", "Chaudhry"]
+SYNTHETIC_STATUSES = (["Delivered"] * 70 + ["Cancelled"] * 8 + ["Ready"] * 5 + ["Preparing"] * 5
+                      + ["Confirmed"] * 5 + ["Pending"] * 7)
+
+def generate_synthetic_users(count: int, seed: int = 42) -> list:
+    """Build `count` users in the SAMPLE_USERS schema"""
+    rng = random.Random(seed)
+    users = []
+    for i in range(count):
+        first, last = rng.choice(SYNTHETIC_FIRST_NAMES), rng.choice(SYNTHETIC_LAST_NAMES)
+        users.append({
+            **SAMPLE_USERS[i % len(SAMPLE_USERS)],
+            "user_id": f"user_syn_{i:06d}",
+            "name": f"{first} {last}",
+            "phone": f"+92-3{rng.randint(0, 49):02d}-{rng.randint(0, 9999999):07d}",
+            "email": f"{first.lower()}.{last.lower()}{i}@example.com",
+            "created_at": datetime.utcnow() - timedelta(days=rng.randint(0, 365)),
+            "favorite_items": []
+        })
+    return users
+
+def generate_synthetic_orders(count: int, menu: list, users: list, seed: int = 42, days: int = 90):
+    """Yield (order_id, order, chat_logs) for `count` historic orders spread over `days`
+
+    Orders follow the schema app.py writes, each with the user message and
+    system confirmation chat logs. Generated lazily so any count fits in memory.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    for _ in range(count):
+        created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+        order_id = f"ORD_{created_at.strftime('%Y%m%d_%H%M%S')}_{rng.getrandbits(24):06x}"
+        user = rng.choice(users)
+        
+        items = []
+        for item in rng.sample(menu, min(len(menu), rng.choice([1, 1, 1, 2, 2, 3, 4]))):
+            quantity = rng.choice([1, 1, 1, 2, 2, 3])
+            items.append({
+                "item_id": item['item_id'],
+                "name": item['name'],
+                "quantity": quantity,
+                "unit_price": item['price'],
+                "total_price": item['price'] * quantity
+            })
+        total_price = sum(item['total_price'] for item in items)
+        message = "I want " + " and ".join(f"{item['quantity']} {item['name'].lower()}" for item in items)
+        status = rng.choice(SYNTHETIC_STATUSES)
+        
+        order = {
+            "order_id": order_id,
+            "user": {"name": user['name'], "phone": user['phone'], "email": user['email']},
+            "items": items,
+            "total_price": total_price,
+            "status": status,
+            "original_message": message,
+            "created_at": created_at,
+            "updated_at": created_at if status == "Pending" else created_at + timedelta(minutes=rng.randint(5, 90))
+        }
+        items_summary = ', '.join(f"{item['quantity']}x {item['name']}" for item in items)
+        chat_logs = [
+            {
+                "order_id": order_id,
+                "sender": "user",
+                "message": message,
+                "timestamp": created_at,
+                "parsed_intent": "order_food",
+                "extracted_items": [item['name'] for item in items]
+            },
+            {
+                "order_id": order_id,
+                "sender": "system",
+                "message": f"Order confirmed! Your order ID is {order_id}. Total: ${total_price}. Items: {items_summary}",
+                "timestamp": created_at + timedelta(seconds=1)
+            }
+        ]
+        yield order_id, order, chat_logs
+
+def seed_synthetic_data(orders: int, menu_items: int = None, users: int = None, seed: int = 42,
+                        chunk_size: int = 5000, ops_per_second: int = 500):
+    """Seed a load-test sized dataset: a synthetic menu, users and historic orders with chat logs
+
+    Runs are repeatable: the same arguments regenerate the same document ids,
+    so re-running overwrites rather than duplicates. Writes start at
+    ops_per_second and ramp up 50% every 5 minutes, as Firestore requires
+    for new collections; raise it for the emulator.
+    """
+    menu_items = menu_items or max(len(MENU_DATA), min(1000, orders // 100))
+    users = users or max(len(SAMPLE_USERS), min(100000, orders // 10))
+    logger.info(f"Seeding synthetic data: {menu_items} menu items, {users} users, {orders} orders...")
+    
+    if not firebase_client.is_connected():
+        logger.error("Firebase not connected. Cannot seed data.")
+        return False
+    
+    try:
+        start = time.monotonic()
+        failed = 0
+        # One bulk session for the whole run, so the write rate keeps ramping
+        # up across chunks instead of restarting at ops_per_second each time
+        session = firebase_client.bulk_session(initial_ops_per_second=ops_per_second)
+        try:
+            menu = generate_synthetic_menu(menu_items, seed=seed)
+            now = datetime.utcnow()
+            failed += len(firebase_client.add_documents(
+                'menus', [{**item, 'created_at': now, 'updated_at': now} for item in menu], id_field='item_id',
+                session=session
+            )['failed'])
+            
+            user_docs = generate_synthetic_users(users, seed=seed)
+            for i in range(0, len(user_docs), chunk_size):
+                failed += len(firebase_client.add_documents(
+                    'users', user_docs[i:i + chunk_size], id_field='user_id', session=session
+                )['failed'])
+            logger.info(f"Seeded menu and users in {time.monotonic() - start:.1f}s")
+            
+            # Write orders and their chat logs chunk by chunk to bound memory
+            written = 0
+            generator = generate_synthetic_orders(orders, menu, user_docs, seed=seed)
+            while written < orders:
+                chunk = list(itertools.islice(generator, chunk_size))
+                if not chunk:
+                    break
+                chat_logs, chat_ids = [], []
+                for order_id, _, logs in chunk:
+                    for n, entry in enumerate(logs):
+                        chat_logs.append(entry)
+                        chat_ids.append(f"{order_id}_{n}")
+                failed += len(firebase_client.add_documents(
+                    'orders', [order for _, order, _ in chunk], id_field='order_id', session=session
+                )['failed'])
+                failed += len(firebase_client.add_documents(
+                    'chat_logs', chat_logs, document_ids=chat_ids, session=session
+                )['failed'])
+                
+                written += len(chunk)
+                elapsed = time.monotonic() - start
+                logger.info(f"Seeded {written}/{orders} orders ({written / elapsed:.0f} orders/s)")
+        finally:
+            session.close()
+        
+        if failed:
+            logger.error(f"{failed} documents failed to write")
+        logger.info(f"Synthetic seeding finished in {time.monotonic() - start:.1f}s")
+        
+        if os.environ.get('MENU_INDEX_DIR'):
+            build_menu_index()
+        return failed == 0
+        
+    except Exception as e:
+        logger.error(f"Error seeding synthetic data: {e}")
+        return False
+
+# Required fields and their types, for spot checks of seeded and app-written documents
+DOCUMENT_SCHEMAS = {
+    'menus': {'item_id': str, 'name': str, 'category': str, 'price': (int, float), 'available': bool},
+    'users': {'user_id': str, 'name': str, 'created_at': datetime},
+    'orders': {'order_id': str, 'items': list, 'total_price': (int, float), 'status': str,
+               'created_at': datetime},
+    'chat_logs': {'order_id': str, 'sender': str, 'message': str, 'timestamp': datetime},
+}
+
+# Fields spread evenly across each collection, for random sampling (None: by document id)
+SAMPLE_FIELDS = {'menus': 'price', 'users': 'created_at', 'orders': 'created_at', 'chat_logs': 'timestamp'}
+
+def check_schema(collection_name: str, doc: dict) -> list:
+    """Describe every missing or mistyped required field of a document"""
+    problems = []
+    for field, expected in DOCUMENT_SCHEMAS.get(collection_name, {}).items():
+        if field not in doc:
+            problems.append(f"missing '{field}'")
+        elif isinstance(doc[field], bool) and expected != bool:
+            problems.append(f"'{field}' is bool")
+        elif not isinstance(doc[field], expected):
+            problems.append(f"'{field}' is {type(doc[field]).__name__}")
+    return problems
+
+def verify_data(sample: int = 0):
+    """Verify that data was seeded correctly
+    
+    Counts come from aggregation queries, so this costs a few reads
+    however large the collections are. With sample > 0, that many
+    random documents per collection are also checked against
+    DOCUMENT_SCHEMAS.
+    """
     logger.info("Verifying seeded data...")
     
     if not firebase_client.is_connected():
@@ -453,33 +724,45 @@ def verify_data():
     
     try:
         # Check menu items
-        menu_docs = list(db.collection('menus').stream())
-        menu_count = len(menu_docs)
+        menu_count = firebase_client.aggregate('menus')['count']
         logger.info(f"Found {menu_count} menu items in database")
         
         # Check categories
-        categories = set()
-        for doc in menu_docs:
-            data = doc.to_dict()
-            categories.add(data.get('category', 'Unknown'))
-        
-        logger.info(f"Menu categories: {', '.join(sorted(categories))}")
+        categories = firebase_client.distinct_values('menus', 'category')
+        logger.info(f"Menu categories: {', '.join(str(category) for category in categories)}")
         
         # Check users
-        user_docs = list(db.collection('users').stream())
-        user_count = len(user_docs)
+        user_count = firebase_client.aggregate('users')['count']
         logger.info(f"Found {user_count} users in database")
         
         # Check orders
-        order_docs = list(db.collection('orders').stream())
-        order_count = len(order_docs)
-        logger.info(f"Found {order_count} orders in database")
+        orders = firebase_client.aggregate('orders', sum_fields=['total_price'])
+        logger.info(f"Found {orders['count']} orders in database "
+                    f"(total value: ${orders['sum'].get('total_price') or 0:,})")
+        for status in firebase_client.distinct_values('orders', 'status'):
+            count = firebase_client.aggregate('orders', filters=[('status', '==', status)])['count']
+            logger.info(f"  {status}: {count}")
         
         # Check chat logs
-        chat_docs = list(db.collection('chat_logs').stream())
-        chat_count = len(chat_docs)
+        chat_count = firebase_client.aggregate('chat_logs')['count']
         logger.info(f"Found {chat_count} chat log entries in database")
         
+        valid = True
+        if sample > 0:
+            for collection_name in DOCUMENT_SCHEMAS:
+                docs = firebase_client.sample_documents(collection_name, sample, field=SAMPLE_FIELDS[collection_name])
+                bad = 0
+                for doc in docs:
+                    problems = check_schema(collection_name, doc)
+                    if problems:
+                        bad += 1
+                        logger.error(f"{collection_name}/{doc['doc_id']}: {', '.join(problems)}")
+                logger.info(f"Spot-checked {len(docs)} {collection_name} documents: {bad} invalid")
+                valid = valid and bad == 0
+        
+        if not valid:
+            logger.error("Data verification found invalid documents")
+            return False
         logger.info("Data verification completed successfully!")
         return True
         
@@ -487,8 +770,12 @@ def verify_data():
         logger.error(f"Error verifying data: {e}")
         return False
 
-def display_menu_summary():
-    """Display a summary of menu items by category"""
+def display_menu_summary(items_per_category: int = 20):
+    """Display a summary of menu items by category
+    
+    Per-category counts and prices come from aggregation queries; only the
+    first items_per_category items of each category (by name) are read.
+    """
     logger.info("Generating menu summary...")
     
     if not firebase_client.is_connected():
@@ -496,84 +783,124 @@ def display_menu_summary():
         return
     
     try:
-        menu_docs = db.collection('menus').order_by('category').order_by('name').stream()
-        
-        current_category = None
         print("\n" + "="*60)
         print("MENU SUMMARY")
         print("="*60)
         
-        for doc in menu_docs:
-            item = doc.to_dict()
-            category = item.get('category', 'Unknown')
-            
-            if category != current_category:
-                current_category = category
-                print(f"\n{category.upper()}:")
-                print("-" * 30)
+        for category in firebase_client.distinct_values('menus', 'category'):
+            filters = [('category', '==', category)]
+            stats = firebase_client.aggregate('menus', filters=filters, avg_fields=['price'])
+            available_count = firebase_client.aggregate('menus', filters=filters + [('available', '==', True)])['count']
+            average = stats['avg'].get('price')
             
-            price = item.get('price', 0)
-            name = item.get('name', 'Unknown')
-            desc = item.get('description', 'No description')
-            available = "✅" if item.get('available', False) else "❌"
-            vegetarian = "🥬" if item.get('vegetarian', False) else "🥩"
-            spicy = "🌶️" if item.get('spicy', False) else ""
+            print(f"\n{str(category).upper()}: {stats['count']} items, {available_count} available"
+                  + (f", avg ${average:.0f}" if average is not None else ""))
+            print("-" * 30)
             
-            print(f"{available} {vegetarian} {name} - ${price} {spicy}")
-            print(f"   {desc}")
+            items = firebase_client.iter_documents('menus', filters=filters, order_by='name',
+                                                   limit=items_per_category)
+            for item in items:
+                price = item.get('price', 0)
+                name = item.get('name', 'Unknown')
+                desc = item.get('description', 'No description')
+                available = "✅" if item.get('available', False) else "❌"
+                vegetarian = "🥬" if item.get('vegetarian', False) else "🥩"
+                spicy = "🌶️" if item.get('spicy', False) else ""
+                
+                print(f"{available} {vegetarian} {name} - ${price} {spicy}")
+                print(f"   {desc}")
+                
+                sizes = item.get('size_available', [])
+                if sizes:
+                    print(f"   Sizes: {', '.join(sizes)}")
+                print()
             
-            sizes = item.get('size_available', [])
-            if sizes:
-                print(f"   Sizes: {', '.join(sizes)}")
-            print()
+            if stats['count'] > items_per_category:
+                print(f"   ... and {stats['count'] - items_per_category} more")
         
         print("="*60)
         
     except Exception as e:
         logger.error(f"Error displaying menu summary: {e}")
 
-def clean_database():
-    """Clean all data from database (use with caution!)"""
+CLEAN_COLLECTIONS = ['menus', 'orders', 'chat_logs', 'users', 'idempotency_keys']
+CLEAN_CHECKPOINT = '.clean_database.json'
+
+def clean_database(confirm: bool = True, collections: list = None, page_size: int = 1000,
+                   checkpoint_path: str = CLEAN_CHECKPOINT, ops_per_second: int = 500):
+    """Clean all data from database (use with caution!)
+    
+    Collections are purged in parallel, one worker each, paging through
+    document ids. The last deleted id of every collection is saved to
+    checkpoint_path after each page, so an interrupted run picks up where
+    it stopped; the file is removed once everything is gone.
+    """
     logger.warning("WARNING: This will delete ALL data from the database!")
     
-    confirmation = input("Type 'DELETE ALL DATA' to confirm: ")
-    if confirmation != "DELETE ALL DATA":
-        logger.info("Operation cancelled.")
-        return
+    if confirm:
+        confirmation = input("Type 'DELETE ALL DATA' to confirm: ")
+        if confirmation != "DELETE ALL DATA":
+            logger.info("Operation cancelled.")
+            return False
     
     if not firebase_client.is_connected():
         logger.error("Firebase not connected. Cannot clean database.")
-        return
+        return False
+    
+    collections = collections or CLEAN_COLLECTIONS
+    checkpoint = {}
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        logger.info(f"Resuming from checkpoint {checkpoint_path}")
+    lock = threading.Lock()
+    start = time.monotonic()
+    
+    def save_checkpoint(collection_name, last_id):
+        with lock:
+            checkpoint[collection_name] = last_id
+            with open(checkpoint_path + '.tmp', 'w') as f:
+                json.dump(checkpoint, f)
+            os.replace(checkpoint_path + '.tmp', checkpoint_path)
+    
+    def purge(collection_name):
+        logger.info(f"Deleting all documents from {collection_name}...")
+        
+        def on_page(last_id, deleted, failed):
+            save_checkpoint(collection_name, last_id)
+            elapsed = time.monotonic() - start
+            logger.info(f"{collection_name}: deleted {deleted} documents ({deleted / elapsed:.0f} docs/s)"
+                        + (f", {failed} failed" if failed else ""))
+        
+        result = firebase_client.purge_collection(collection_name, page_size=page_size,
+                                                  start_after=checkpoint.get(collection_name),
+                                                  on_page=on_page, initial_ops_per_second=ops_per_second)
+        logger.info(f"Deleted {result['deleted']} documents from {collection_name}")
+        return result
     
     try:
-        collections = ['menus', 'orders', 'chat_logs', 'users']
-        
-        for collection_name in collections:
-            logger.info(f"Deleting all documents from {collection_name}...")
-            
-            docs = db.collection(collection_name).stream()
-            batch = db.batch()
-            count = 0
-            
-            for doc in docs:
-                batch.delete(doc.reference)
-                count += 1
-                
-                # Commit in batches of 500 (Firestore limit)
-                if count % 500 == 0:
-                    batch.commit()
-                    batch = db.batch()
-            
-            # Commit remaining deletions
-            if count % 500 != 0:
-                batch.commit()
-            
-            logger.info(f"Deleted {count} documents from {collection_name}")
-        
-        logger.info("Database cleaned successfully!")
-        
+        with ThreadPoolExecutor(max_workers=len(collections)) as pool:
+            results = list(pool.map(purge, collections))
     except Exception as e:
         logger.error(f"Error cleaning database: {e}")
+        logger.error(f"Run again to resume from {checkpoint_path}")
+        return False
+    
+    deleted = sum(result['deleted'] for result in results)
+    failed = sum(result['failed'] for result in results)
+    elapsed = time.monotonic() - start
+    logger.info(f"Deleted {deleted} documents in {elapsed:.1f}s ({deleted / max(elapsed, 1e-9):.0f} docs/s)")
+    if failed:
+        # Failed documents sit behind the checkpoint, so start the next run from the beginning
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        logger.error(f"{failed} documents could not be deleted; run again to retry them")
+        return False
+    
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    logger.info("Database cleaned successfully!")
+    return True
 
 def main():
     """Main function to run seeding operations"""
@@ -601,9 +928,10 @@ def main():
         print("5. Display menu summary")
         print("6. Seed all data (1+2+3)")
         print("7. Clean database (⚠️  DANGER)")
+        print("8. Build shared menu index")
         print("0. Exit")
         
-        choice = input("\nEnter your choice (0-7): ").strip()
+        choice = input("\nEnter your choice (0-8): ").strip()
         
         if choice == "1":
             success = seed_menu_data()
@@ -641,6 +969,10 @@ def main():
         elif choice == "7":
             clean_database()
         
+        elif choice == "8":
+            success = build_menu_index()
+            print("✅ Menu index published!" if success else "❌ Failed to build menu index")
+        
         elif choice == "0":
             logger.info("Goodbye!")
             break
@@ -649,4 +981,40 @@ def main():
             print("Invalid choice. Please try again.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed the restaurant database (interactive without options)")
+    parser.add_argument("--build-index", nargs="?", const="", metavar="DIR",
+                        help="Publish the shared menu index (default: MENU_INDEX_DIR)")
+    parser.add_argument("--local", action="store_true",
+                        help="Seed the menu into the STORAGE_BACKEND=sqlite/memory backend")
+    parser.add_argument("--synthetic", type=int, metavar="N",
+                        help="Seed a synthetic dataset with N historic orders")
+    parser.add_argument("--menu-items", type=int, help="Synthetic menu size (default: scales with N)")
+    parser.add_argument("--users", type=int, help="Synthetic user count (default: scales with N)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for synthetic data")
+    parser.add_argument("--clean", nargs="*", metavar="COLLECTION",
+                        help="Delete all documents (default: every seeded collection); resumes if interrupted")
+    parser.add_argument("--yes", action="store_true", help="Confirm --clean without prompting")
+    parser.add_argument("--verify", action="store_true", help="Print document counts from aggregation queries")
+    parser.add_argument("--sample", type=int, default=0, metavar="N",
+                        help="With --verify, also check N random documents per collection against the schema")
+    parser.add_argument("--ops-per-second", type=int, default=500,
+                        help="Initial write rate for synthetic seeding and cleaning (ramps up 50%% every 5 minutes)")
+    args = parser.parse_args()
+    
+    if args.build_index is not None:
+        # Non-interactive refresh, e.g. from a deploy hook or cron
+        sys.exit(0 if build_menu_index(args.build_index or None) else 1)
+    if args.local:
+        # Single-site deployments without Firebase (STORAGE_BACKEND=sqlite)
+        sys.exit(0 if seed_local_storage() else 1)
+    if args.synthetic is not None:
+        sys.exit(0 if seed_synthetic_data(args.synthetic, args.menu_items, args.users, args.seed,
+                                          ops_per_second=args.ops_per_second) else 1)
+    if args.verify:
+        sys.exit(0 if verify_data(sample=args.sample) else 1)
+    if args.clean is not None:
+        if not args.yes:
+            parser.error("--clean deletes ALL data; add --yes to confirm")
+        sys.exit(0 if clean_database(confirm=False, collections=args.clean or None,
+                                     ops_per_second=args.ops_per_second) else 1)
     main()
\ No newline at end of file
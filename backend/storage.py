@@ -0,0 +1,351 @@
+import os
+import json
+import sqlite3
+import logging
+import datetime
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional
+
+from firestore_memory import InMemoryFirestore
+from logging_setup import configure_logging
+
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+class Storage(ABC):
+    """Datastore operations used by the API, independent of the backend
+
+    Documents are plain dicts; reads add the document id as 'doc_id'.
+    Backends implement every abstract method, or cannot be created.
+    """
+
+    name = "base"
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def ping(self):
+        """Raise if the datastore cannot be reached"""
+
+    @abstractmethod
+    def list_menu(self, category: Optional[str] = None, available_only: bool = True) -> List[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def save_menu_item(self, item_id: str, item: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def create_order(self, order_id: str, order: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def get_order(self, order_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def list_orders(self, limit: int = 50, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Most recent orders first"""
+
+    @abstractmethod
+    def update_order(self, order_id: str, fields: Dict[str, Any]) -> bool:
+        """Update fields of an order; returns False if it does not exist"""
+
+    @abstractmethod
+    def add_chat_log(self, entry: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def get_chat_logs(self, order_id: str) -> List[Dict[str, Any]]:
+        """Chat entries for an order, oldest first"""
+
+    @abstractmethod
+    def claim_idempotency_key(self, key: str, marker: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Store marker under key unless one exists; returns the existing marker, or None once stored"""
+
+    @abstractmethod
+    def complete_idempotency_key(self, key: str, fields: Dict[str, Any]):
+        """Merge fields (the stored response) into a claimed marker"""
+
+    @abstractmethod
+    def release_idempotency_key(self, key: str):
+        ...
+
+def _with_id(doc) -> Dict[str, Any]:
+    data = doc.to_dict()
+    data['doc_id'] = doc.id
+    return data
+
+class FirestoreStorage(Storage):
+    """Storage on a Firestore client (or the in-memory Firestore stand-in)
+
+    Given a FirebaseClient rather than a db, the per-process client is
+    looked up on every call, so it connects lazily and survives forks.
+    """
+
+    name = "firestore"
+
+    def __init__(self, db=None, client=None):
+        self._db = db
+        self._client = client
+
+    @property
+    def db(self):
+        return self._client.db if self._client is not None else self._db
+
+    @property
+    def available(self) -> bool:
+        return self.db is not None
+
+    def ping(self):
+        self.db.collection('menus').limit(1).get()
+
+    def list_menu(self, category: Optional[str] = None, available_only: bool = True) -> List[Dict[str, Any]]:
+        query = self.db.collection('menus')
+        if category is not None:
+            query = query.where('category', '==', category)
+        if available_only:
+            query = query.where('available', '==', True)
+        return [_with_id(doc) for doc in query.stream()]
+
+    def save_menu_item(self, item_id: str, item: Dict[str, Any]):
+        self.db.collection('menus').document(item_id).set(item)
+
+    def create_order(self, order_id: str, order: Dict[str, Any]):
+        self.db.collection('orders').document(order_id).set(order)
+
+    def get_order(self, order_id: str) -> Optional[Dict[str, Any]]:
+        doc = self.db.collection('orders').document(order_id).get()
+        return _with_id(doc) if doc.exists else None
+
+    def list_orders(self, limit: int = 50, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = self.db.collection('orders').order_by('created_at', direction='DESCENDING').limit(limit)
+        if status:
+            query = query.where('status', '==', status)
+        return [_with_id(doc) for doc in query.stream()]
+
+    def update_order(self, order_id: str, fields: Dict[str, Any]) -> bool:
+        try:
+            self.db.collection('orders').document(order_id).update(fields)
+        except Exception as e:
+            # google.api_core's NotFound, or the stand-in's; matched by name so
+            # the Google SDK is not imported just for the exception class
+            if type(e).__name__ == 'NotFound':
+                return False
+            raise
+        return True
+
+    def add_chat_log(self, entry: Dict[str, Any]):
+        self.db.collection('chat_logs').add(entry)
+
+    def get_chat_logs(self, order_id: str) -> List[Dict[str, Any]]:
+        query = self.db.collection('chat_logs').where('order_id', '==', order_id).order_by('timestamp')
+        return [_with_id(doc) for doc in query.stream()]
+
+    def claim_idempotency_key(self, key: str, marker: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        reference = self.db.collection('idempotency_keys').document(key)
+        # create() fails if the document exists, so exactly one worker claims a key
+        for _ in range(3):
+            try:
+                reference.create(marker)
+                return None
+            except Exception as e:
+                if type(e).__name__ != 'AlreadyExists':
+                    raise
+            doc = reference.get()
+            if doc.exists:
+                return doc.to_dict()
+            # Released between the two calls; try to claim it again
+        return {}
+
+    def complete_idempotency_key(self, key: str, fields: Dict[str, Any]):
+        self.db.collection('idempotency_keys').document(key).set(fields, merge=True)
+
+    def release_idempotency_key(self, key: str):
+        self.db.collection('idempotency_keys').document(key).delete()
+
+class MemoryStorage(FirestoreStorage):
+    """Process-local storage for tests, benchmarks and demos; nothing persists"""
+
+    name = "memory"
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        super().__init__(InMemoryFirestore(latency=latency, jitter=jitter))
+
+def _encode(value: Any) -> str:
+    def default(obj):
+        if isinstance(obj, datetime.datetime):
+            return {"$datetime": obj.isoformat()}
+        raise TypeError(f"Cannot store {type(obj).__name__}")
+    return json.dumps(value, default=default)
+
+def _decode(text: str) -> Dict[str, Any]:
+    def hook(obj):
+        if len(obj) == 1 and "$datetime" in obj:
+            return datetime.datetime.fromisoformat(obj["$datetime"])
+        return obj
+    return json.loads(text, object_hook=hook)
+
+def _sort_key(value: Any) -> str:
+    return value.isoformat() if isinstance(value, datetime.datetime) else str(value or "")
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS menus (
+    doc_id TEXT PRIMARY KEY,
+    category TEXT,
+    available INTEGER NOT NULL DEFAULT 1,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS menus_category ON menus (category, available);
+CREATE TABLE IF NOT EXISTS orders (
+    doc_id TEXT PRIMARY KEY,
+    status TEXT,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_created ON orders (created_at);
+CREATE INDEX IF NOT EXISTS orders_status ON orders (status, created_at);
+CREATE TABLE IF NOT EXISTS chat_logs (
+    doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id TEXT,
+    timestamp TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_logs_order ON chat_logs (order_id, timestamp);
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    doc_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+class SQLiteStorage(Storage):
+    """Local persistence in one SQLite file in WAL mode, for single-site deployments
+
+    Each thread (and each forked process) opens its own connection; WAL lets
+    readers run alongside the single writer.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SQLITE_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _rows(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        results = []
+        for doc_id, data in self._connect().execute(sql, params):
+            doc = _decode(data)
+            doc['doc_id'] = str(doc_id)
+            results.append(doc)
+        return results
+
+    def ping(self):
+        self._connect().execute("SELECT 1").fetchone()
+
+    def list_menu(self, category: Optional[str] = None, available_only: bool = True) -> List[Dict[str, Any]]:
+        sql, params = "SELECT doc_id, data FROM menus WHERE 1=1", []
+        if category is not None:
+            sql += " AND category = ?"
+            params.append(category)
+        if available_only:
+            sql += " AND available = 1"
+        return self._rows(sql, tuple(params))
+
+    def save_menu_item(self, item_id: str, item: Dict[str, Any]):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO menus (doc_id, category, available, data) VALUES (?, ?, ?, ?)",
+                         (item_id, item.get('category'), 1 if item.get('available', True) else 0, _encode(item)))
+
+    def create_order(self, order_id: str, order: Dict[str, Any]):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO orders (doc_id, status, created_at, data) VALUES (?, ?, ?, ?)",
+                         (order_id, order.get('status'), _sort_key(order.get('created_at')), _encode(order)))
+
+    def get_order(self, order_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._rows("SELECT doc_id, data FROM orders WHERE doc_id = ?", (order_id,))
+        return rows[0] if rows else None
+
+    def list_orders(self, limit: int = 50, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        if status:
+            return self._rows("SELECT doc_id, data FROM orders WHERE status = ? ORDER BY created_at DESC LIMIT ?",
+                              (status, limit))
+        return self._rows("SELECT doc_id, data FROM orders ORDER BY created_at DESC LIMIT ?", (limit,))
+
+    def update_order(self, order_id: str, fields: Dict[str, Any]) -> bool:
+        with self._connect() as conn:
+            # Read-modify-write in one IMMEDIATE transaction so concurrent updates serialize
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT data FROM orders WHERE doc_id = ?", (order_id,)).fetchone()
+            if row is None:
+                return False
+            order = _decode(row[0])
+            order.update(fields)
+            conn.execute("UPDATE orders SET status = ?, data = ? WHERE doc_id = ?",
+                         (order.get('status'), _encode(order), order_id))
+        return True
+
+    def add_chat_log(self, entry: Dict[str, Any]):
+        with self._connect() as conn:
+            conn.execute("INSERT INTO chat_logs (order_id, timestamp, data) VALUES (?, ?, ?)",
+                         (entry.get('order_id'), _sort_key(entry.get('timestamp')), _encode(entry)))
+
+    def get_chat_logs(self, order_id: str) -> List[Dict[str, Any]]:
+        return self._rows("SELECT doc_id, data FROM chat_logs WHERE order_id = ? ORDER BY timestamp, doc_id",
+                          (order_id,))
+
+    def claim_idempotency_key(self, key: str, marker: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            inserted = conn.execute("INSERT OR IGNORE INTO idempotency_keys (doc_id, data) VALUES (?, ?)",
+                                    (key, _encode(marker))).rowcount
+            if inserted:
+                return None
+            row = conn.execute("SELECT data FROM idempotency_keys WHERE doc_id = ?", (key,)).fetchone()
+        return _decode(row[0]) if row else {}
+
+    def complete_idempotency_key(self, key: str, fields: Dict[str, Any]):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT data FROM idempotency_keys WHERE doc_id = ?", (key,)).fetchone()
+            marker = _decode(row[0]) if row else {}
+            marker.update(fields)
+            conn.execute("INSERT OR REPLACE INTO idempotency_keys (doc_id, data) VALUES (?, ?)",
+                         (key, _encode(marker)))
+
+    def release_idempotency_key(self, key: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM idempotency_keys WHERE doc_id = ?", (key,))
+
+def create_storage(backend: Optional[str] = None) -> Storage:
+    """Build the storage backend named by STORAGE_BACKEND (firestore, memory or sqlite)"""
+    backend = (backend or os.environ.get('STORAGE_BACKEND', 'firestore')).lower()
+
+    if backend == 'memory':
+        logger.info("Using in-memory storage (data is lost on restart)")
+        return MemoryStorage()
+    if backend == 'sqlite':
+        path = os.environ.get('SQLITE_PATH', 'smartdine.db')
+        logger.info(f"Using SQLite storage at {path}")
+        return SQLiteStorage(path)
+    if backend != 'firestore':
+        logger.warning(f"Unknown STORAGE_BACKEND '{backend}', using Firestore")
+
+    from firebase_client import firebase_client
+    return FirestoreStorage(client=firebase_client)
+
+# Create global instance
+storage = create_storage()
@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import json
+import uuid
 from datetime import datetime
 import pandas as pd
 
@@ -498,17 +499,23 @@ def render_custom_header(is_online):
     </div>
     """, unsafe_allow_html=True)
 
-def make_request(endpoint, method="GET", data=None):
+def make_request(endpoint, method="GET", data=None, headers=None):
     """Make HTTP request to backend API"""
     try:
         url = f"{BACKEND_URL}/{endpoint.lstrip('/')}"
         
+        # Identifies this browser session, so the backend only treats a repeated
+        # message as a resubmission when it comes from the same session
+        if "client_id" not in st.session_state:
+            st.session_state.client_id = uuid.uuid4().hex
+        headers = {"X-Client-ID": st.session_state.client_id, **(headers or {})}
+        
         if method == "GET":
-            response = requests.get(url, timeout=10)
+            response = requests.get(url, headers=headers, timeout=10)
         elif method == "POST":
-            response = requests.post(url, json=data, timeout=10)
+            response = requests.post(url, json=data, headers=headers, timeout=10)
         elif method == "PUT":
-            response = requests.put(url, json=data, timeout=10)
+            response = requests.put(url, json=data, headers=headers, timeout=10)
         else:
             st.error(f"Unsupported HTTP method: {method}")
             return None
@@ -576,6 +583,8 @@ def display_menu():
                     
                     if st.button("Quick Order", key=f"order_{item.get('item_id')}", use_container_width=True):
                         st.session_state.quick_order = item.get('name')
+                        # One key per click: reruns of the same click never place a second order
+                        st.session_state.quick_order_key = uuid.uuid4().hex
                         st.rerun()
     else:
         st.error("Failed to load menu. Please try again later.")
@@ -668,7 +677,8 @@ def chat_interface():
         st.session_state.messages.append({"role": "user", "content": user_message})
         
         order_data = {"message": user_message}
-        result = make_request("order", "POST", order_data)
+        result = make_request("order", "POST", order_data,
+                              headers={"Idempotency-Key": st.session_state.get("quick_order_key", uuid.uuid4().hex)})
         
         if result:
             if result.get("success"):
@@ -698,7 +708,9 @@ def chat_interface():
         with st.chat_message("assistant"):
             with st.spinner("🤔 Processing your order..."):
                 order_data = {"message": prompt}
-                result = make_request("order", "POST", order_data)
+                # One key per submission, so a retried request is never placed twice
+                result = make_request("order", "POST", order_data,
+                                      headers={"Idempotency-Key": uuid.uuid4().hex})
                 response = ""
                 
                 if result:
@@ -868,7 +880,7 @@ def main():
             st.session_state.messages.append({"role": "user", "content": query})
             
             order_data = {"message": query}
-            result = make_request("order", "POST", order_data)
+            result = make_request("order", "POST", order_data, headers={"Idempotency-Key": uuid.uuid4().hex})
             
             if result and result.get("success"):
                 response = result.get("response", "Thank you for your message!")
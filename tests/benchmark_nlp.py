@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for NLP performance
+Measures throughput, latency percentiles and memory for each stage of order
+parsing on synthetic menus of increasing size.
+
+Usage:
+    python tests/benchmark_nlp.py
+    python tests/benchmark_nlp.py --sizes 10 100 1000 10000 --output bench.json
+    python tests/benchmark_nlp.py --baseline bench.json --threshold 0.2
+    python tests/benchmark_nlp.py --sizes 19 --corpus corpus.csv --utterances 5000
+"""
+
+import sys
+import csv
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import itertools
+import tracemalloc
+from datetime import datetime
+from typing import List, Dict, Any, Callable, Optional
+
+# Add the backend directory to Python path
+sys.path.append('.')
+sys.path.append('./backend')
+
+try:
+    from nlp import RestaurantNLP, parse_orders
+    from matcher import MenuIndex, MenuMatcher, MatcherStats
+    from seed_data import generate_synthetic_menu
+except ImportError as e:
+    print(f"Error importing modules: {e}")
+    print("Make sure you're running this from the project root directory")
+    sys.exit(1)
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+STAGES = ["index_build", "intent", "match", "quantities", "parse_order"]
+
+# Latencies below this are timer noise and never count as regressions
+MIN_REGRESSION_MS = 0.05
+
+QUANTITY_WORDS = ["one", "two", "three", "a", "an"]
+
+ORDER_TEMPLATES = [
+    "I want {q} {item}",
+    "can I get {q} {item} please",
+    "{q} {item} and {q2} {item2}",
+    "I'd like to order {q} {item}, {q2} {item2} and {q3} {item3}",
+    "give me {item}",
+    "{item} x{n}",
+    "please add {q} {item} to my order",
+]
+
+OTHER_UTTERANCES = {
+    "show_menu": ["show me the menu", "what do you have", "what's available today", "menu please"],
+    "greeting": ["hi", "hello there", "good evening", "hey"],
+    "cancel_order": ["cancel my order", "I want to cancel", "never mind, cancel it"],
+    "help": ["help", "how does this work", "I need help"],
+}
+
+def typo(word: str, rng: random.Random) -> str:
+    """Drop or swap one character, the way people mistype on phones"""
+    if len(word) < 5:
+        return word
+    i = rng.randrange(1, len(word) - 1)
+    if rng.random() < 0.5:
+        return word[:i] + word[i + 1:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+def generate_utterances(menu_names: List[str], count: int, seed: int = 7,
+                        typo_rate: float = 0.15) -> List[str]:
+    """Build a reproducible mix of orders (80%) and other intents (20%)"""
+    rng = random.Random(seed)
+    utterances = []
+    for _ in range(count):
+        if rng.random() >= 0.8:
+            intent = rng.choice(sorted(OTHER_UTTERANCES))
+            utterances.append(rng.choice(OTHER_UTTERANCES[intent]))
+            continue
+
+        names = []
+        for _ in range(3):
+            name = rng.choice(menu_names).lower()
+            if rng.random() < typo_rate:
+                name = " ".join(typo(word, rng) for word in name.split())
+            names.append(name)
+        quantities = [rng.choice(QUANTITY_WORDS + [str(rng.randint(1, 6))]) for _ in range(3)]
+        utterances.append(rng.choice(ORDER_TEMPLATES).format(
+            item=names[0], item2=names[1], item3=names[2],
+            q=quantities[0], q2=quantities[1], q3=quantities[2], n=rng.randint(1, 5)
+        ))
+    return utterances
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    position = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[position]
+
+def measure(fn: Callable[[Any], Any], inputs: List[Any], memory: bool = True) -> Dict[str, Any]:
+    """Time fn over every input, then replay it under tracemalloc for peak memory"""
+    latencies = []
+    started = time.perf_counter()
+    for value in inputs:
+        t0 = time.perf_counter()
+        fn(value)
+        latencies.append(time.perf_counter() - t0)
+    total = time.perf_counter() - started
+    latencies.sort()
+
+    stats = {
+        "calls": len(inputs),
+        "throughput": round(len(inputs) / total, 1) if total > 0 else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 4) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+    }
+
+    if memory:
+        # Separate pass: tracemalloc slows allocation-heavy code several-fold
+        tracemalloc.start()
+        for value in inputs:
+            fn(value)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats["peak_kb"] = round(peak / 1024, 1)
+    return stats
+
+def load_corpus(path: str, count: int) -> List[str]:
+    """The first count utterances of a corpus CSV (see generate_corpus.py)"""
+    with open(path, newline='') as f:
+        return [row["order_text"] for row in itertools.islice(csv.DictReader(f), count)]
+
+def benchmark_menu(nlp: RestaurantNLP, size: int, utterances: int, seed: int,
+                   memory: bool, corpus: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Benchmark every stage against one synthetic menu, on generated utterances unless a corpus is given"""
+    menu_names = [item["name"] for item in generate_synthetic_menu(size, seed=seed)]
+    texts = corpus if corpus is not None else generate_utterances(menu_names, utterances, seed=seed)
+    builds = max(1, min(20, 2000 // size))
+
+    index = MenuIndex(menu_names)
+    matcher = MenuMatcher(index)
+    stats = MatcherStats()
+
+    # Stage inputs: intent runs on everything, item and quantity extraction
+    # only see what parse_order would send them
+    intents = nlp.classify_intents(texts)
+    orders = [text for text, intent in zip(texts, intents) if intent == "order_food"]
+
+    # Warm up caches (regexes, word2number) before timing
+    parse_orders(texts[:10], menu_names, index=index, nlp=nlp)
+
+    results = {
+        "index_build": measure(lambda _: MenuIndex(menu_names), range(builds), memory),
+        "intent": measure(nlp.classify_intent, texts, memory),
+        "match": measure(lambda text: matcher.match(text, stats=stats), orders, memory),
+        "quantities": measure(nlp.extract_quantities, orders, memory),
+        "parse_order": measure(lambda text: parse_orders([text], menu_names, index=index, nlp=nlp),
+                               texts, memory),
+    }
+    return results
+
+def run_benchmarks(sizes: List[int], utterances: int, seed: int, use_transformer: bool,
+                   memory: bool, corpus_path: Optional[str] = None) -> Dict[str, Any]:
+    nlp = RestaurantNLP(use_transformer=use_transformer)
+    corpus = load_corpus(corpus_path, utterances) if corpus_path else None
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "utterances": len(corpus) if corpus is not None else utterances,
+            "corpus": corpus_path,
+            "transformer": nlp.intent_classifier is not None,
+        },
+        "results": {}
+    }
+
+    for size in sizes:
+        print(f"Benchmarking menu with {size} items...")
+        report["results"][str(size)] = benchmark_menu(nlp, size, utterances, seed, memory, corpus)
+    return report
+
+def print_report(report: Dict[str, Any]):
+    print("\n" + "=" * 78)
+    print("NLP BENCHMARK")
+    print("=" * 78)
+    print(f"{'Menu':>6} {'Stage':<12} {'Calls':>6} {'Ops/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'Peak KB':>9}")
+    for size, stages in report["results"].items():
+        for stage in STAGES:
+            s = stages.get(stage)
+            if s is None:
+                continue
+            peak = f"{s['peak_kb']:>9.1f}" if "peak_kb" in s else f"{'-':>9}"
+            print(f"{size:>6} {stage:<12} {s['calls']:>6} {s['throughput']:>10.1f} "
+                  f"{s['p50_ms']:>9.3f} {s['p99_ms']:>9.3f} {peak}")
+
+def compare_reports(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+                    min_delta_ms: float = 0.0) -> List[str]:
+    """Return a description of every stage that regressed beyond the threshold
+
+    Latency increases of min_delta_ms or less are ignored as noise.
+    """
+    regressions = []
+    for size, stages in baseline.get("results", {}).items():
+        for stage, old in stages.items():
+            new = current["results"].get(size, {}).get(stage)
+            if new is None:
+                continue
+            for key in ("p50_ms", "p99_ms"):
+                if new[key] < MIN_REGRESSION_MS:
+                    continue
+                if new[key] > old[key] * (1 + threshold) and new[key] - old[key] > min_delta_ms:
+                    regressions.append(f"menu={size} {stage} {key}: {old[key]:.3f} -> {new[key]:.3f}")
+            if "peak_kb" in new and "peak_kb" in old and new["peak_kb"] > old["peak_kb"] * (1 + threshold) + 16:
+                regressions.append(f"menu={size} {stage} peak_kb: {old['peak_kb']:.1f} -> {new['peak_kb']:.1f}")
+            if new["throughput"] < old["throughput"] / (1 + threshold) and new["p50_ms"] >= MIN_REGRESSION_MS:
+                regressions.append(f"menu={size} {stage} throughput: "
+                                   f"{old['throughput']:.1f} -> {new['throughput']:.1f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark NLP order parsing")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Menu sizes to benchmark")
+    parser.add_argument("--utterances", type=int, default=500, help="Utterances per menu size")
+    parser.add_argument("--corpus", type=str, help="Time utterances from this corpus CSV instead of generated ones")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for menus and utterances")
+    parser.add_argument("--transformer", action="store_true", help="Load the transformer intent classifier")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass")
+    parser.add_argument("--output", type=str, help="Write results as JSON to this file")
+    parser.add_argument("--baseline", type=str, help="Compare against a previous JSON result")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown against the baseline (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    # Per-message INFO logging would dominate the timings
+    logging.disable(logging.INFO)
+    report = run_benchmarks(args.sizes, args.utterances, args.seed, args.transformer, not args.no_memory,
+                            args.corpus)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_reports(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\n✅ No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
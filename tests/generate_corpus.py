@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Synthetic utterance corpus generator for NLP stress and accuracy testing
+Writes labelled utterances in the sample_orders.csv schema, combining menu
+items, aliases, quantities (digits, words and compounds), typos, filler
+words and non-order intents. Output is deterministic for a given seed and
+streamed to disk row by row, so million-row corpora use constant memory.
+
+Usage:
+    python tests/generate_corpus.py --rows 100000 --output corpus.csv
+    python tests/generate_corpus.py --rows 1000000 --seed 7 --typo-rate 0.2 --output big.csv
+    python tests/generate_corpus.py --rows 50000 --menu-size 1000 --output synthetic_menu.csv
+    python tests/test_nlp.py --csv corpus.csv --workers 8
+"""
+
+import sys
+import csv
+import time
+import random
+import logging
+import argparse
+from typing import List, Dict, Iterator, Optional, Tuple
+
+# Add the backend directory to Python path
+sys.path.append('.')
+sys.path.append('./backend')
+
+# The imported modules log at INFO on import; keep the output to progress lines
+logging.disable(logging.INFO)
+
+try:
+    from seed_data import MENU_DATA, generate_synthetic_menu
+    from benchmark_nlp import typo
+except ImportError as e:
+    print(f"Error importing modules: {e}")
+    print("Make sure you're running this from the project root directory")
+    sys.exit(1)
+
+CSV_COLUMNS = ["order_text", "expected_intent", "expected_items", "expected_quantities"]
+
+# What customers call menu items; labels always use the menu name
+ALIASES = {
+    "Coke": ["coca cola", "cola"],
+    "French Fries": ["fries", "chips"],
+    "Chicken Wings": ["wings"],
+    "Hot Tea": ["tea", "chai"],
+    "Chicken Biryani": ["biryani"],
+    "Chicken Karahi": ["karahi"],
+    "Orange Juice": ["oj"],
+    "Chocolate Cake": ["cake"],
+    "Ice Cream": ["icecream"],
+}
+
+NUMBER_WORDS = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+                "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen",
+                "eighteen", "nineteen"]
+TENS_WORDS = {20: "twenty", 30: "thirty", 40: "forty", 50: "fifty"}
+
+# Quantity styles and their weights
+QUANTITY_STYLES = [("digit", 40), ("word", 30), ("article", 12), ("implicit", 8),
+                   ("idiom", 6), ("compound", 4)]
+IDIOMS = [("a couple of", 2), ("a dozen", 12), ("a pair of", 2)]
+
+ORDER_TEMPLATES = [
+    "I want {items}",
+    "can I get {items} please",
+    "{items}",
+    "I'd like {items}",
+    "I would like to order {items}",
+    "give me {items}",
+    "please add {items} to my order",
+    "let me get {items}",
+    "I'll have {items}",
+    "could you bring {items}",
+]
+
+# Fillers avoid quantity words ("a", "one") and menu words, so labels stay exact
+PREFIX_FILLERS = ["um", "uh", "hmm", "ok so", "so", "yeah", "actually", "hey", "right so", "well"]
+SUFFIX_FILLERS = ["please", "thanks", "thank you", "asap", "quickly", "if possible", "for delivery"]
+
+OTHER_INTENTS = {
+    "show_menu": ["show me the menu", "what do you have", "what's on the menu", "menu please",
+                  "what can I order", "what food is available", "can I see the menu",
+                  "what are your specials", "list your dishes"],
+    "greeting": ["hi", "hello", "hello there", "hey there", "good evening", "good morning",
+                 "hi, how are you", "assalam o alaikum", "yo"],
+    "cancel_order": ["cancel my order", "I want to cancel", "never mind, cancel it",
+                     "please cancel the order", "stop my order", "I don't want it anymore",
+                     "cancel that"],
+    "help": ["help", "I need help", "how does this work", "what can you do", "can you help me",
+             "how do I order", "I'm confused"],
+}
+INTENT_WEIGHTS = {"show_menu": 30, "greeting": 25, "cancel_order": 20, "help": 25}
+
+def number_to_words(n: int) -> str:
+    """Spell out 0-59 the way people type it ('twenty one' or 'twenty-one')"""
+    if n < 20:
+        return NUMBER_WORDS[n]
+    tens, ones = divmod(n, 10)
+    return TENS_WORDS[tens * 10] + ("" if ones == 0 else " " + NUMBER_WORDS[ones])
+
+def pluralize(phrase: str) -> str:
+    """Pluralize the last word of a lower-case item phrase"""
+    head, _, last = phrase.rpartition(" ")
+    if last.endswith(("s", "x", "ch", "sh")):
+        last = last if last.endswith("s") else last + "es"
+    elif last.endswith("y") and last[-2:-1] not in "aeiou":
+        last = last[:-1] + "ies"
+    else:
+        last = last + "s"
+    return f"{head} {last}" if head else last
+
+class CorpusGenerator:
+    """Deterministic stream of labelled utterances for one menu"""
+
+    def __init__(self, menu_names: List[str], seed: int = 42, order_share: float = 0.75,
+                 typo_rate: float = 0.1, filler_rate: float = 0.3, alias_rate: float = 0.2,
+                 max_items: int = 3, aliases: Optional[Dict[str, List[str]]] = None):
+        if not menu_names:
+            raise ValueError("Corpus generation needs at least one menu item")
+        self.menu_names = list(dict.fromkeys(menu_names))
+        self.rng = random.Random(seed)
+        self.order_share = order_share
+        self.typo_rate = typo_rate
+        self.filler_rate = filler_rate
+        self.alias_rate = alias_rate
+        self.max_items = max(1, min(max_items, len(self.menu_names)))
+        self.aliases = {name: forms for name, forms in (aliases if aliases is not None else ALIASES).items()
+                        if name in self.menu_names}
+        self._styles, self._style_weights = zip(*QUANTITY_STYLES)
+        self._intents = sorted(INTENT_WEIGHTS)
+        self._intent_weights = [INTENT_WEIGHTS[intent] for intent in self._intents]
+
+    def _quantity(self) -> Tuple[int, str]:
+        """A quantity and how it is written ('' when it goes unsaid)"""
+        rng = self.rng
+        style = rng.choices(self._styles, self._style_weights)[0]
+        if style == "digit":
+            n = rng.choice([1, 1, 2, 2, 3, 4, 5, 6, 10, rng.randint(1, 50)])
+            return n, str(n)
+        if style == "word":
+            n = rng.randint(1, 10)
+            return n, number_to_words(n)
+        if style == "article":
+            return 1, "a"
+        if style == "implicit":
+            return 1, ""
+        if style == "idiom":
+            phrase, n = rng.choice(IDIOMS)
+            return n, phrase
+        n = rng.randint(21, 59)
+        while n % 10 == 0:
+            n = rng.randint(21, 59)
+        words = number_to_words(n)
+        return n, words.replace(" ", "-") if rng.random() < 0.3 else words
+
+    def _item_phrase(self, name: str, quantity: int, spoken: str) -> str:
+        rng = self.rng
+        phrase = name.lower()
+        if name in self.aliases and rng.random() < self.alias_rate:
+            phrase = rng.choice(self.aliases[name])
+        if quantity > 1 and rng.random() < 0.7:
+            phrase = pluralize(phrase)
+        if rng.random() < self.typo_rate:
+            phrase = " ".join(typo(word, rng) for word in phrase.split())
+        if spoken == "a" and phrase[:1] in "aeiou":
+            spoken = "an"
+        return f"{spoken} {phrase}" if spoken else phrase
+
+    def _fill(self, text: str) -> str:
+        rng = self.rng
+        if rng.random() < self.filler_rate:
+            if rng.random() < 0.5:
+                separator = ", " if rng.random() < 0.5 else " "
+                text = f"{rng.choice(PREFIX_FILLERS)}{separator}{text}"
+            else:
+                text = f"{text} {rng.choice(SUFFIX_FILLERS)}"
+        case = rng.random()
+        if case < 0.05:
+            text = text.upper()
+        elif case < 0.4:
+            text = text[:1].upper() + text[1:]
+        return text
+
+    def order(self) -> Tuple[str, str, str, str]:
+        rng = self.rng
+        names = rng.sample(self.menu_names, rng.randint(1, self.max_items))
+        phrases, quantities = [], []
+        for name in names:
+            quantity, spoken = self._quantity()
+            phrases.append(self._item_phrase(name, quantity, spoken))
+            quantities.append(quantity)
+
+        if len(phrases) == 1:
+            items = phrases[0]
+        else:
+            joiner = rng.choice([", ", " and ", ", "])
+            items = joiner.join(phrases[:-1]) + rng.choice([" and ", ", ", " & ", " plus "]) + phrases[-1]
+        text = self._fill(rng.choice(ORDER_TEMPLATES).format(items=items))
+        return text, "order_food", ",".join(names), ",".join(str(q) for q in quantities)
+
+    def other(self) -> Tuple[str, str, str, str]:
+        rng = self.rng
+        intent = rng.choices(self._intents, self._intent_weights)[0]
+        text = rng.choice(OTHER_INTENTS[intent])
+        if rng.random() < self.typo_rate:
+            text = " ".join(typo(word, rng) for word in text.split())
+        return self._fill(text), intent, "", ""
+
+    def rows(self, count: int) -> Iterator[Tuple[str, str, str, str]]:
+        for _ in range(count):
+            yield self.order() if self.rng.random() < self.order_share else self.other()
+
+def write_corpus(path: str, rows: Iterator[Tuple[str, str, str, str]], total: Optional[int] = None,
+                 progress_every: int = 100000) -> int:
+    """Stream rows to a CSV file ('-' for stdout); returns the number written"""
+    out = sys.stdout if path == "-" else open(path, "w", newline="", buffering=1 << 20)
+    written = 0
+    started = time.perf_counter()
+    try:
+        writer = csv.writer(out)
+        writer.writerow(CSV_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+            if progress_every and written % progress_every == 0:
+                elapsed = time.perf_counter() - started
+                of_total = f"/{total}" if total else ""
+                print(f"Wrote {written}{of_total} rows ({written / elapsed:.0f} rows/s)...", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a labelled utterance corpus in the sample_orders.csv schema")
+    parser.add_argument("--rows", type=int, default=100000, help="Utterances to generate")
+    parser.add_argument("--output", type=str, default="-", help="CSV file to write (default: stdout)")
+    parser.add_argument("--seed", type=int, default=42, help="Seed; the same seed gives the same corpus")
+    parser.add_argument("--menu-size", type=int,
+                        help="Use a synthetic menu of this size (default: the seeded menu)")
+    parser.add_argument("--order-share", type=float, default=0.75, help="Fraction of utterances that are orders")
+    parser.add_argument("--typo-rate", type=float, default=0.1, help="Chance an item name or phrase has a typo")
+    parser.add_argument("--filler-rate", type=float, default=0.3, help="Chance of filler words around an utterance")
+    parser.add_argument("--alias-rate", type=float, default=0.2, help="Chance an item is called by an alias")
+    parser.add_argument("--max-items", type=int, default=3, help="Most items in one order")
+    args = parser.parse_args()
+
+    if args.menu_size:
+        menu_names = [item["name"] for item in generate_synthetic_menu(args.menu_size, seed=args.seed)]
+    else:
+        menu_names = [item["name"] for item in MENU_DATA]
+
+    generator = CorpusGenerator(menu_names, seed=args.seed, order_share=args.order_share,
+                                typo_rate=args.typo_rate, filler_rate=args.filler_rate,
+                                alias_rate=args.alias_rate, max_items=args.max_items)
+    started = time.perf_counter()
+    written = write_corpus(args.output, generator.rows(args.rows), total=args.rows)
+    if args.output != "-":
+        print(f"Wrote {written} rows to {args.output} in {time.perf_counter() - started:.1f}s "
+              f"(menu: {len(menu_names)} items, seed: {args.seed})", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for the Flask backend
+Serves the real backend/app.py on a local port against an in-memory stand-in
+for Firestore, then drives /order, /menu, /orders and /orders/<id>/status
+with a configurable request mix and concurrency.
+
+Usage:
+    python tests/load_test.py
+    python tests/load_test.py --concurrency 32 --duration 30 --db-latency-ms 20
+    python tests/load_test.py --mix order=70,menu=20,orders=5,status=5 --output load.json
+    python tests/load_test.py --url http://localhost:5000   # an already running server
+"""
+
+import sys
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import datetime
+import threading
+import http.client
+from urllib.parse import urlparse
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Tuple
+
+# Add the backend directory to Python path
+sys.path.append('.')
+sys.path.append('./backend')
+
+try:
+    from firestore_memory import InMemoryFirestore
+    from storage import FirestoreStorage
+    from seed_data import generate_synthetic_menu
+    from benchmark_nlp import generate_utterances, percentile
+except ImportError as e:
+    print(f"Error importing modules: {e}")
+    print("Make sure you're running this from the project root directory")
+    sys.exit(1)
+
+DEFAULT_MIX = "order=60,menu=20,orders=10,status=10"
+ENDPOINTS = ("order", "menu", "orders", "status")
+STATUSES = ['Confirmed', 'Preparing', 'Ready', 'Delivered']
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """Parse 'order=60,menu=20' into normalised weights"""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}' in mix (choose from {', '.join(ENDPOINTS)})")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("Request mix must have a positive weight")
+    return {name: weight / total for name, weight in weights.items()}
+
+def seed_datastore(store: InMemoryFirestore, menu_size: int, orders: int, seed: int) -> Tuple[List[str], List[str]]:
+    """Fill the stand-in with a synthetic menu and past orders (create it with no latency)"""
+    rng = random.Random(seed)
+    menu = generate_synthetic_menu(menu_size, seed=seed)
+    for item in menu:
+        store.collection('menus').document(item['item_id']).set(item)
+
+    order_ids = []
+    now = datetime.datetime.utcnow()
+    for i in range(orders):
+        item = rng.choice(menu)
+        order_id = f"ORD_LOAD_{i:06d}"
+        store.collection('orders').document(order_id).set({
+            "order_id": order_id,
+            "user": {"name": "Load Test", "phone": None},
+            "items": [{"item_id": item['item_id'], "name": item['name'], "quantity": 1,
+                       "unit_price": item['price'], "total_price": item['price']}],
+            "total_price": item['price'],
+            "status": "Pending",
+            "original_message": f"one {item['name'].lower()}",
+            "created_at": now - datetime.timedelta(minutes=i),
+            "updated_at": now - datetime.timedelta(minutes=i),
+        })
+        order_ids.append(order_id)
+    return [item['name'] for item in menu], order_ids
+
+def start_local_server(store: InMemoryFirestore) -> Tuple[Any, str]:
+    """Serve the real app with the stand-in datastore on a free local port"""
+    from werkzeug.serving import make_server
+    import app as backend
+    from admission import RateLimiter
+
+    backend.storage = FirestoreStorage(store)
+    # Every simulated user shares one address; measure capacity, not the
+    # per-client limit (the worker-wide API_GLOBAL_RATE_LIMIT still applies)
+    backend.rate_limiter = RateLimiter(per_minute=0)
+    server = make_server('127.0.0.1', 0, backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-test-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+class LoadGenerator:
+    """Runs weighted requests from several threads and records latencies"""
+
+    def __init__(self, base_url: str, mix: Dict[str, float], utterances: List[str],
+                 order_ids: List[str], timeout: float, seed: int):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.https = parsed.scheme == 'https'
+        self.mix = mix
+        self.utterances = utterances
+        self.order_ids = list(order_ids)
+        self.timeout = timeout
+        self.seed = seed
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _request(self, rng: random.Random, endpoint: str) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+        if endpoint == "order":
+            return "POST", "/order", {"message": rng.choice(self.utterances),
+                                      "user": {"name": "Load Test", "phone": None}}
+        if endpoint == "menu":
+            return "GET", "/menu", None
+        if endpoint == "orders":
+            return "GET", f"/orders?limit={rng.choice([10, 20, 50])}", None
+        with self._lock:
+            order_id = rng.choice(self.order_ids) if self.order_ids else "ORD_MISSING"
+        return "PUT", f"/orders/{order_id}/status", {"status": rng.choice(STATUSES)}
+
+    def _worker(self, worker_id: int, stop_at: float, remaining: List[int]):
+        rng = random.Random(self.seed + worker_id)
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        connection = self._connection()
+
+        while time.monotonic() < stop_at:
+            with self._lock:
+                if remaining[0] == 0:
+                    break
+                remaining[0] -= 1
+
+            endpoint = rng.choices(names, weights)[0]
+            method, path, body = self._request(rng, endpoint)
+            payload = json.dumps(body) if body is not None else None
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            if endpoint == "order":
+                # Each request is a new order; without a key, repeated utterances
+                # would be replayed as resubmissions instead of placed
+                headers["Idempotency-Key"] = uuid.uuid4().hex
+
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, body=payload, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+                outcome = str(response.status)
+                if response.will_close:
+                    connection.close()
+                    connection = self._connection()
+            except (OSError, http.client.HTTPException) as e:
+                outcome = type(e).__name__
+                data = b""
+                connection.close()
+                connection = self._connection()
+            elapsed = time.perf_counter() - start
+
+            if endpoint == "order" and outcome == "201":
+                try:
+                    order_id = json.loads(data)["order"]["order_id"]
+                    with self._lock:
+                        self.order_ids.append(order_id)
+                except (ValueError, KeyError):
+                    pass
+
+            with self._lock:
+                self.latencies[endpoint].append(elapsed)
+                self.statuses[endpoint][outcome] += 1
+        connection.close()
+
+    def run(self, concurrency: int, duration: float, requests: Optional[int]) -> float:
+        """Run until the duration passes or the request budget is spent; returns wall time"""
+        stop_at = time.monotonic() + duration
+        remaining = [requests if requests is not None else -1]
+        threads = [threading.Thread(target=self._worker, args=(i, stop_at, remaining), daemon=True)
+                   for i in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    def report(self, wall_time: float) -> Dict[str, Any]:
+        endpoints = {}
+        for endpoint, latencies in self.latencies.items():
+            latencies = sorted(latencies)
+            statuses = dict(self.statuses[endpoint])
+            errors = sum(count for status, count in statuses.items()
+                         if not status.isdigit() or int(status) >= 500)
+            endpoints[endpoint] = {
+                "requests": len(latencies),
+                "throughput": round(len(latencies) / wall_time, 1) if wall_time else 0.0,
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+                "p90_ms": round(percentile(latencies, 0.90) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+                "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+                "errors": errors,
+                "statuses": statuses,
+            }
+        total = sum(e["requests"] for e in endpoints.values())
+        return {
+            "wall_time": round(wall_time, 2),
+            "requests": total,
+            "throughput": round(total / wall_time, 1) if wall_time else 0.0,
+            "errors": sum(e["errors"] for e in endpoints.values()),
+            "endpoints": endpoints,
+        }
+
+def print_report(report: Dict[str, Any]):
+    print("\n" + "=" * 84)
+    print("LOAD TEST RESULTS")
+    print("=" * 84)
+    print(f"Requests: {report['requests']} in {report['wall_time']}s "
+          f"({report['throughput']} req/s), errors: {report['errors']}")
+    print(f"\n{'Endpoint':<8} {'Reqs':>7} {'Req/s':>8} {'p50 ms':>9} {'p90 ms':>9} "
+          f"{'p99 ms':>9} {'max ms':>9} {'Errors':>7}  Statuses")
+    for endpoint in ENDPOINTS:
+        e = report["endpoints"].get(endpoint)
+        if e is None:
+            continue
+        statuses = ", ".join(f"{k}:{v}" for k, v in sorted(e["statuses"].items()))
+        print(f"{endpoint:<8} {e['requests']:>7} {e['throughput']:>8.1f} {e['p50_ms']:>9.2f} "
+              f"{e['p90_ms']:>9.2f} {e['p99_ms']:>9.2f} {e['max_ms']:>9.2f} {e['errors']:>7}  {statuses}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the restaurant backend over HTTP")
+    parser.add_argument("--url", type=str, help="Target a running server instead of a local stand-in")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client threads")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests")
+    parser.add_argument("--mix", type=str, default=DEFAULT_MIX, help=f"Endpoint weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--menu-size", type=int, default=50, help="Synthetic menu items in the stand-in")
+    parser.add_argument("--orders", type=int, default=200, help="Existing orders in the stand-in")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0,
+                        help="Simulated datastore round trip per read or write")
+    parser.add_argument("--db-jitter-ms", type=float, default=0.0, help="Extra random datastore latency, up to")
+    parser.add_argument("--timeout", type=float, default=15.0, help="Client socket timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for data and request choices")
+    parser.add_argument("--output", type=str, help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    server = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+        menu_names = [item['name'] for item in generate_synthetic_menu(args.menu_size, seed=args.seed)]
+        order_ids: List[str] = []
+    else:
+        # Keep the app's per-request INFO logging out of the measurements
+        logging.disable(logging.INFO)
+        store = InMemoryFirestore()
+        menu_names, order_ids = seed_datastore(store, args.menu_size, args.orders, args.seed)
+        store.latency, store.jitter = args.db_latency_ms / 1000, args.db_jitter_ms / 1000
+        server, base_url = start_local_server(store)
+        print(f"Serving backend/app.py at {base_url} "
+              f"(menu: {len(menu_names)} items, datastore latency: {args.db_latency_ms} ms)")
+
+    utterances = generate_utterances(menu_names, 1000, seed=args.seed)
+    generator = LoadGenerator(base_url, mix, utterances, order_ids, args.timeout, args.seed)
+    print(f"Running {args.concurrency} clients for up to {args.duration}s against {base_url}...")
+    wall_time = generator.run(args.concurrency, args.duration, args.requests)
+
+    report = generator.report(wall_time)
+    report["config"] = {k: v for k, v in vars(args).items()}
+    print_report(report)
+
+    if server is not None:
+        server.shutdown()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Replay historical chat logs through the current NLP parser
+Streams user messages from the chat_logs collection (Firestore), a JSONL/CSV
+export, or an in-memory stand-in seeded with synthetic orders, re-parses them
+with parse_order across worker processes and reports throughput, latency
+percentiles and how the results differ from the intent and items recorded
+when each message was first handled.
+
+Usage:
+    python tests/replay_chat_logs.py --source firestore --limit 50000 --export chat_logs.jsonl
+    python tests/replay_chat_logs.py --source chat_logs.jsonl --concurrency 8 --output replay.json
+    python tests/replay_chat_logs.py --source memory --orders 20000 --diffs diffs.jsonl
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import argparse
+import datetime
+import itertools
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+# Add the backend directory to Python path
+sys.path.append('.')
+sys.path.append('./backend')
+
+try:
+    from nlp import parse_order, get_nlp_processor
+    from firebase_client import firebase_client
+    from seed_data import MENU_DATA
+    from benchmark_nlp import percentile
+except ImportError as e:
+    print(f"Error importing modules: {e}")
+    print("Make sure you're running this from the project root directory")
+    sys.exit(1)
+
+# Messages sent to a worker per task
+REPLAY_BATCH_SIZE = 200
+# Chat logs read per Firestore page
+REPLAY_PAGE_SIZE = 1000
+# Exports are written with the menu they were replayed against alongside, as <export>.menu.json
+MENU_SUFFIX = '.menu.json'
+CHAT_LOG_FIELDS = ['order_id', 'sender', 'message', 'timestamp', 'parsed_intent', 'extracted_items']
+
+_worker_menu: List[str] = []
+
+def _init_replay_worker(menu_names: List[str]):
+    """Keep the menu and load the models once per worker; per-message INFO logs would dominate the timings"""
+    global _worker_menu
+    _worker_menu = menu_names
+    logging.disable(logging.INFO)
+    get_nlp_processor()
+
+def _replay_batch(messages: List[str]) -> List[Tuple[str, List[str], float]]:
+    """Parse messages, returning (intent, items, latency_ms) for each"""
+    results = []
+    for message in messages:
+        start = time.perf_counter()
+        parsed = parse_order(message, _worker_menu)
+        results.append((parsed["intent"], parsed["items"], (time.perf_counter() - start) * 1000))
+    return results
+
+def iter_firestore(limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """User messages from the chat_logs collection, a page at a time"""
+    if not firebase_client.is_connected():
+        raise RuntimeError("Firebase not connected")
+    return firebase_client.iter_documents('chat_logs', filters=[('sender', '==', 'user')], limit=limit,
+                                          fields=CHAT_LOG_FIELDS, page_size=REPLAY_PAGE_SIZE)
+
+def iter_export(path: str) -> Iterator[Dict[str, Any]]:
+    """User messages from a JSONL export (see --export) or a CSV with the same columns"""
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            for row in csv.DictReader(f):
+                items = row.get('extracted_items') or ''
+                if items.startswith('['):
+                    row['extracted_items'] = json.loads(items)
+                else:
+                    row['extracted_items'] = [item.strip() for item in items.split(',') if item.strip()]
+                yield row
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def seed_memory_source(orders: int, seed: int) -> List[str]:
+    """Point the Firebase client at an in-memory stand-in filled with synthetic orders; returns the menu"""
+    from firestore_memory import InMemoryFirestore
+    from seed_data import seed_synthetic_data
+
+    firebase_client.db = InMemoryFirestore()
+    print(f"Seeding the in-memory stand-in with {orders} synthetic orders...")
+    logging.disable(logging.INFO)
+    if not seed_synthetic_data(orders, seed=seed, ops_per_second=10 ** 6):
+        raise RuntimeError("Could not seed the in-memory stand-in")
+    logging.disable(logging.NOTSET)
+    return load_datastore_menu()
+
+def load_datastore_menu() -> List[str]:
+    """Names of the available menu items in the connected datastore"""
+    return [doc['name'] for doc in firebase_client.iter_documents('menus', filters=[('available', '==', True)],
+                                                                  fields=['name'], page_size=REPLAY_PAGE_SIZE)
+            if doc.get('name')]
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot export {type(value).__name__}")
+
+class ReplayReport:
+    """Accumulates latencies and differences from the recorded results"""
+
+    def __init__(self, diff_limit: int = 20, diff_file=None):
+        self.latencies: List[float] = []
+        self.messages = 0
+        self.skipped = 0
+        self.intent_changed = 0
+        self.items_changed = 0
+        self.transitions: Counter = Counter()
+        self.items_added: Counter = Counter()
+        self.items_removed: Counter = Counter()
+        self.examples: List[Dict[str, Any]] = []
+        self.diff_limit = diff_limit
+        self.diff_file = diff_file
+
+    def add(self, record: Dict[str, Any], intent: str, items: List[str], latency_ms: float):
+        self.messages += 1
+        self.latencies.append(latency_ms)
+
+        recorded_intent = record.get('parsed_intent')
+        recorded_items = record.get('extracted_items') or []
+        intent_changed = recorded_intent is not None and recorded_intent != intent
+        added = sorted(set(items) - set(recorded_items))
+        removed = sorted(set(recorded_items) - set(items))
+
+        self.transitions[(recorded_intent or '?', intent)] += 1
+        self.intent_changed += intent_changed
+        self.items_changed += bool(added or removed)
+        self.items_added.update(added)
+        self.items_removed.update(removed)
+
+        if intent_changed or added or removed:
+            diff = {
+                "message": record.get('message'),
+                "order_id": record.get('order_id'),
+                "recorded": {"intent": recorded_intent, "items": recorded_items},
+                "current": {"intent": intent, "items": items},
+            }
+            if len(self.examples) < self.diff_limit:
+                self.examples.append(diff)
+            if self.diff_file is not None:
+                self.diff_file.write(json.dumps(diff) + "\n")
+
+    def summary(self, wall_time: float) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        messages = max(self.messages, 1)
+        return {
+            "messages": self.messages,
+            "skipped": self.skipped,
+            "wall_time": round(wall_time, 2),
+            "throughput": round(self.messages / wall_time, 1) if wall_time else 0.0,
+            "latency_ms": {
+                "mean": round(sum(latencies) / messages, 3),
+                "p50": round(percentile(latencies, 0.50), 3),
+                "p90": round(percentile(latencies, 0.90), 3),
+                "p99": round(percentile(latencies, 0.99), 3),
+                "max": round(latencies[-1], 3) if latencies else 0.0,
+            },
+            "intent_agreement": round(100 - self.intent_changed / messages * 100, 2),
+            "items_agreement": round(100 - self.items_changed / messages * 100, 2),
+            "intent_transitions": {f"{old} -> {new}": count
+                                   for (old, new), count in self.transitions.most_common()},
+            "items_added": dict(self.items_added.most_common(20)),
+            "items_removed": dict(self.items_removed.most_common(20)),
+            "examples": self.examples,
+        }
+
+def replay(records: Iterator[Dict[str, Any]], menu_names: List[str], concurrency: int,
+           report: ReplayReport, export_file=None, progress_every: int = 10000) -> float:
+    """Re-parse every record, keeping at most a few batches per worker in flight; returns wall time"""
+    def batches():
+        stream = iter(records)
+        while True:
+            chunk = list(itertools.islice(stream, REPLAY_BATCH_SIZE))
+            if not chunk:
+                return
+            batch = []
+            for record in chunk:
+                if export_file is not None:
+                    export_file.write(json.dumps(record, default=_json_default) + "\n")
+                if not (record.get('message') or '').strip():
+                    report.skipped += 1
+                    continue
+                batch.append(record)
+            if batch:
+                yield batch
+
+    def collect(batch, results):
+        for record, (intent, items, latency_ms) in zip(batch, results):
+            report.add(record, intent, items, latency_ms)
+        if report.messages // progress_every != (report.messages - len(batch)) // progress_every:
+            elapsed = time.perf_counter() - started
+            print(f"Replayed {report.messages} messages ({report.messages / elapsed:.0f}/s)...")
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        _init_replay_worker(menu_names)
+        for batch in batches():
+            collect(batch, _replay_batch([record['message'] for record in batch]))
+        return time.perf_counter() - started
+
+    in_flight: deque = deque()
+    with ProcessPoolExecutor(max_workers=concurrency, initializer=_init_replay_worker,
+                             initargs=(menu_names,)) as pool:
+        for batch in batches():
+            in_flight.append((batch, pool.submit(_replay_batch, [record['message'] for record in batch])))
+            # Bound memory: results are collected in order once enough work is queued
+            while len(in_flight) >= concurrency * 2:
+                done, future = in_flight.popleft()
+                collect(done, future.result())
+        while in_flight:
+            done, future = in_flight.popleft()
+            collect(done, future.result())
+    return time.perf_counter() - started
+
+def print_report(summary: Dict[str, Any]):
+    print("\n" + "=" * 70)
+    print("CHAT LOG REPLAY")
+    print("=" * 70)
+    latency = summary["latency_ms"]
+    print(f"Messages:          {summary['messages']} in {summary['wall_time']}s "
+          f"({summary['throughput']} msg/s), {summary['skipped']} empty skipped")
+    print(f"Latency:           mean {latency['mean']:.3f} ms, p50 {latency['p50']:.3f} ms, "
+          f"p90 {latency['p90']:.3f} ms, p99 {latency['p99']:.3f} ms, max {latency['max']:.3f} ms")
+    print(f"Intent agreement:  {summary['intent_agreement']:.2f}%")
+    print(f"Items agreement:   {summary['items_agreement']:.2f}%")
+
+    print("\nIntent (recorded -> current):")
+    for transition, count in summary["intent_transitions"].items():
+        print(f"  {transition:<32} {count:>8}")
+    if summary["items_added"]:
+        print("\nItems now matched that were not recorded:")
+        for item, count in summary["items_added"].items():
+            print(f"  {item:<32} {count:>8}")
+    if summary["items_removed"]:
+        print("\nRecorded items no longer matched:")
+        for item, count in summary["items_removed"].items():
+            print(f"  {item:<32} {count:>8}")
+    if summary["examples"]:
+        print("\nExample differences:")
+        for diff in summary["examples"][:10]:
+            print(f"  '{diff['message']}'")
+            print(f"    recorded: {diff['recorded']['intent']} {diff['recorded']['items']}")
+            print(f"    current:  {diff['current']['intent']} {diff['current']['items']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay chat logs through the current NLP parser")
+    parser.add_argument("--source", default="firestore",
+                        help="'firestore', 'memory' (synthetic stand-in) or a .jsonl/.csv export")
+    parser.add_argument("--limit", type=int, help="Replay at most this many messages")
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--orders", type=int, default=10000, help="Synthetic orders for --source memory")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for --source memory")
+    parser.add_argument("--menu-file",
+                        help="JSON list of menu names (default: the datastore's, the export's, or the seeded menu)")
+    parser.add_argument("--export", help="Also write the replayed chat logs to this JSONL file")
+    parser.add_argument("--diffs", help="Write every difference from the recorded results to this JSONL file")
+    parser.add_argument("--output", help="Write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    try:
+        if args.source == "memory":
+            menu_names = seed_memory_source(args.orders, args.seed)
+            records = iter_firestore(args.limit)
+        elif args.source == "firestore":
+            records = iter_firestore(args.limit)
+            menu_names = load_datastore_menu()
+        else:
+            records = itertools.islice(iter_export(args.source), args.limit)
+            menu_names = [item['name'] for item in MENU_DATA]
+            if os.path.exists(args.source + MENU_SUFFIX) and not args.menu_file:
+                with open(args.source + MENU_SUFFIX) as f:
+                    menu_names = json.load(f)
+    except (RuntimeError, OSError) as e:
+        print(f"❌ {e}")
+        return 1
+
+    if args.menu_file:
+        with open(args.menu_file) as f:
+            menu_names = json.load(f)
+    if not menu_names:
+        print("❌ No menu items to match against")
+        return 1
+
+    # Keep the parser's per-message INFO logging out of the measurements
+    logging.disable(logging.INFO)
+    export_file = None
+    if args.export:
+        # The menu travels with the export so a later replay matches against the same items
+        with open(args.export + MENU_SUFFIX, 'w') as f:
+            json.dump(menu_names, f)
+        export_file = open(args.export, 'w')
+    diff_file = open(args.diffs, 'w') if args.diffs else None
+    report = ReplayReport(diff_file=diff_file)
+    print(f"Replaying chat logs from {args.source} with {args.concurrency} worker(s) "
+          f"against {len(menu_names)} menu items...")
+    try:
+        wall_time = replay(records, menu_names, args.concurrency, report, export_file)
+    finally:
+        for f in (export_file, diff_file):
+            if f is not None:
+                f.close()
+
+    summary = report.summary(wall_time)
+    summary["config"] = {k: v for k, v in vars(args).items()}
+    print_report(summary)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test script for admission control
+Drives the real backend/app.py through Flask's test client, against an
+in-memory stand-in for Firestore, and checks who the per-client rate limit
+applies to.
+
+Usage:
+    python tests/test_admission.py
+"""
+
+import sys
+import uuid
+import logging
+from typing import Optional
+
+# Add the backend directory to Python path
+sys.path.append('.')
+sys.path.append('./backend')
+
+try:
+    from firestore_memory import InMemoryFirestore
+    from storage import FirestoreStorage
+    from admission import RateLimiter, ClientIdentifier, parse_trusted_frontends
+    import app as backend
+except ImportError as e:
+    print(f"Error importing modules: {e}")
+    print("Make sure you're running this from the project root directory")
+    sys.exit(1)
+
+RATE_LIMIT = 5
+REQUESTS = 40
+CLIENT_ADDRESS = '203.0.113.7'
+FRONTEND_ADDRESS = '10.0.0.5'
+
+class AdmissionTester:
+    def __init__(self):
+        backend.storage = FirestoreStorage(InMemoryFirestore())
+        self.client = backend.app.test_client()
+        self.failures = 0
+
+    def reset(self, trusted: Optional[str] = ''):
+        """Fresh buckets of RATE_LIMIT requests per minute, no burst beyond that
+
+        trusted=None uses the default trusted frontends.
+        """
+        backend.rate_limiter = RateLimiter(per_minute=RATE_LIMIT, burst=RATE_LIMIT, global_per_second=0)
+        backend.client_identifier = ClientIdentifier(parse_trusted_frontends(trusted) if trusted is not None else None)
+
+    def count_limited(self, address: str, client_ids) -> int:
+        limited = 0
+        for client_id in client_ids:
+            headers = {'X-Client-ID': client_id} if client_id else {}
+            response = self.client.get('/menu', headers=headers, environ_base={'REMOTE_ADDR': address})
+            if response.status_code == 429:
+                limited += 1
+                if 'Retry-After' not in response.headers:
+                    self.check(False, "429 without Retry-After")
+        return limited
+
+    def check(self, ok: bool, message: str):
+        print(f"{'✅' if ok else '❌'} {message}")
+        if not ok:
+            self.failures += 1
+
+    def test_rotating_client_id(self):
+        """A new X-Client-ID per request must not reset the caller's limit"""
+        self.reset()
+        limited = self.count_limited(CLIENT_ADDRESS, [uuid.uuid4().hex for _ in range(REQUESTS)])
+        self.check(limited == REQUESTS - RATE_LIMIT,
+                   f"Rotating X-Client-ID: {limited}/{REQUESTS} limited (expected {REQUESTS - RATE_LIMIT})")
+        self.check(backend.rate_limiter.tracked_clients == 1,
+                   f"Rotating X-Client-ID tracks {backend.rate_limiter.tracked_clients} client(s) (expected 1)")
+
+    def test_same_client_id(self):
+        self.reset()
+        limited = self.count_limited(CLIENT_ADDRESS, ['session-a'] * REQUESTS)
+        self.check(limited == REQUESTS - RATE_LIMIT,
+                   f"Repeated X-Client-ID: {limited}/{REQUESTS} limited (expected {REQUESTS - RATE_LIMIT})")
+
+    def test_trusted_frontend(self):
+        """Sessions behind a trusted frontend get a limit each; others share the frontend's"""
+        self.reset(trusted=f"{FRONTEND_ADDRESS.rsplit('.', 1)[0]}.0/24")
+        limited = self.count_limited(FRONTEND_ADDRESS, ['session-a'] * RATE_LIMIT + ['session-b'] * RATE_LIMIT)
+        self.check(limited == 0, f"Trusted frontend, two sessions: {limited} limited (expected 0)")
+        limited = self.count_limited(FRONTEND_ADDRESS, ['session-a'])
+        self.check(limited == 1, f"Trusted frontend, session over its limit: {limited} limited (expected 1)")
+        limited = self.count_limited(CLIENT_ADDRESS, [uuid.uuid4().hex for _ in range(REQUESTS)])
+        self.check(limited == REQUESTS - RATE_LIMIT,
+                   f"Untrusted address alongside: {limited}/{REQUESTS} limited (expected {REQUESTS - RATE_LIMIT})")
+
+    def test_default_trusted_frontend(self):
+        """Out of the box, a private-network frontend's sessions get a bucket each"""
+        self.reset(trusted=None)
+        limited = self.count_limited(FRONTEND_ADDRESS, ['session-a'] * RATE_LIMIT + ['session-b'] * RATE_LIMIT)
+        self.check(limited == 0, f"Default trust, two sessions: {limited} limited (expected 0)")
+
+    def test_spoofed_session(self):
+        """An untrusted address naming a frontend session neither uses nor drains its bucket"""
+        self.reset(trusted=None)
+        limited = self.count_limited(CLIENT_ADDRESS, ['session-a'] * RATE_LIMIT)
+        self.check(limited == 0, f"Spoofing session-a, within the address limit: {limited} limited (expected 0)")
+        limited = self.count_limited(CLIENT_ADDRESS, ['session-a', 'session-b'])
+        self.check(limited == 2, f"Spoofing sessions past the address limit: {limited} limited (expected 2)")
+        limited = self.count_limited(FRONTEND_ADDRESS, ['session-a'] * RATE_LIMIT)
+        self.check(limited == 0, f"Real session-a afterwards: {limited} limited (expected 0)")
+
+def main():
+    logging.disable(logging.WARNING)
+    tester = AdmissionTester()
+
+    print("🚦 Admission Control Tests")
+    print("=" * 60)
+    tester.test_rotating_client_id()
+    tester.test_same_client_id()
+    tester.test_trusted_frontend()
+    tester.test_default_trusted_frontend()
+    tester.test_spoofed_session()
+
+    print("=" * 60)
+    if tester.failures:
+        print(f"❌ {tester.failures} check(s) failed")
+        return 1
+    print("✅ All checks passed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
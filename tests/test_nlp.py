@@ -6,12 +6,20 @@ This script tests the natural language processing capabilities of the restaurant
 Usage:
     python test_nlp.py
     python test_nlp.py --csv data/sample_orders.csv
+    python test_nlp.py --csv corpus.csv --workers 8
+    python test_nlp.py --csv sample_orders.csv --baseline nlp_baseline.json
     python test_nlp.py --interactive
 """
 
+import os
 import sys
+import time
+import logging
 import argparse
+import platform
+import itertools
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict, Any
 import json
 from datetime import datetime
@@ -21,13 +29,71 @@ sys.path.append('.')
 sys.path.append('./backend')
 
 try:
-    from nlp import parse_order
+    from nlp import parse_order, get_nlp_processor
+    from matcher import MenuIndex, MenuMatcher, get_matcher_stats
+    from benchmark_nlp import compare_reports
     from firebase_client import firebase_client
 except ImportError as e:
     print(f"Error importing modules: {e}")
     print("Make sure you're running this from the project root directory")
     sys.exit(1)
 
+# Rows read per chunk, and rows per task sent to a worker process
+CSV_CHUNK_SIZE = 10000
+CSV_BATCH_SIZE = 250
+# Calls timed per stage for baselines (stage timing runs serially)
+STAGE_SAMPLE_SIZE = 2000
+# Stage latency changes this small are timer and scheduler noise, never regressions
+LATENCY_NOISE_MS = 0.05
+
+def _init_csv_worker():
+    """Load the NLP models once per worker; per-message INFO logs would dominate the timings"""
+    logging.disable(logging.INFO)
+    get_nlp_processor()
+
+def _evaluate_batch(args) -> List[tuple]:
+    """Parse a batch of texts, returning (intent, items, quantities, confidence, latency_ms) rows"""
+    texts, menu_names = args
+    rows = []
+    for text in texts:
+        start = time.perf_counter()
+        result = parse_order(text, menu_names)
+        latency_ms = (time.perf_counter() - start) * 1000
+        rows.append((result["intent"], ",".join(result["items"]), ",".join(str(q) for q in result["quantities"]),
+                     result["confidence"], round(latency_ms, 4)))
+    return rows
+
+def split_list(value: str) -> List[str]:
+    """Split a comma-separated CSV cell, dropping blanks"""
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+def _explode_items(series: pd.Series) -> pd.Series:
+    """One row per (test case, item), with duplicates and blanks removed"""
+    items = series.str.split(',').explode().str.strip()
+    items = items[items.notna() & (items != '')]
+    return items[~pd.Series(list(zip(items.index, items)), index=items.index).duplicated()]
+
+def normalize_items(series: pd.Series) -> pd.Series:
+    """Comma-separated item lists as sorted, de-duplicated strings, so set equality is string equality"""
+    items = _explode_items(series).sort_values(kind='stable')
+    joined = items.groupby(level=0).agg(','.join)
+    return joined.reindex(series.index, fill_value='')
+
+def item_confusion(results: pd.DataFrame) -> pd.DataFrame:
+    """Per menu item: cases where it was matched correctly, missed, or matched spuriously"""
+    expected = _explode_items(results['expected_items']).rename('item').reset_index()
+    actual = _explode_items(results['items']).rename('item').reset_index()
+    merged = expected.merge(actual, on=['index', 'item'], how='outer', indicator=True)
+    matrix = pd.crosstab(merged['item'], merged['_merge']).rename(
+        columns={'both': 'correct', 'left_only': 'missed', 'right_only': 'spurious'})
+    for column in ('correct', 'missed', 'spurious'):
+        if column not in matrix:
+            matrix[column] = 0
+    matrix = matrix[['correct', 'missed', 'spurious']]
+    matrix.columns.name = None
+    matrix.index.name = 'item'
+    return matrix
+
 class NLPTester:
     """Test suite for NLP functionality"""
     
@@ -50,6 +116,7 @@ class NLPTester:
             "quantity_accuracy": 0.0,
             "details": []
         }
+        self.csv_results = None
     
     def test_basic_functionality(self):
         """Test basic NLP functionality"""
@@ -86,12 +153,26 @@ class NLPTester:
                 "expected_intent": "help",
                 "expected_items": [],
                 "expected_quantities": []
+            },
+            {
+                "text": "I'll have 1 veggie burger and 1 ice cream",
+                "expected_intent": "order_food",
+                "expected_items": ["Veggie Burger", "Ice Cream"],
+                "expected_quantities": [1, 1]
+            },
+            {
+                # "veggie" qualifies "burger"; it must not add Veggie Pizza on its own
+                "text": "I'll have 1 veggie burger and 1 ice cream",
+                "menu": ["Beef Burger", "Veggie Pizza", "Ice Cream"],
+                "expected_intent": "order_food",
+                "expected_items": ["Beef Burger", "Ice Cream"],
+                "expected_quantities": [1, 1]
             }
         ]
         
         for i, test_case in enumerate(test_cases, 1):
             print(f"\nTest {i}: {test_case['text']}")
-            result = parse_order(test_case["text"], self.sample_menu)
+            result = parse_order(test_case["text"], test_case.get("menu", self.sample_menu))
             
             # Check results
             intent_correct = result["intent"] == test_case["expected_intent"]
@@ -129,81 +210,143 @@ class NLPTester:
                 "quantities_correct": quantities_correct
             })
     
-    def test_from_csv(self, csv_file: str):
-        """Test NLP from CSV file"""
+    def test_from_csv(self, csv_file: str, workers: int = None, chunk_size: int = CSV_CHUNK_SIZE):
+        """Test NLP from CSV file
+        
+        The CSV is read in chunks and each chunk is parsed across a pool of
+        worker processes; scoring is done with column operations on the
+        whole chunk. Per-case latency is measured inside the workers.
+        """
         print(f"Testing NLP from CSV file: {csv_file}")
         print("=" * 50)
         
+        workers = workers or os.cpu_count() or 1
         try:
-            df = pd.read_csv(csv_file)
-            print(f"Loaded {len(df)} test cases from CSV")
+            # Empty cells stay "" rather than NaN
+            reader = pd.read_csv(csv_file, dtype=str, keep_default_na=False, chunksize=chunk_size)
         except Exception as e:
             print(f"Error reading CSV file: {e}")
             return
         
-        intent_correct_count = 0
-        item_correct_count = 0
-        quantity_correct_count = 0
+        pool = None
+        previous_disable = logging.root.manager.disable
+        if workers > 1:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_csv_worker)
+        else:
+            # Same quiet evaluation in-process, but only until the CSV is done
+            logging.disable(logging.INFO)
+            get_nlp_processor()
         
-        for index, row in df.iterrows():
-            order_text = row['order_text']
-            expected_intent = row['expected_intent']
-            expected_items = row['expected_items'].split(',') if row['expected_items'] else []
-            expected_quantities = [int(x) for x in row['expected_quantities'].split(',')] if row['expected_quantities'] else []
-            
-            # Clean up expected items (remove empty strings)
-            expected_items = [item.strip() for item in expected_items if item.strip()]
-            
-            result = parse_order(order_text, self.sample_menu)
-            
-            # Check accuracy
-            intent_correct = result["intent"] == expected_intent
-            items_correct = set(result["items"]) == set(expected_items)
-            quantities_correct = result["quantities"] == expected_quantities
-            
-            if intent_correct:
-                intent_correct_count += 1
-            if items_correct:
-                item_correct_count += 1  
-            if quantities_correct:
-                quantity_correct_count += 1
-            
-            # Record detailed results
-            test_passed = intent_correct and items_correct and quantities_correct
-            self.test_results["total_tests"] += 1
-            if test_passed:
-                self.test_results["passed"] += 1
-            else:
-                self.test_results["failed"] += 1
-            
+        frames = []
+        started = time.perf_counter()
+        try:
+            for chunk in reader:
+                frames.append(self._evaluate_chunk(chunk, pool, workers))
+                processed = sum(len(frame) for frame in frames)
+                elapsed = time.perf_counter() - started
+                print(f"Processed {processed} tests ({processed / elapsed:.0f}/s)...")
+        except Exception as e:
+            print(f"Error evaluating CSV file: {e}")
+            return
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            logging.disable(previous_disable)
+        wall_time = time.perf_counter() - started
+        
+        if not frames or not sum(len(frame) for frame in frames):
+            print("No test cases in CSV")
+            return
+        results = pd.concat(frames, ignore_index=True)
+        self.csv_results = results
+        print(f"Loaded {len(results)} test cases from CSV ({workers} worker{'s' if workers > 1 else ''})")
+        
+        total_tests = len(results)
+        passed = int(results['passed'].sum())
+        self.test_results["total_tests"] += total_tests
+        self.test_results["passed"] += passed
+        self.test_results["failed"] += total_tests - passed
+        
+        # Calculate accuracies
+        self.test_results["intent_accuracy"] = results['intent_correct'].mean() * 100
+        self.test_results["item_accuracy"] = results['items_correct'].mean() * 100
+        self.test_results["quantity_accuracy"] = results['quantities_correct'].mean() * 100
+        
+        latencies = results['latency_ms']
+        self.test_results["latency_ms"] = {
+            "mean": round(float(latencies.mean()), 3),
+            "p50": round(float(latencies.quantile(0.50)), 3),
+            "p90": round(float(latencies.quantile(0.90)), 3),
+            "p99": round(float(latencies.quantile(0.99)), 3),
+            "max": round(float(latencies.max()), 3),
+        }
+        self.test_results["throughput"] = round(total_tests / wall_time, 1)
+        
+        intent_matrix = pd.crosstab(results['expected_intent'], results['intent'],
+                                    rownames=['expected'], colnames=['actual'])
+        item_matrix = item_confusion(results)
+        self.test_results["intent_confusion"] = intent_matrix.to_dict(orient='index')
+        self.test_results["item_confusion"] = item_matrix.to_dict(orient='index')
+        
+        # Keep details for failures only; a large corpus would bloat the report
+        for row in results[~results['passed']].itertuples(index=False):
             self.test_results["details"].append({
-                "test_case": order_text,
+                "test_case": row.order_text,
                 "expected": {
-                    "intent": expected_intent,
-                    "items": expected_items, 
-                    "quantities": expected_quantities
+                    "intent": row.expected_intent,
+                    "items": split_list(row.expected_items),
+                    "quantities": row.expected_quantities
                 },
-                "actual": result,
-                "passed": test_passed,
-                "intent_correct": intent_correct,
-                "items_correct": items_correct,
-                "quantities_correct": quantities_correct
+                "actual": {
+                    "intent": row.intent,
+                    "items": split_list(row.items),
+                    "quantities": row.quantities,
+                    "confidence": row.confidence
+                },
+                "passed": False,
+                "intent_correct": bool(row.intent_correct),
+                "items_correct": bool(row.items_correct),
+                "quantities_correct": bool(row.quantities_correct),
+                "latency_ms": row.latency_ms
             })
-            
-            # Print progress every 10 tests
-            if (index + 1) % 10 == 0:
-                print(f"Processed {index + 1}/{len(df)} tests...")
-        
-        # Calculate accuracies
-        total_tests = len(df)
-        self.test_results["intent_accuracy"] = intent_correct_count / total_tests * 100
-        self.test_results["item_accuracy"] = item_correct_count / total_tests * 100
-        self.test_results["quantity_accuracy"] = quantity_correct_count / total_tests * 100
         
         print(f"\nCSV Test Results:")
         print(f"Intent Accuracy:    {self.test_results['intent_accuracy']:.1f}%")
         print(f"Item Accuracy:      {self.test_results['item_accuracy']:.1f}%")
         print(f"Quantity Accuracy:  {self.test_results['quantity_accuracy']:.1f}%")
+        latency = self.test_results["latency_ms"]
+        print(f"Latency:            p50 {latency['p50']:.2f} ms, p90 {latency['p90']:.2f} ms, "
+              f"p99 {latency['p99']:.2f} ms, max {latency['max']:.2f} ms")
+        print(f"Throughput:         {self.test_results['throughput']:.0f} tests/s")
+        
+        print(f"\nIntent Confusion Matrix (rows: expected, columns: actual):")
+        print(intent_matrix.to_string())
+        errors = item_matrix[(item_matrix['missed'] > 0) | (item_matrix['spurious'] > 0)]
+        if len(errors):
+            print(f"\nItem Errors (top {min(len(errors), 15)} by missed + spurious):")
+            order = (errors['missed'] + errors['spurious']).sort_values(ascending=False).index
+            print(errors.loc[order].head(15).to_string())
+    
+    def _evaluate_chunk(self, chunk: pd.DataFrame, pool, workers: int) -> pd.DataFrame:
+        """Parse one chunk of test cases and score it column-wise"""
+        texts = chunk['order_text'].tolist()
+        batch_size = max(1, min(CSV_BATCH_SIZE, -(-len(texts) // workers)))
+        batches = [(texts[i:i + batch_size], self.sample_menu) for i in range(0, len(texts), batch_size)]
+        outputs = pool.map(_evaluate_batch, batches) if pool is not None else map(_evaluate_batch, batches)
+        
+        actual = pd.DataFrame([row for output in outputs for row in output],
+                              columns=['intent', 'items', 'quantities', 'confidence', 'latency_ms'],
+                              index=chunk.index)
+        results = pd.concat([chunk[['order_text', 'expected_intent', 'expected_items', 'expected_quantities']],
+                             actual], axis=1)
+        
+        # Items are compared as sets, quantities in order
+        results['intent_correct'] = results['intent'] == results['expected_intent']
+        results['items_correct'] = normalize_items(results['items']) == normalize_items(results['expected_items'])
+        results['quantities_correct'] = (results['quantities']
+                                         == results['expected_quantities'].str.replace(r'\s+', '', regex=True))
+        results['passed'] = results['intent_correct'] & results['items_correct'] & results['quantities_correct']
+        return results
     
     def test_edge_cases(self):
         """Test edge cases and error handling"""
@@ -287,6 +430,109 @@ class NLPTester:
         
         print("\nGoodbye!")
     
+    def profile_stages(self, texts: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Latency percentiles and peak memory per parsing stage, measured serially in this process"""
+        # Imported here: benchmark_nlp silences INFO logging on import
+        from benchmark_nlp import measure
+        
+        # Small corpora are repeated so the percentiles are not just the slowest case
+        texts = list(itertools.islice(itertools.cycle(texts), STAGE_SAMPLE_SIZE)) if texts else []
+        nlp = get_nlp_processor()
+        matcher = MenuMatcher(MenuIndex(self.sample_menu))
+        orders = [text for text, intent in zip(texts, nlp.classify_intents(texts)) if intent == "order_food"]
+        
+        print(f"Profiling stages over {len(texts)} calls...")
+        return {
+            "intent": measure(nlp.classify_intent, texts),
+            "match": measure(matcher.match, orders),
+            "quantities": measure(nlp.extract_quantities, orders),
+            "parse_order": measure(lambda text: parse_order(text, self.sample_menu), texts),
+        }
+    
+    def build_baseline(self) -> Dict[str, Any]:
+        """Accuracy and timing of the last CSV run, overall, per stage and per test case"""
+        results = self.csv_results
+        texts = results['order_text'].tolist()
+        return {
+            "meta": {
+                "timestamp": datetime.now().isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cases": len(results),
+            },
+            "accuracy": {
+                "intent": round(self.test_results["intent_accuracy"], 3),
+                "items": round(self.test_results["item_accuracy"], 3),
+                "quantities": round(self.test_results["quantity_accuracy"], 3),
+                "passed": round(results['passed'].mean() * 100, 3),
+            },
+            "latency_ms": self.test_results["latency_ms"],
+            # Same layout as benchmark_nlp reports, so compare_reports can diff it
+            "results": {"csv": self.profile_stages(texts)},
+            "cases": {text: {"passed": bool(passed), "latency_ms": latency}
+                      for text, passed, latency in zip(texts, results['passed'], results['latency_ms'])},
+        }
+    
+    def save_baseline(self, filename: str, baseline: Dict[str, Any] = None):
+        baseline = baseline or self.build_baseline()
+        with open(filename, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"📄 Baseline saved to: {filename}")
+    
+    def compare_baseline(self, filename: str, accuracy_tolerance: float = 0.0,
+                         latency_tolerance: float = 0.25, current: Dict[str, Any] = None) -> List[str]:
+        """Diff the last CSV run against a saved baseline and return every regression
+        
+        Accuracy may drop by at most accuracy_tolerance percentage points;
+        stage latency and memory may grow by at most latency_tolerance
+        (0.25 = 25%). Cases that flipped between pass and fail are listed
+        either way.
+        """
+        with open(filename) as f:
+            baseline = json.load(f)
+        current = current or self.build_baseline()
+        
+        regressions = []
+        for metric, old in baseline["accuracy"].items():
+            new = current["accuracy"].get(metric, 0.0)
+            if new < old - accuracy_tolerance:
+                regressions.append(f"{metric} accuracy: {old:.1f}% -> {new:.1f}%")
+        regressions.extend(compare_reports(current, baseline, latency_tolerance, min_delta_ms=LATENCY_NOISE_MS))
+        
+        old_cases, new_cases = baseline.get("cases", {}), current["cases"]
+        was_passing = {text: case["passed"] for text, case in old_cases.items()}
+        broken = [text for text, case in new_cases.items() if not case["passed"] and was_passing.get(text)]
+        fixed = [text for text, case in new_cases.items() if case["passed"] and was_passing.get(text) is False]
+        
+        print("\n" + "=" * 60)
+        print(f"BASELINE COMPARISON ({filename})")
+        print("=" * 60)
+        for metric, old in baseline["accuracy"].items():
+            new = current['accuracy'].get(metric, 0.0)
+            print(f"{metric.capitalize() + ' Accuracy:':<22} {old:6.1f}% -> {new:6.1f}%")
+        for stage, new in current["results"]["csv"].items():
+            old = baseline["results"].get("csv", {}).get(stage)
+            if old is not None:
+                print(f"{stage:<12} p50 {old['p50_ms']:.3f} -> {new['p50_ms']:.3f} ms   "
+                      f"p99 {old['p99_ms']:.3f} -> {new['p99_ms']:.3f} ms   "
+                      f"peak {old.get('peak_kb', 0):.1f} -> {new.get('peak_kb', 0):.1f} KB")
+        if fixed:
+            print(f"\n✅ {len(fixed)} case(s) now pass:")
+            for text in fixed[:20]:
+                print(f"  {text}")
+        if broken:
+            print(f"\n❌ {len(broken)} case(s) now fail:")
+            for text in broken[:20]:
+                print(f"  {text}")
+        
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) against {filename}:")
+            for line in regressions:
+                print(f"  {line}")
+        else:
+            print(f"\n✅ No regressions against {filename}")
+        return regressions
+    
     def generate_report(self):
         """Generate test report"""
         print("\n" + "=" * 60)
@@ -329,6 +575,15 @@ class NLPTester:
             if self.test_results.get("quantity_accuracy", 0) < 75:
                 print("  - Better quantity parsing and number recognition")
             
+            # Matcher tier breakdown
+            tier_stats = get_matcher_stats()
+            if tier_stats["calls"]:
+                print(f"\n🔎 Item Matcher Tiers ({tier_stats['calls']} calls):")
+                for tier, entry in tier_stats["tiers"].items():
+                    print(f"  {tier:<6} reached {entry['reached']:>5}  resolved {entry['resolved']:>5}  "
+                          f"hit rate {entry['hit_rate'] * 100:5.1f}%  avg {entry['avg_ms']:.3f} ms")
+                self.test_results["matcher_tiers"] = tier_stats
+            
             # Save detailed report to file
             self.save_detailed_report()
         else:
@@ -350,6 +605,13 @@ def main():
     """Main function"""
     parser = argparse.ArgumentParser(description="Test NLP functionality for restaurant ordering system")
     parser.add_argument("--csv", help="Path to CSV file with test cases")
+    parser.add_argument("--workers", type=int, help="Processes for CSV tests (default: CPU count)")
+    parser.add_argument("--baseline", help="Compare the CSV run against this baseline; exit 1 on regressions")
+    parser.add_argument("--save-baseline", help="Write the CSV run's accuracy and timings as a baseline")
+    parser.add_argument("--accuracy-tolerance", type=float, default=0.0,
+                        help="Allowed accuracy drop in percentage points (default: 0)")
+    parser.add_argument("--latency-tolerance", type=float, default=0.25,
+                        help="Allowed stage latency/memory growth (0.25 = 25%%)")
     parser.add_argument("--interactive", action="store_true", help="Run in interactive mode")
     parser.add_argument("--basic", action="store_true", help="Run basic tests only")
     parser.add_argument("--edge", action="store_true", help="Run edge case tests only")
@@ -364,8 +626,18 @@ def main():
     if args.interactive:
         tester.interactive_test()
     elif args.csv:
-        tester.test_from_csv(args.csv)
+        tester.test_from_csv(args.csv, workers=args.workers)
         tester.generate_report()
+        if (args.baseline or args.save_baseline) and tester.csv_results is None:
+            print("❌ No CSV results to compare")
+            return 1
+        current = tester.build_baseline() if args.baseline or args.save_baseline else None
+        if args.save_baseline:
+            tester.save_baseline(args.save_baseline, current)
+        if args.baseline:
+            regressions = tester.compare_baseline(args.baseline, args.accuracy_tolerance,
+                                                  args.latency_tolerance, current)
+            return 1 if regressions else 0
     elif args.basic:
         tester.test_basic_functionality()
         tester.generate_report()
@@ -386,4 +658,4 @@ def main():
         tester.generate_report()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file